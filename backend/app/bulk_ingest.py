@@ -0,0 +1,76 @@
+"""
+Ingest every supported document in a local directory
+
+Run it while the API server is stopped. The server keeps the vector
+store's document map, lexical index and caches in memory and would not
+see documents written by another process, so the store can only be
+open in one process at a time and this command exits while the server
+holds it.
+
+Usage:
+    uv run python -m app.bulk_ingest <directory> [--no-recursive] [--report report.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+from typing import Iterator, Tuple
+
+from app.utils.database import connect_mongodb, close_mongodb, get_database
+from app.utils.document_processor import DocumentProcessor
+from app.utils.ingestion import ingest_documents, summarize_results
+from app.utils.uploads import LocalFile
+from app.utils.vector_store import get_vector_store, peek_vector_store, VectorStoreInUseError
+from app.utils import model_server
+
+def iter_directory(directory: str, recursive: bool = True) -> Iterator[Tuple[str, LocalFile]]:
+    """Yield (relative path, file) for supported files; each is read from disk as it is ingested"""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if DocumentProcessor.get_file_type(name) is None:
+                continue
+            path = os.path.join(root, name)
+            yield os.path.relpath(path, directory), LocalFile(path)
+        if not recursive:
+            break
+
+async def main():
+    parser = argparse.ArgumentParser(description="Ingest all documents in a directory")
+    parser.add_argument("directory", help="Directory containing PDF, DOCX, TXT and MD files")
+    parser.add_argument("--no-recursive", action="store_true", help="Do not descend into subdirectories")
+    parser.add_argument("--report", help="Write the per-file report to this JSON file")
+    args = parser.parse_args()
+    
+    if not os.path.isdir(args.directory):
+        parser.error(f"Not a directory: {args.directory}")
+    
+    await connect_mongodb()
+    if get_database() is None:
+        raise SystemExit("Cannot ingest without a MongoDB connection")
+    
+    try:
+        # Open the store first, so a running server is detected before any file is read
+        try:
+            await asyncio.to_thread(get_vector_store)
+        except VectorStoreInUseError as e:
+            raise SystemExit(f"{str(e)}; stop it before ingesting")
+        results = await ingest_documents(iter_directory(args.directory, not args.no_recursive))
+    finally:
+        # Writes the lexical index changes that flushes postponed and releases the store
+        vector_store = peek_vector_store()
+        if vector_store is not None and not model_server.is_remote():
+            await asyncio.to_thread(vector_store.close)
+        await close_mongodb()
+    
+    summary = summarize_results(results)
+    for result in results:
+        print(f"[{result['status']}] {result['filename']}: {result['message']}")
+    print(f"Ingested {summary['succeeded']}/{summary['total_files']} files ({summary['failed']} failed)")
+    
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -3,25 +3,149 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Rough characters per token, used to convert the deprecated character-based chunk settings
+CHARS_PER_TOKEN = 4
+
+def _chunk_tokens(name: str, legacy_name: str, default: str) -> int:
+    """Token-based chunk setting, converted from its deprecated character-based one if only that is set"""
+    value = os.getenv(name)
+    legacy = os.getenv(legacy_name)
+    if value is None and legacy is not None:
+        value = str(int(legacy) // CHARS_PER_TOKEN)
+        print(
+            f"Warning: {legacy_name} is deprecated (characters); using {name}={value} "
+            f"at about {CHARS_PER_TOKEN} characters per token. Set {name} instead."
+        )
+    return int(value if value is not None else default)
+
 class Settings:
     #MondoDB
     MONGODB_URI: str = os.getenv("MONGODB_URI", "")
     MONGODB_DB_NAME: str = os.getenv("MONGODB_DB_NAME", "document_qa_rag")
+    MONGODB_MAX_POOL_SIZE: int = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+    MONGODB_MIN_POOL_SIZE: int = int(os.getenv("MONGODB_MIN_POOL_SIZE", "5"))
 
     # Ollama
     OLLAMA_BASE_URL: str = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
     OLLAMA_MODEL: str = os.getenv("OLLAMA_MODEL", "llama3.2")
+    OLLAMA_TIMEOUT: float = float(os.getenv("OLLAMA_TIMEOUT", "120"))
+
+    # Shared HTTP client
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
 
     # ChromaDB
     CHROMA_PERSIST_DIR: str = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
 
+    # Vector store backend: "chroma" or "quantized" (int8 vectors in memory-mapped files)
+    VECTOR_BACKEND: str = os.getenv("VECTOR_BACKEND", "chroma").lower()
+    QUANTIZED_STORE_DIR: str = os.getenv("QUANTIZED_STORE_DIR", "./vector_index")
+    QUANTIZED_RERANK_FACTOR: int = int(os.getenv("QUANTIZED_RERANK_FACTOR", "4"))
+    # Split the store into this many shards by document_id; each shard is searched in its own process
+    VECTOR_SHARDS: int = int(os.getenv("VECTOR_SHARDS", "1"))
+    VECTOR_SHARD_PROCESSES: bool = os.getenv("VECTOR_SHARD_PROCESSES", "true").lower() == "true"
+    # Document-filtered searches over at most this many chunks are scored exactly
+    EXACT_SEARCH_MAX_CHUNKS: int = int(os.getenv("EXACT_SEARCH_MAX_CHUNKS", "2000"))
+
     # RAG Settings
-    CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE", "700"))
-    CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", "150"))
     TOP_K_RETRIEVAL: int = int(os.getenv("TOP_K_RETRIEVAL", "5"))
+    MAX_BATCH_QUERIES: int = int(os.getenv("MAX_BATCH_QUERIES", "64"))
+
+    # Hybrid retrieval (BM25 + vector, fused by reciprocal rank); hits keep their cosine similarity
+    # as score and carry the fused value as fusion_score
+    HYBRID_SEARCH_ENABLED: bool = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+    HYBRID_DENSE_TOP_K: int = int(os.getenv("HYBRID_DENSE_TOP_K", "5"))
+    HYBRID_LEXICAL_TOP_K: int = int(os.getenv("HYBRID_LEXICAL_TOP_K", "10"))
+    RRF_K: int = int(os.getenv("RRF_K", "60"))
+    # Each save of the lexical index rewrites all of it (cost grows with the corpus), so
+    # flushes save it at most this often (seconds); pending changes are written on shutdown
+    LEXICAL_SAVE_INTERVAL: float = float(os.getenv("LEXICAL_SAVE_INTERVAL", "30"))
+
+    # Cross-encoder re-ranking of retrieved candidates (CPU)
+    RERANK_ENABLED: bool = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+    RERANK_MODEL: str = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    RERANK_CANDIDATES: int = int(os.getenv("RERANK_CANDIDATES", "20"))
+    RERANK_BATCH_SIZE: int = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+    RERANK_BUDGET_MS: int = int(os.getenv("RERANK_BUDGET_MS", "300"))
+    RERANK_CACHE_SIZE: int = int(os.getenv("RERANK_CACHE_SIZE", "10000"))
+    RERANK_CACHE_TTL: int = int(os.getenv("RERANK_CACHE_TTL", "3600"))
+
+    # Micro-batching of query embeddings across concurrent requests
+    QUERY_BATCH_MAX_SIZE: int = int(os.getenv("QUERY_BATCH_MAX_SIZE", "64"))
+    QUERY_BATCH_MAX_WAIT_MS: float = float(os.getenv("QUERY_BATCH_MAX_WAIT_MS", "5"))
+
+    # Prompt context: tokens of excerpt text sent to the LLM (counted with the embedding tokenizer)
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+    CONTEXT_MIN_PASSAGE_TOKENS: int = int(os.getenv("CONTEXT_MIN_PASSAGE_TOKENS", "64"))
+
+    # Semantic answer cache (cosine similarity of question embeddings)
+    ANSWER_CACHE_ENABLED: bool = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_PATH: str = os.getenv("ANSWER_CACHE_PATH", "./answer_cache/answers.sqlite3")
+    ANSWER_CACHE_SIZE: int = int(os.getenv("ANSWER_CACHE_SIZE", "5000"))
+    ANSWER_CACHE_THRESHOLD: float = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+
+    # Read-path caches (TTL in seconds)
+    QUERY_CACHE_SIZE: int = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+    QUERY_CACHE_TTL: int = int(os.getenv("QUERY_CACHE_TTL", "3600"))
+    RETRIEVAL_CACHE_SIZE: int = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+    RETRIEVAL_CACHE_TTL: int = int(os.getenv("RETRIEVAL_CACHE_TTL", "600"))
+
+    # Token-based chunking (tokens of the embedding model's tokenizer); the deprecated
+    # CHUNK_SIZE and CHUNK_OVERLAP (characters) are converted when these are not set
+    CHUNK_TOKENS: int = _chunk_tokens("CHUNK_TOKENS", "CHUNK_SIZE", "240")
+    CHUNK_OVERLAP_TOKENS: int = _chunk_tokens("CHUNK_OVERLAP_TOKENS", "CHUNK_OVERLAP", "48")
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+
+    # Text extraction (0 workers = one per CPU)
+    PDF_EXTRACT_WORKERS: int = int(os.getenv("PDF_EXTRACT_WORKERS", "0"))
+    PDF_PAGES_PER_TASK: int = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+
+    # Ingestion queue
+    INGEST_WORKERS: int = int(os.getenv("INGEST_WORKERS", "2"))
+    INGEST_QUEUE_SIZE: int = int(os.getenv("INGEST_QUEUE_SIZE", "16"))
+    JOB_HISTORY_SIZE: int = int(os.getenv("JOB_HISTORY_SIZE", "1000"))
+
+    # Uploads are streamed to temporary files (in UPLOAD_SPOOL_DIR, or the system's temp directory);
+    # larger files are rejected (0 = no limit)
+    MAX_UPLOAD_BYTES: int = int(os.getenv("MAX_UPLOAD_BYTES", "268435456"))
+    UPLOAD_SPOOL_DIR: str = os.getenv("UPLOAD_SPOOL_DIR", "")
+
+    # Bulk ingestion
+    BULK_MAX_FILES: int = int(os.getenv("BULK_MAX_FILES", "1000"))
+    BULK_WRITE_SIZE: int = int(os.getenv("BULK_WRITE_SIZE", "1024"))
+
+    # Document listing page size (default and maximum)
+    DOCUMENT_PAGE_SIZE: int = int(os.getenv("DOCUMENT_PAGE_SIZE", "100"))
+    DOCUMENT_PAGE_MAX: int = int(os.getenv("DOCUMENT_PAGE_MAX", "1000"))
 
      # Embedding Model
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    # "torch", "onnx" or "openvino"; EMBEDDING_MODEL_FILE picks an exported file, e.g. onnx/model_qint8_avx2.onnx
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+    EMBEDDING_MODEL_FILE: str = os.getenv("EMBEDDING_MODEL_FILE", "")
+    # Load models and stores during startup instead of on the first request
+    WARMUP_ON_STARTUP: bool = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+
+    # Embedding cache
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_PATH: str = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache/embeddings.sqlite3")
+    EMBEDDING_CACHE_MEMORY_ITEMS: int = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "20000"))
+    # Rows kept in the SQLite file, least recently used evicted first (0 = no limit)
+    EMBEDDING_CACHE_DISK_ITEMS: int = int(os.getenv("EMBEDDING_CACHE_DISK_ITEMS", "500000"))
+
+    # Tracing: one JSON line per ingestion job and query, with per-stage spans
+    TRACE_ENABLED: bool = os.getenv("TRACE_ENABLED", "false").lower() == "true"
+    TRACE_PATH: str = os.getenv("TRACE_PATH", "./traces/traces.jsonl")
+
+    # API server (backend/main.py)
+    API_HOST: str = os.getenv("API_HOST", "0.0.0.0")
+    API_PORT: int = int(os.getenv("API_PORT", "8000"))
+    # Worker processes; with more than one, models and the vector store live in a shared model server
+    WEB_WORKERS: int = int(os.getenv("WEB_WORKERS", "1"))
+    # Set by the launcher for its workers; leave empty
+    MODEL_SERVER_ADDRESS: str = os.getenv("MODEL_SERVER_ADDRESS", "")
+    MODEL_SERVER_AUTHKEY: str = os.getenv("MODEL_SERVER_AUTHKEY", "")
 
 
 settings = Settings()
\ No newline at end of file
@@ -1,17 +1,69 @@
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+import asyncio
 import os
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+
+from app.routers import documents, search, query
+from app.utils.job_queue import get_job_queue
+from app.utils.embedding_batcher import get_embedding_batcher
+from app.utils.embedding_cache import get_embedding_cache
+from app.utils.answer_cache import get_answer_cache
+from app.utils.retrieval import get_cache_stats
+from app.utils.database import connect_mongodb, close_mongodb, get_mongodb_client
+from app.utils.http_client import create_http_client, close_http_client, get_http_client
+from app.utils.vector_store import peek_vector_store
+from app.utils.warmup import warm_up
+from app.utils import metrics, model_server
+from app.config import settings
 
-from app.routers import documents
+# Time spent importing the app, and per-stage startup times filled in by the lifespan
+_startup_report = {"imports_seconds": round(time.perf_counter() - _import_started, 3)}
 
 # Load environment variables
 load_dotenv()
 
+def _vector_count() -> int:
+    """Chunks in the vector store, or 0 before it has been opened"""
+    store = peek_vector_store()
+    return store.get_count() if store is not None else 0
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop shared clients and background services"""
+    started = time.perf_counter()
+    await connect_mongodb()
+    create_http_client()
+    job_queue = get_job_queue()
+    await job_queue.start()
+    metrics.INGEST_QUEUE_DEPTH.set_function(job_queue.get_depth)
+    metrics.VECTOR_COUNT.set_function(_vector_count)
+    embedding_batcher = get_embedding_batcher()
+    await embedding_batcher.start()
+    if settings.WARMUP_ON_STARTUP:
+        _startup_report["warmup"] = await asyncio.to_thread(warm_up)
+    _startup_report["lifespan_seconds"] = round(time.perf_counter() - started, 3)
+    print(f"Startup complete: {_startup_report}")
+    yield
+    await embedding_batcher.stop()
+    await job_queue.stop()
+    vector_store = peek_vector_store()
+    # In multi-worker mode the store belongs to the model server, which closes it
+    if vector_store is not None and not model_server.is_remote():
+        await asyncio.to_thread(vector_store.close)
+    await close_http_client()
+    await close_mongodb()
+
 app = FastAPI(
     title="Document Q&A RAG API",
     description="Backend API for Document Question & Answer system using RAG",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -24,6 +76,8 @@ app.add_middleware(
 )
 
 app.include_router(documents.router)
+app.include_router(search.router)
+app.include_router(query.router)
 
 @app.get("/")
 async def root():
@@ -47,31 +101,51 @@ async def api_health_check():
     # Test MongoDB connection
     mongodb_status = "connected"
     try:
-        from app.utils.database import get_database
-        db = get_database()
-        if db is None:
+        client = get_mongodb_client()
+        if client is None:
             mongodb_status = "disconnected"
+        else:
+            await client.admin.command('ping')
     except Exception as e:
         mongodb_status = f"error: {str(e)}"
     
     # Test Ollama connection
     ollama_status = "connected"
     try:
-        import requests
-        from app.config import settings
-        response = requests.get(f"{settings.OLLAMA_BASE_URL}/api/version", timeout=2)
+        response = await get_http_client().get(f"{settings.OLLAMA_BASE_URL}/api/version", timeout=2)
         if response.status_code != 200:
             ollama_status = "disconnected"
     except Exception as e:
         ollama_status = f"error: {str(e)}"
     
+    job_queue = get_job_queue()
+    embedding_cache = get_embedding_cache()
+    answer_cache = get_answer_cache()
+    
     return {
         "status": "healthy",
         "mongodb": mongodb_status,
         "ollama": ollama_status,
-        "chromadb": "initialized"
+        "chromadb": "initialized",
+        "vector_backend": settings.VECTOR_BACKEND,
+        "vector_shards": settings.VECTOR_SHARDS,
+        "model_server": settings.MODEL_SERVER_ADDRESS or None,
+        "ingest_queue": {
+            "depth": job_queue.get_depth(),
+            "capacity": job_queue.max_queue_size,
+            "workers": job_queue.num_workers
+        },
+        "embedding_cache": embedding_cache.stats() if embedding_cache is not None else None,
+        "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+        "cache": get_cache_stats(),
+        "startup": _startup_report
     }
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus metrics: stage latencies, throughput counters, answer cache, queue depth and vector count"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
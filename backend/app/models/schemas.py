@@ -0,0 +1,89 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional, Union
+from datetime import datetime
+
+class DocumentUploadResponse(BaseModel):
+    """Result of processing a single document"""
+    document_id: str
+    filename: str
+    file_type: str
+    total_chunks: int
+    status: str
+    message: str
+
+class FileIngestResult(BaseModel):
+    """Outcome for one file of a bulk upload"""
+    filename: str
+    file_type: Optional[str] = None
+    document_id: Optional[str] = None
+    total_chunks: int
+    status: str
+    message: Optional[str] = None
+
+class BulkUploadResponse(BaseModel):
+    """Result of processing a bulk upload"""
+    total_files: int
+    succeeded: int
+    failed: int
+    files: List[FileIngestResult]
+
+class JobResponse(BaseModel):
+    """Status of a background ingestion job"""
+    job_id: str
+    status: str
+    filename: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[Union[DocumentUploadResponse, BulkUploadResponse]] = None
+    error: Optional[str] = None
+
+class DocumentInfo(BaseModel):
+    """Metadata of an uploaded document (only the requested fields when listing with a projection)"""
+    document_id: str
+    filename: Optional[str] = None
+    file_type: Optional[str] = None
+    upload_date: Optional[datetime] = None
+    total_chunks: Optional[int] = None
+
+class DocumentListResponse(BaseModel):
+    """One page of uploaded documents, newest first"""
+    documents: List[DocumentInfo]
+    total: int  # documents in this page
+    next_cursor: Optional[str] = None  # pass as `cursor` to get the next page; None on the last page
+
+class DeleteResponse(BaseModel):
+    """Result of a delete operation"""
+    success: bool
+    message: str
+    document_id: Optional[str] = None
+
+class BatchSearchRequest(BaseModel):
+    """Several questions to retrieve chunks for"""
+    questions: List[str]
+    top_k: Optional[int] = Field(default=None, ge=1, le=100)
+    document_ids: Optional[List[str]] = None
+
+class SearchHit(BaseModel):
+    """A retrieved chunk"""
+    id: str
+    document_id: str
+    chunk_index: int
+    content: str
+    score: float  # cosine similarity to the question (cross-encoder score when re-ranked)
+    fusion_score: Optional[float] = None  # reciprocal-rank fusion score with hybrid search
+
+class SearchResult(BaseModel):
+    """Retrieved chunks for one question"""
+    question: str
+    results: List[SearchHit]
+
+class BatchSearchResponse(BaseModel):
+    """Retrieved chunks for every question, in request order"""
+    results: List[SearchResult]
+
+class QueryRequest(BaseModel):
+    """A question to answer from the uploaded documents"""
+    question: str
+    top_k: Optional[int] = Field(default=None, ge=1, le=100)
+    document_ids: Optional[List[str]] = None
@@ -1,141 +1,219 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import List
-import uuid
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from typing import List, Dict, Any, Optional
 from datetime import datetime
+import asyncio
+import base64
+import json
 
 from app.models.schemas import (
-    DocumentUploadResponse,
+    JobResponse,
     DocumentListResponse,
     DocumentInfo,
     DeleteResponse
 )
 from app.utils.database import get_documents_collection, get_chunks_collection
-from app.utils.document_processor import DocumentProcessor
-from app.utils.embeddings import get_embedding_generator
 from app.utils.vector_store import get_vector_store
+from app.utils.document_processor import DocumentProcessor
+from app.utils.ingestion import ingest_document, ingest_bulk
+from app.utils.uploads import spool_upload, UploadTooLargeError
+from app.utils.job_queue import get_job_queue, QueueFullError
+from app.utils.retrieval import bump_corpus_generation
+from app.utils.answer_cache import get_answer_cache
 from app.config import settings
 
 router = APIRouter(prefix="/api/documents", tags=["documents"])
 
-# Supported file extensions
-SUPPORTED_EXTENSIONS = {'.pdf', '.docx', '.txt', '.md'}
-
-@router.post("/upload", response_model=DocumentUploadResponse)
+@router.post("/upload", response_model=JobResponse, status_code=202)
 async def upload_document(file: UploadFile = File(...)):
     """
-    Upload and process a document
+    Upload a document and queue it for processing
     
     Supports: PDF, DOCX, TXT, MD
+    
+    Returns immediately with a job ID; poll /api/documents/jobs/{job_id} for the result.
+    The file is streamed to a temporary file, never held in memory whole;
+    files larger than MAX_UPLOAD_BYTES are rejected with 413.
     """
     # Validate file extension
-    file_ext = '.' + file.filename.split('.')[-1].lower()
-    if file_ext not in SUPPORTED_EXTENSIONS:
+    if DocumentProcessor.get_file_type(file.filename) is None:
         raise HTTPException(
             status_code=400,
-            detail=f"Unsupported file type. Supported types: {', '.join(SUPPORTED_EXTENSIONS)}"
+            detail=f"Unsupported file type. Supported types: {', '.join(DocumentProcessor.SUPPORTED_EXTENSIONS)}"
         )
     
+    # Stream the upload to disk, hashing it on the way
     try:
-        # Read file content
-        file_content = await file.read()
-        
-        # Extract text
-        file_type = file_ext.replace('.', '')
-        text = DocumentProcessor.extract_text(file_content, file_type)
-        
-        if not text or len(text.strip()) < 10:
-            raise HTTPException(status_code=400, detail="Document appears to be empty or too short")
-        
-        # Chunk the text
-        chunks = DocumentProcessor.chunk_text(
-            text,
-            chunk_size=settings.CHUNK_SIZE,
-            overlap=settings.CHUNK_OVERLAP
+        upload = await spool_upload(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    # An identical document is already stored: report it without reprocessing
+    documents_col = get_documents_collection()
+    if documents_col is not None:
+        existing = await documents_col.find_one({"content_hash": upload.content_hash}, {"_id": 0})
+        if existing is not None:
+            upload.delete()
+            job = get_job_queue().add_completed(
+                {
+                    "document_id": existing["document_id"],
+                    "filename": file.filename,
+                    "file_type": existing["file_type"],
+                    "total_chunks": existing["total_chunks"],
+                    "status": "duplicate",
+                    "message": f"Identical to already stored document '{existing['filename']}'"
+                },
+                filename=file.filename
+            )
+            return JobResponse(**job)
+    
+    try:
+        job = get_job_queue().submit(
+            ingest_document,
+            upload,
+            file.filename,
+            filename=file.filename
         )
-        
-        if not chunks:
-            raise HTTPException(status_code=400, detail="Failed to create chunks from document")
-        
-        # Generate embeddings
-        embedding_gen = get_embedding_generator()
-        chunk_texts = [chunk['content'] for chunk in chunks]
-        embeddings = embedding_gen.generate_embeddings(chunk_texts)
-        
-        # Generate document ID
-        document_id = str(uuid.uuid4())
-        
-        # Store in MongoDB
-        documents_col = get_documents_collection()
-        chunks_col = get_chunks_collection()
-        
-        # Store document metadata
-        document_data = {
-            "document_id": document_id,
-            "filename": file.filename,
-            "file_type": file_type,
-            "upload_date": datetime.utcnow(),
-            "total_chunks": len(chunks),
-            "total_chars": len(text)
-        }
-        documents_col.insert_one(document_data)
-        
-        # Store chunks in MongoDB
-        chunk_docs = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            chunk_doc = {
-                "document_id": document_id,
-                "chunk_index": chunk['chunk_index'],
-                "content": chunk['content'],
-                "char_count": chunk['char_count'],
-                "embedding": embedding
-            }
-            chunk_docs.append(chunk_doc)
-        
-        if chunk_docs:
-            chunks_col.insert_many(chunk_docs)
-        
-        # Store in vector database
-        vector_store = get_vector_store()
-        vector_store.add_chunks(chunks, document_id, embeddings)
-        
-        return DocumentUploadResponse(
-            document_id=document_id,
-            filename=file.filename,
-            file_type=file_type,
-            total_chunks=len(chunks),
-            status="success",
-            message=f"Document processed successfully with {len(chunks)} chunks"
+    except QueueFullError as e:
+        upload.delete()
+        raise HTTPException(status_code=429, detail=str(e))
+    
+    return JobResponse(**job)
+
+@router.post("/upload/bulk", response_model=JobResponse, status_code=202)
+async def upload_documents_bulk(files: List[UploadFile] = File(...)):
+    """
+    Upload many documents (and/or .zip archives of documents) as one job
+    
+    Chunks from all files are embedded and written in shared batches. The
+    job result reports success or failure for every file. Each file (and
+    each archive member) may be at most MAX_UPLOAD_BYTES.
+    """
+    if len(files) > settings.BULK_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many files. Maximum per request: {settings.BULK_MAX_FILES}"
         )
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
+    
+    uploads = []
+    try:
+        for file in files:
+            uploads.append((file.filename, await spool_upload(file)))
+    except UploadTooLargeError as e:
+        for _, upload in uploads:
+            upload.delete()
+        raise HTTPException(status_code=413, detail=f"{file.filename}: {str(e)}")
+    
+    try:
+        job = get_job_queue().submit(
+            ingest_bulk,
+            uploads,
+            filename=f"{len(uploads)} files"
+        )
+    except QueueFullError as e:
+        for _, upload in uploads:
+            upload.delete()
+        raise HTTPException(status_code=429, detail=str(e))
+    
+    return JobResponse(**job)
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job_status(job_id: str):
+    """Get the status of an ingestion job"""
+    job = get_job_queue().get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return JobResponse(**job)
+
+# Fields a document listing can be projected to
+DOCUMENT_FIELDS = ("document_id", "filename", "file_type", "upload_date", "total_chunks")
 
-@router.get("/", response_model=DocumentListResponse)
-async def list_documents():
-    """Get list of all uploaded documents"""
+def _encode_cursor(doc: Dict[str, Any]) -> str:
+    """Opaque cursor pointing just after a document in (upload_date, document_id) order"""
+    position = {"upload_date": doc["upload_date"].isoformat(), "document_id": doc["document_id"]}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+def _decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Filter matching the documents after the cursor's position"""
     try:
-        documents_col = get_documents_collection()
-        docs = list(documents_col.find({}, {"_id": 0}).sort("upload_date", -1))
-        
-        document_list = [
-            DocumentInfo(
-                document_id=doc['document_id'],
-                filename=doc['filename'],
-                file_type=doc['file_type'],
-                upload_date=doc['upload_date'],
-                total_chunks=doc['total_chunks']
-            )
-            for doc in docs
-        ]
-        
-        return DocumentListResponse(
-            documents=document_list,
-            total=len(document_list)
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        upload_date = datetime.fromisoformat(position["upload_date"])
+        document_id = str(position["document_id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"$or": [
+        {"upload_date": {"$lt": upload_date}},
+        {"upload_date": upload_date, "document_id": {"$lt": document_id}}
+    ]}
+
+def _parse_fields(fields: Optional[str]) -> List[str]:
+    """Requested fields from a comma-separated list (all fields when empty)"""
+    if not fields:
+        return list(DOCUMENT_FIELDS)
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in DOCUMENT_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Available fields: {', '.join(DOCUMENT_FIELDS)}"
         )
+    return requested
+
+@router.get("/", response_model=DocumentListResponse, response_model_exclude_unset=True)
+async def list_documents(
+    limit: int = Query(default=settings.DOCUMENT_PAGE_SIZE, ge=1, le=settings.DOCUMENT_PAGE_MAX),
+    cursor: Optional[str] = None,
+    file_type: Optional[str] = None,
+    uploaded_after: Optional[datetime] = None,
+    uploaded_before: Optional[datetime] = None,
+    fields: Optional[str] = Query(default=None, description="Comma-separated fields to return; document_id is always included")
+):
+    """
+    List uploaded documents, newest first, one page at a time
+    
+    Pass the returned next_cursor as `cursor` to get the following page.
+    Filters apply to every page, so keep them unchanged while paging.
+    """
+    requested = _parse_fields(fields)
+    
+    conditions = []
+    if file_type:
+        conditions.append({"file_type": file_type.lower().lstrip(".")})
+    if uploaded_after or uploaded_before:
+        date_range = {}
+        if uploaded_after:
+            date_range["$gte"] = uploaded_after
+        if uploaded_before:
+            date_range["$lt"] = uploaded_before
+        conditions.append({"upload_date": date_range})
+    if cursor:
+        conditions.append(_decode_cursor(cursor))
+    query = {"$and": conditions} if len(conditions) > 1 else (conditions[0] if conditions else {})
+    
+    # The sort keys are always read, as the next cursor is built from them
+    projection = {"_id": 0, "document_id": 1, "upload_date": 1}
+    projection.update({field: 1 for field in requested})
+    
+    try:
+        documents_col = get_documents_collection()
+        # One extra document tells whether there is a next page
+        docs = await documents_col.find(query, projection).sort(
+            [("upload_date", -1), ("document_id", -1)]
+        ).limit(limit + 1).to_list()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching documents: {str(e)}")
+    
+    next_cursor = _encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    document_list = [
+        DocumentInfo(document_id=doc["document_id"], **{field: doc.get(field) for field in requested if field != "document_id"})
+        for doc in docs[:limit]
+    ]
+    
+    return DocumentListResponse(
+        documents=document_list,
+        total=len(document_list),
+        next_cursor=next_cursor
+    )
 
 @router.delete("/{document_id}", response_model=DeleteResponse)
 async def delete_document(document_id: str):
@@ -145,17 +223,24 @@ async def delete_document(document_id: str):
         chunks_col = get_chunks_collection()
         
         # Check if document exists
-        doc = documents_col.find_one({"document_id": document_id})
+        doc = await documents_col.find_one({"document_id": document_id})
         if not doc:
             raise HTTPException(status_code=404, detail="Document not found")
         
         # Delete from MongoDB
-        documents_col.delete_one({"document_id": document_id})
-        chunks_col.delete_many({"document_id": document_id})
+        await documents_col.delete_one({"document_id": document_id})
+        await chunks_col.delete_many({"document_id": document_id})
         
         # Delete from vector store
-        vector_store = get_vector_store()
-        vector_store.delete_by_document_id(document_id)
+        vector_store = await asyncio.to_thread(get_vector_store)
+        await asyncio.to_thread(vector_store.delete_by_document_id, document_id)
+        await asyncio.to_thread(vector_store.flush)
+        bump_corpus_generation()
+        
+        # Drop cached answers that cite this document
+        answer_cache = await asyncio.to_thread(get_answer_cache)
+        if answer_cache is not None:
+            await asyncio.to_thread(answer_cache.invalidate_documents, [document_id])
         
         return DeleteResponse(
             success=True,
@@ -175,15 +260,21 @@ async def delete_all_documents():
         chunks_col = get_chunks_collection()
         
         # Count before deletion
-        doc_count = documents_col.count_documents({})
+        doc_count = await documents_col.count_documents({})
         
         # Delete from MongoDB
-        documents_col.delete_many({})
-        chunks_col.delete_many({})
+        await documents_col.delete_many({})
+        await chunks_col.delete_many({})
         
         # Clear vector store
-        vector_store = get_vector_store()
-        vector_store.clear_all()
+        vector_store = await asyncio.to_thread(get_vector_store)
+        await asyncio.to_thread(vector_store.clear_all)
+        await asyncio.to_thread(vector_store.flush)
+        bump_corpus_generation()
+        
+        answer_cache = await asyncio.to_thread(get_answer_cache)
+        if answer_cache is not None:
+            await asyncio.to_thread(answer_cache.clear)
         
         return DeleteResponse(
             success=True,
@@ -0,0 +1,158 @@
+import asyncio
+import json
+import time
+from typing import Any, Dict, AsyncIterator, Optional
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.models.schemas import QueryRequest
+from app.utils.retrieval import retrieve, embed_questions
+from app.utils.context_builder import build_context
+from app.utils.llm import build_messages, stream_chat, OllamaError
+from app.utils.answer_cache import get_answer_cache, document_fingerprints
+from app.utils import metrics
+from app.config import settings
+
+router = APIRouter(prefix="/api", tags=["query"])
+
+NO_CONTEXT_ANSWER = "I couldn't find any relevant information in the uploaded documents."
+
+def _sse(event: str, data: Any) -> str:
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _cached_stream(entry: Dict[str, Any], trace: Optional[Dict[str, Any]]) -> AsyncIterator[str]:
+    """Replay a cached answer as the same events a generated one produces"""
+    try:
+        yield _sse("citations", entry["citations"])
+        yield _sse("token", {"content": entry["answer"]})
+        yield _sse("done", {"cached": True, "similarity": round(entry["similarity"], 4)})
+    finally:
+        metrics.end_trace(trace, source="cache")
+
+@router.post("/query")
+async def query(request: QueryRequest):
+    """
+    Answer a question from the uploaded documents, streamed as server-sent events
+    
+    Retrieved chunks are coalesced into passages and packed into the
+    context token budget before being sent to the model.
+    
+    Events, in order:
+    - citations: the passages in the prompt (number as cited in the answer,
+      document_id, chunk_index of the first chunk, chunk_indexes, spans of
+      each chunk in the passage text, score)
+    - token: a piece of the answer as it is generated (repeated)
+    - done: end of the answer; or error if generation failed
+    
+    With the answer cache enabled, a question similar enough to a past
+    one whose cited documents are unchanged is answered from the cache
+    (one token event; done carries "cached": true).
+    """
+    question = request.question.strip()
+    if not question:
+        raise HTTPException(status_code=400, detail="Question must not be empty")
+    top_k = request.top_k or settings.TOP_K_RETRIEVAL
+    trace = metrics.start_trace("query", top_k=top_k, document_ids=request.document_ids)
+    
+    answer_cache = await asyncio.to_thread(get_answer_cache)
+    embedding = None
+    if answer_cache is not None:
+        try:
+            with metrics.stage("query", "answer_cache"):
+                embedding = (await embed_questions([question]))[0]
+                cached = await answer_cache.lookup(embedding, top_k, request.document_ids)
+        except Exception as e:
+            print(f"Answer cache lookup failed: {str(e)}")
+            cached = None
+        if cached is not None:
+            metrics.QUERIES.labels("cache").inc()
+            return StreamingResponse(
+                _cached_stream(cached, trace),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+    
+    try:
+        hits = await retrieve(question, top_k=top_k, document_ids=request.document_ids)
+    except Exception as e:
+        metrics.QUERIES.labels("error").inc()
+        metrics.end_trace(trace, source="error", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Error retrieving documents: {str(e)}")
+    
+    try:
+        with metrics.stage("query", "context", hits=len(hits)):
+            passages = await asyncio.to_thread(build_context, hits)
+    except Exception as e:
+        metrics.QUERIES.labels("error").inc()
+        metrics.end_trace(trace, source="error", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Error building context: {str(e)}")
+    
+    citations = [
+        {
+            "number": passage["number"],
+            "document_id": passage["document_id"],
+            "chunk_index": passage["chunk_indexes"][0],
+            "chunk_indexes": passage["chunk_indexes"],
+            "spans": passage["spans"],
+            "score": passage["score"]
+        }
+        for passage in passages
+    ]
+    
+    # Content hashes of the cited documents as of retrieval, stored with the answer
+    fingerprints = None
+    if embedding is not None and passages:
+        try:
+            fingerprints = await document_fingerprints(list({passage["document_id"] for passage in passages}))
+        except Exception as e:
+            print(f"Could not read document fingerprints: {str(e)}")
+    
+    async def event_stream():
+        # The response body runs in its own task, so the trace is set again here
+        metrics.use_trace(trace)
+        source = "error"
+        try:
+            yield _sse("citations", citations)
+            
+            if not passages:
+                source = "no_context"
+                yield _sse("token", {"content": NO_CONTEXT_ANSWER})
+                yield _sse("done", {})
+                return
+            
+            started = time.perf_counter()
+            answer = []
+            with metrics.stage("query", "generate") as span:
+                try:
+                    async for content in stream_chat(build_messages(question, passages)):
+                        if not answer:
+                            span["first_token_ms"] = round((time.perf_counter() - started) * 1000, 3)
+                        answer.append(content)
+                        yield _sse("token", {"content": content})
+                except OllamaError as e:
+                    span["error"] = str(e)
+                    yield _sse("error", {"detail": str(e)})
+                    return
+            source = "generated"
+            
+            if fingerprints:
+                try:
+                    await asyncio.to_thread(
+                        answer_cache.store, question, embedding, top_k, request.document_ids,
+                        "".join(answer), citations, fingerprints, time.perf_counter() - started
+                    )
+                except Exception as e:
+                    print(f"Could not cache answer: {str(e)}")
+            
+            yield _sse("done", {})
+        finally:
+            metrics.QUERIES.labels(source).inc()
+            metrics.end_trace(trace, source=source, passages=len(passages))
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
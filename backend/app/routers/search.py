@@ -0,0 +1,47 @@
+from fastapi import APIRouter, HTTPException
+
+from app.models.schemas import (
+    BatchSearchRequest,
+    BatchSearchResponse,
+    SearchResult,
+    SearchHit
+)
+from app.utils.retrieval import retrieve_many
+from app.config import settings
+
+router = APIRouter(prefix="/api/search", tags=["search"])
+
+@router.post("/batch", response_model=BatchSearchResponse)
+async def batch_search(request: BatchSearchRequest):
+    """
+    Retrieve relevant chunks for several questions at once
+    
+    The questions are embedded in a single model call and searched in a
+    single vector store query.
+    """
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="At least one question is required")
+    if len(request.questions) > settings.MAX_BATCH_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many questions. Maximum per request: {settings.MAX_BATCH_QUERIES}"
+        )
+    
+    try:
+        results = await retrieve_many(
+            request.questions,
+            top_k=request.top_k,
+            document_ids=request.document_ids
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching documents: {str(e)}")
+    
+    return BatchSearchResponse(
+        results=[
+            SearchResult(
+                question=question,
+                results=[SearchHit(**hit) for hit in hits]
+            )
+            for question, hits in zip(request.questions, results)
+        ]
+    )
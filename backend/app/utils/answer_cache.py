@@ -0,0 +1,284 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Set
+import numpy as np
+
+from app.config import settings
+from app.utils import metrics
+from app.utils.database import get_documents_collection
+
+async def document_fingerprints(document_ids: List[str]) -> Dict[str, Optional[str]]:
+    """Current content hash of each existing document (None for documents stored without one)"""
+    if not document_ids:
+        return {}
+    cursor = get_documents_collection().find(
+        {"document_id": {"$in": list(document_ids)}},
+        {"_id": 0, "document_id": 1, "content_hash": 1}
+    )
+    return {doc["document_id"]: doc.get("content_hash") async for doc in cursor}
+
+class SemanticAnswerCache:
+    """
+    Cache of generated answers keyed by question embedding
+    
+    A lookup returns the stored answer of the most similar past question
+    if the cosine similarity reaches the threshold, the answer was
+    generated by the same model for the same top_k and document filter,
+    and every document the answer cited still has the content hash it had
+    when the answer was generated. Entries live in memory (one embedding
+    matrix plus an LRU) and in a SQLite file, so the cache survives
+    restarts; only the current model's entries are loaded.
+    """
+    
+    def __init__(self, path: str, model: str, max_items: int = 5000, threshold: float = 0.92):
+        self.path = path
+        self.model = model
+        self.max_items = max_items
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._by_document: Dict[str, Set[int]] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._slot_ids = np.full(max_items, -1, dtype=np.int64)
+        self._free_slots = list(range(max_items - 1, -1, -1))
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.saved_seconds = 0.0
+        
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, question TEXT NOT NULL, embedding BLOB NOT NULL, "
+            "top_k INTEGER NOT NULL, filter_key TEXT NOT NULL, answer TEXT NOT NULL, citations TEXT NOT NULL, "
+            "documents TEXT NOT NULL, generation_seconds REAL NOT NULL, last_used REAL NOT NULL, "
+            "model TEXT NOT NULL DEFAULT '')"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(answers)")}
+        if "model" not in columns:
+            # Files written before answers were keyed by model; their entries never match
+            self._conn.execute("ALTER TABLE answers ADD COLUMN model TEXT NOT NULL DEFAULT ''")
+        self._conn.commit()
+        self._load()
+    
+    @staticmethod
+    def filter_key(document_ids: Optional[List[str]]) -> str:
+        """Canonical form of a document filter"""
+        return json.dumps(sorted(document_ids)) if document_ids else ""
+    
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype=np.float32)
+        return embedding / max(float(np.linalg.norm(embedding)), 1e-12)
+    
+    def _load(self):
+        """Load the current model's most recently used entries from disk, dropping the rest of them"""
+        rows = self._conn.execute(
+            "SELECT id, question, embedding, top_k, filter_key, answer, citations, documents, generation_seconds "
+            "FROM answers WHERE model = ? ORDER BY last_used DESC",
+            (self.model,)
+        ).fetchall()
+        keep, drop = rows[:self.max_items], rows[self.max_items:]
+        for row in reversed(keep):
+            entry_id, question, blob, top_k, filter_key, answer, citations, documents, seconds = row
+            self._remember(entry_id, np.frombuffer(blob, dtype=np.float32), {
+                "question": question,
+                "top_k": top_k,
+                "filter_key": filter_key,
+                "answer": answer,
+                "citations": json.loads(citations),
+                "documents": json.loads(documents),
+                "generation_seconds": seconds
+            })
+        if drop:
+            self._conn.executemany("DELETE FROM answers WHERE id = ?", [(row[0],) for row in drop])
+            self._conn.commit()
+        if keep:
+            print(f"Answer cache loaded with {len(keep)} entries")
+    
+    def _remember(self, entry_id: int, embedding: np.ndarray, entry: Dict[str, Any]):
+        """Put an entry in memory, evicting the least recently used one if full"""
+        if self._matrix is None:
+            self._matrix = np.zeros((self.max_items, len(embedding)), dtype=np.float32)
+        if not self._free_slots:
+            self._forget(next(iter(self._entries)), delete=True)
+        slot = self._free_slots.pop()
+        self._matrix[slot] = embedding
+        self._slot_ids[slot] = entry_id
+        self._entries[entry_id] = {**entry, "id": entry_id, "slot": slot}
+        for document_id in entry["documents"]:
+            self._by_document.setdefault(document_id, set()).add(entry_id)
+    
+    def _forget(self, entry_id: int, delete: bool):
+        """Remove an entry from memory, and from disk if delete is set"""
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        self._slot_ids[entry["slot"]] = -1
+        self._free_slots.append(entry["slot"])
+        for document_id in entry["documents"]:
+            ids = self._by_document.get(document_id)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._by_document[document_id]
+        if delete:
+            self._conn.execute("DELETE FROM answers WHERE id = ?", (entry_id,))
+    
+    def find(self, embedding: np.ndarray, top_k: int, document_ids: Optional[List[str]]) -> Optional[Dict[str, Any]]:
+        """Most similar entry above the threshold for the same top_k and filter (not yet validated)"""
+        query = self._normalize(embedding)
+        filter_key = self.filter_key(document_ids)
+        with self._lock:
+            if not self._entries or self._matrix is None or len(query) != self._matrix.shape[1]:
+                return None
+            scores = self._matrix @ query
+            scores[self._slot_ids < 0] = -1.0
+            for slot in np.argsort(-scores):
+                similarity = float(scores[slot])
+                if similarity < self.threshold:
+                    break
+                entry = self._entries[int(self._slot_ids[slot])]
+                if entry["top_k"] == top_k and entry["filter_key"] == filter_key:
+                    return {**entry, "similarity": similarity}
+        return None
+    
+    async def lookup(self, embedding: np.ndarray, top_k: int, document_ids: Optional[List[str]]) -> Optional[Dict[str, Any]]:
+        """
+        Return a cached answer for a question, or None
+        
+        The cited documents' current content hashes are checked against
+        the ones recorded with the answer; a mismatch (document changed or
+        deleted) removes the entry and counts as a miss.
+        """
+        entry = await asyncio.to_thread(self.find, embedding, top_k, document_ids)
+        if entry is not None:
+            current = await document_fingerprints(list(entry["documents"]))
+            if current != entry["documents"]:
+                self.stale += 1
+                metrics.ANSWER_CACHE_LOOKUPS.labels("stale").inc()
+                await asyncio.to_thread(self.remove, entry["id"])
+                entry = None
+        
+        if entry is None:
+            self.misses += 1
+            metrics.ANSWER_CACHE_LOOKUPS.labels("miss").inc()
+            metrics.ANSWER_CACHE_HIT_RATE.set(self.hits / (self.hits + self.misses))
+            return None
+        
+        self.hits += 1
+        self.saved_seconds += entry["generation_seconds"]
+        metrics.ANSWER_CACHE_LOOKUPS.labels("hit").inc()
+        metrics.ANSWER_CACHE_HIT_RATE.set(self.hits / (self.hits + self.misses))
+        metrics.ANSWER_CACHE_SAVED_SECONDS.inc(entry["generation_seconds"])
+        await asyncio.to_thread(self._touch, entry["id"])
+        return entry
+    
+    def _touch(self, entry_id: int):
+        """Mark an entry as most recently used"""
+        with self._lock:
+            if entry_id in self._entries:
+                self._entries.move_to_end(entry_id)
+                self._conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (time.time(), entry_id))
+                self._conn.commit()
+    
+    def store(
+        self,
+        question: str,
+        embedding: np.ndarray,
+        top_k: int,
+        document_ids: Optional[List[str]],
+        answer: str,
+        citations: List[Dict[str, Any]],
+        documents: Dict[str, Optional[str]],
+        generation_seconds: float
+    ):
+        """Add an answer together with the content hashes of the documents it cites"""
+        embedding = self._normalize(embedding)
+        filter_key = self.filter_key(document_ids)
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO answers (question, embedding, top_k, filter_key, answer, citations, documents, "
+                "generation_seconds, last_used, model) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    question, embedding.tobytes(), top_k, filter_key, answer,
+                    json.dumps(citations), json.dumps(documents), generation_seconds, time.time(), self.model
+                )
+            )
+            self._remember(cursor.lastrowid, embedding, {
+                "question": question,
+                "top_k": top_k,
+                "filter_key": filter_key,
+                "answer": answer,
+                "citations": citations,
+                "documents": documents,
+                "generation_seconds": generation_seconds
+            })
+            self._conn.commit()
+    
+    def remove(self, entry_id: int):
+        """Remove one entry"""
+        with self._lock:
+            self._forget(entry_id, delete=True)
+            self._conn.commit()
+    
+    def invalidate_documents(self, document_ids: List[str]) -> int:
+        """Remove every answer that cites one of the documents; returns how many were removed"""
+        with self._lock:
+            entry_ids = set()
+            for document_id in document_ids:
+                entry_ids.update(self._by_document.get(document_id, ()))
+            for entry_id in entry_ids:
+                self._forget(entry_id, delete=True)
+            self._conn.commit()
+        return len(entry_ids)
+    
+    def clear(self):
+        """Remove every cached answer"""
+        with self._lock:
+            for entry_id in list(self._entries):
+                self._forget(entry_id, delete=False)
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate, saved generation time and size"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "saved_seconds": round(self.saved_seconds, 3),
+            "items": len(self._entries),
+            "max_items": self.max_items,
+            "threshold": self.threshold,
+            "model": self.model
+        }
+
+# Global instance
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+def get_answer_cache() -> Optional[SemanticAnswerCache]:
+    """Get or create answer cache singleton (None when disabled)"""
+    global _answer_cache
+    if _answer_cache is None and settings.ANSWER_CACHE_ENABLED:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                _answer_cache = SemanticAnswerCache(
+                    settings.ANSWER_CACHE_PATH,
+                    settings.OLLAMA_MODEL,
+                    max_items=settings.ANSWER_CACHE_SIZE,
+                    threshold=settings.ANSWER_CACHE_THRESHOLD
+                )
+    return _answer_cache
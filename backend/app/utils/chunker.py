@@ -0,0 +1,153 @@
+import threading
+from typing import Iterable, Iterator, Dict, Any, List, Tuple
+from app.config import settings
+
+# A piece of chunk text, the character offsets of its tokens and the
+# separator that goes in front of it when it follows another piece
+Piece = Tuple[str, List[Tuple[int, int]], str]
+
+class TokenChunker:
+    """
+    Split a stream of text segments into overlapping chunks measured in tokens
+    
+    Token counts come from the embedding model's tokenizer, so a chunk never
+    exceeds what the model will actually see. Every paragraph is tokenized
+    once and chunk text is only built when a chunk is emitted, so the total
+    work is linear in the size of the document.
+    """
+    
+    def __init__(self, tokenizer=None, chunk_size: int = 240, overlap: int = 48):
+        if overlap >= chunk_size:
+            raise ValueError("Chunk overlap must be smaller than the chunk size")
+        self.tokenizer = tokenizer if tokenizer is not None else get_tokenizer()
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+    
+    def count_tokens(self, text: str) -> int:
+        """Count the tokens in a piece of text"""
+        return len(self._token_offsets([text])[0])
+    
+    def iter_chunks(self, segments: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        """
+        Yield chunk dictionaries lazily as the segments are consumed
+        
+        Args:
+            segments: Text segments (pages, paragraphs...) in document order
+            
+        Yields:
+            Dictionaries with chunk_index, content, char_count and token_count
+        """
+        pieces: List[Piece] = []
+        total_tokens = 0
+        fresh_tokens = 0  # tokens not carried over from the previous chunk
+        chunk_index = 0
+        
+        for segment in segments:
+            paragraphs = [p.strip() for p in segment.split('\n\n')]
+            paragraphs = [p for p in paragraphs if p]
+            if not paragraphs:
+                continue
+            
+            for para, offsets in zip(paragraphs, self._token_offsets(paragraphs)):
+                for piece in self._split_paragraph(para, offsets):
+                    piece_tokens = len(piece[1])
+                    
+                    if total_tokens + piece_tokens > self.chunk_size:
+                        if fresh_tokens:
+                            yield self._make_chunk(pieces, chunk_index, total_tokens)
+                            chunk_index += 1
+                            carry = min(self.overlap, self.chunk_size - piece_tokens)
+                        else:
+                            # Only overlap from the last chunk; shrink it to make room
+                            carry = self.chunk_size - piece_tokens
+                        pieces = self._tail(pieces, carry)
+                        total_tokens = sum(len(p[1]) for p in pieces)
+                        fresh_tokens = 0
+                    
+                    pieces.append(piece)
+                    total_tokens += piece_tokens
+                    fresh_tokens += piece_tokens
+        
+        if fresh_tokens:
+            yield self._make_chunk(pieces, chunk_index, total_tokens)
+    
+    def _token_offsets(self, texts: List[str]) -> List[List[Tuple[int, int]]]:
+        """Tokenize texts in one batch and return the character span of every token"""
+        encoded = self.tokenizer(
+            texts,
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+            verbose=False
+        )
+        return encoded["offset_mapping"]
+    
+    def _split_paragraph(self, para: str, offsets: List[Tuple[int, int]]) -> Iterator[Piece]:
+        """Yield a paragraph as one piece, or as token windows if it is too long for a chunk"""
+        if not offsets:
+            return
+        if len(offsets) <= self.chunk_size:
+            yield para, offsets, "\n\n"
+            return
+        
+        window = self.chunk_size - self.overlap
+        for i in range(0, len(offsets), window):
+            window_offsets = offsets[i:i + window]
+            start = window_offsets[0][0]
+            yield (
+                para[start:window_offsets[-1][1]],
+                [(s - start, e - start) for s, e in window_offsets],
+                "\n\n" if i == 0 else " "
+            )
+    
+    @staticmethod
+    def _tail(pieces: List[Piece], num_tokens: int) -> List[Piece]:
+        """Return the last num_tokens tokens of a list of pieces"""
+        tail = []
+        remaining = num_tokens
+        for text, offsets, sep in reversed(pieces):
+            if remaining <= 0:
+                break
+            if len(offsets) <= remaining:
+                tail.append((text, offsets, sep))
+                remaining -= len(offsets)
+            else:
+                kept = offsets[-remaining:]
+                start = kept[0][0]
+                tail.append((text[start:], [(s - start, e - start) for s, e in kept], sep))
+                remaining = 0
+        tail.reverse()
+        return tail
+    
+    @staticmethod
+    def _make_chunk(pieces: List[Piece], chunk_index: int, token_count: int) -> Dict[str, Any]:
+        """Build a chunk dictionary from its pieces"""
+        content = pieces[0][0] + "".join(sep + text for text, _, sep in pieces[1:])
+        return {
+            "chunk_index": chunk_index,
+            "content": content,
+            "char_count": len(content),
+            "token_count": token_count
+        }
+
+# Global instance
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+def get_tokenizer():
+    """Get or create the embedding model's tokenizer singleton"""
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                from transformers import AutoTokenizer
+                _tokenizer = AutoTokenizer.from_pretrained(settings.EMBEDDING_MODEL)
+    return _tokenizer
+
+def get_chunker() -> TokenChunker:
+    """Create a chunker using the configured token sizes"""
+    return TokenChunker(
+        chunk_size=settings.CHUNK_TOKENS,
+        overlap=settings.CHUNK_OVERLAP_TOKENS
+    )
@@ -0,0 +1,153 @@
+from typing import List, Dict, Any, Optional
+from app.config import settings
+from app.utils.chunker import get_tokenizer
+
+def overlap_length(previous: str, following: str) -> int:
+    """
+    Length of the longest prefix of `following` that is also a suffix of `previous`
+    
+    Computed with the KMP prefix function over following + separator +
+    previous, so the cost is linear in the length of the texts.
+    """
+    limit = min(len(previous), len(following))
+    if limit == 0:
+        return 0
+    text = following[:limit] + "\0" + previous[-limit:]
+    prefix = [0] * len(text)
+    for i in range(1, len(text)):
+        k = prefix[i - 1]
+        while k and text[i] != text[k]:
+            k = prefix[k - 1]
+        if text[i] == text[k]:
+            k += 1
+        prefix[i] = k
+    return prefix[-1]
+
+def _merge_run(hits: List[Dict[str, Any]], min_overlap: int) -> Dict[str, Any]:
+    """Merge hits with consecutive chunk indexes of one document into one passage"""
+    content = hits[0]["content"]
+    spans = [{"chunk_index": hits[0]["chunk_index"], "start": 0, "end": len(content)}]
+    for hit in hits[1:]:
+        overlap = overlap_length(content, hit["content"])
+        if overlap < min_overlap:
+            # No shared text (e.g. a re-chunked document); keep both in full
+            overlap = 0
+            content += "\n\n"
+        start = len(content) - overlap
+        content += hit["content"][overlap:]
+        spans.append({"chunk_index": hit["chunk_index"], "start": start, "end": len(content)})
+    return {
+        "document_id": hits[0]["document_id"],
+        "chunk_indexes": [hit["chunk_index"] for hit in hits],
+        "content": content,
+        "spans": spans,
+        "score": max(hit["score"] for hit in hits),
+        "rank": min(hit["rank"] for hit in hits)
+    }
+
+def coalesce_hits(hits: List[Dict[str, Any]], min_overlap: int = 8) -> List[Dict[str, Any]]:
+    """
+    Group retrieved hits into passages of adjacent chunks
+    
+    Hits of the same document whose chunk indexes are consecutive are
+    merged, with the text they share through chunk overlap included once.
+    Passages are returned in the order of their best-ranked hit.
+    """
+    ranked = [{**hit, "rank": rank} for rank, hit in enumerate(hits)]
+    ranked.sort(key=lambda hit: (hit["document_id"], hit["chunk_index"]))
+    
+    passages = []
+    run: List[Dict[str, Any]] = []
+    for hit in ranked:
+        if run and hit["document_id"] == run[-1]["document_id"]:
+            if hit["chunk_index"] == run[-1]["chunk_index"]:
+                continue
+            if hit["chunk_index"] == run[-1]["chunk_index"] + 1:
+                run.append(hit)
+                continue
+        if run:
+            passages.append(_merge_run(run, min_overlap))
+        run = [hit]
+    if run:
+        passages.append(_merge_run(run, min_overlap))
+    
+    passages.sort(key=lambda passage: passage["rank"])
+    return passages
+
+def passage_label(passage: Dict[str, Any]) -> str:
+    """Header line identifying a passage in the prompt"""
+    first, last = passage["chunk_indexes"][0], passage["chunk_indexes"][-1]
+    chunks = f"chunk {first}" if first == last else f"chunks {first}-{last}"
+    return f"(document {passage['document_id']}, {chunks})"
+
+def _truncate(passage: Dict[str, Any], offsets: List, num_tokens: int) -> Dict[str, Any]:
+    """Keep the first num_tokens tokens of a passage, clipping its citation spans"""
+    end = offsets[num_tokens - 1][1]
+    spans = [
+        {**span, "end": min(span["end"], end)}
+        for span in passage["spans"]
+        if span["start"] < end
+    ]
+    return {
+        **passage,
+        "content": passage["content"][:end],
+        "chunk_indexes": [span["chunk_index"] for span in spans],
+        "spans": spans,
+        "truncated": True
+    }
+
+def build_context(
+    hits: List[Dict[str, Any]],
+    token_budget: Optional[int] = None,
+    min_passage_tokens: Optional[int] = None,
+    tokenizer=None
+) -> List[Dict[str, Any]]:
+    """
+    Turn retrieved hits into prompt passages that fit a token budget
+    
+    Adjacent chunks are coalesced first. Passages are then added in rank
+    order while their header and text fit in token_budget; a passage that
+    does not fit is cut at a token boundary if at least min_passage_tokens
+    remain, otherwise skipped. Tokens are counted with the embedding
+    model's tokenizer.
+    
+    Returns:
+        Passages with number (1-based, as cited in the prompt), document_id,
+        chunk_indexes, content, spans (character range of each chunk in
+        content), score and token_count
+    """
+    token_budget = token_budget or settings.CONTEXT_TOKEN_BUDGET
+    if min_passage_tokens is None:
+        min_passage_tokens = settings.CONTEXT_MIN_PASSAGE_TOKENS
+    tokenizer = tokenizer if tokenizer is not None else get_tokenizer()
+    
+    passages = coalesce_hits(hits)
+    if not passages:
+        return []
+    
+    encoded = tokenizer(
+        [passage["content"] for passage in passages] + [f"[{len(passages)}] {passage_label(p)}" for p in passages],
+        add_special_tokens=False,
+        return_offsets_mapping=True,
+        return_attention_mask=False,
+        return_token_type_ids=False,
+        verbose=False
+    )["offset_mapping"]
+    content_offsets, header_offsets = encoded[:len(passages)], encoded[len(passages):]
+    
+    selected = []
+    remaining = token_budget
+    for passage, offsets, header in zip(passages, content_offsets, header_offsets):
+        available = remaining - len(header)
+        if available <= 0:
+            break
+        if len(offsets) > available:
+            if available < min_passage_tokens:
+                continue
+            passage = _truncate(passage, offsets, available)
+            token_count = available
+        else:
+            token_count = len(offsets)
+        remaining -= len(header) + token_count
+        selected.append({**passage, "number": len(selected) + 1, "token_count": token_count})
+    return selected
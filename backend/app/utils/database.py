@@ -1,34 +1,76 @@
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient, IndexModel, ASCENDING, DESCENDING
+from bson.binary import Binary, BinaryVectorDtype, VECTOR_SUBTYPE
+import numpy as np
 from app.config import settings
 
 _client = None
 _db = None
 
-def get_mongodb_client():
-    """Get MongoDB client (singleton)"""
-    global _client
+async def connect_mongodb():
+    """Create the MongoDB client and check the connection (called at app startup)"""
+    global _client, _db
     
     if _client is None:
+        client = AsyncMongoClient(
+            settings.MONGODB_URI,
+            serverSelectionTimeoutMS=5000,
+            maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+            minPoolSize=settings.MONGODB_MIN_POOL_SIZE
+        )
         try:
-            _client = MongoClient(settings.MONGODB_URI, serverSelectionTimeoutMS=5000)
             # Test connection
-            _client.admin.command('ping')
+            await client.admin.command('ping')
+            _client = client
+            _db = client[settings.MONGODB_DB_NAME]
             print("MongoDB connected successfully")
         except Exception as e:
             print(f"MongoDB connection failed: {e}")
-            _client = None
+            await client.close()
+        else:
+            await ensure_indexes()
     
     return _client
 
+# Indexes behind document listing, duplicate and version lookups, and per-document chunk reads and deletes
+DOCUMENT_INDEXES = [
+    IndexModel([("document_id", ASCENDING)], name="document_id"),
+    IndexModel([("upload_date", DESCENDING), ("document_id", DESCENDING)], name="upload_date_document_id"),
+    IndexModel([("file_type", ASCENDING), ("upload_date", DESCENDING), ("document_id", DESCENDING)], name="file_type_upload_date"),
+    IndexModel([("content_hash", ASCENDING)], name="content_hash"),
+    IndexModel([("filename", ASCENDING), ("upload_date", DESCENDING)], name="filename_upload_date")
+]
+# Also serves queries on document_id alone
+CHUNK_INDEXES = [
+    IndexModel([("document_id", ASCENDING), ("chunk_index", ASCENDING)], name="document_id_chunk_index")
+]
+
+async def ensure_indexes():
+    """Create the collections' indexes if they do not exist yet (called after connecting)"""
+    db = get_database()
+    if db is None:
+        return
+    try:
+        await db["documents"].create_indexes(DOCUMENT_INDEXES)
+        await db["chunks"].create_indexes(CHUNK_INDEXES)
+        print("MongoDB indexes ensured")
+    except Exception as e:
+        print(f"MongoDB index creation failed: {e}")
+
+async def close_mongodb():
+    """Close the MongoDB client (called at app shutdown)"""
+    global _client, _db
+    
+    if _client is not None:
+        await _client.close()
+    _client = None
+    _db = None
+
+def get_mongodb_client():
+    """Get MongoDB client (None if not connected)"""
+    return _client
+
 def get_database():
     """Get database instance"""
-    global _db
-    
-    if _db is None:
-        client = get_mongodb_client()
-        if client is not None:
-            _db = client[settings.MONGODB_DB_NAME]
-    
     return _db
 
 # Initialize collections
@@ -46,15 +88,40 @@ def get_chunks_collection():
         return db["chunks"]
     return None
 
+# Embedding encoding
+def embedding_to_binary(embedding: np.ndarray) -> Binary:
+    """
+    Encode a float32 vector as BSON Binary (vector subtype, FLOAT32 dtype)
+    
+    The payload is the dtype byte, a padding byte and the raw little-endian
+    floats, so the vector is stored in 4 bytes per dimension instead of a
+    BSON array of doubles.
+    """
+    data = np.ascontiguousarray(embedding, dtype="<f4")
+    return Binary(BinaryVectorDtype.FLOAT32.value + b"\x00" + data.tobytes(), VECTOR_SUBTYPE)
+
+def binary_to_embedding(value) -> np.ndarray:
+    """Decode an embedding stored by embedding_to_binary (or a legacy list of floats)"""
+    if isinstance(value, (bytes, Binary)):
+        return np.frombuffer(value, dtype="<f4", offset=2)
+    return np.asarray(value, dtype=np.float32)
+
 # Test connection
 if __name__ == "__main__":
-    db = get_database()
-    if db is not None:  # Fixed: Compare with None instead of using bool()
-        print(f"Connected to database: {settings.MONGODB_DB_NAME}")
-        try:
-            collections = db.list_collection_names()
-            print(f"Collections: {collections if collections else '(no collections yet)'}")
-        except Exception as e:
-            print(f"Error listing collections: {e}")
-    else:
-        print("Failed to connect to database")
\ No newline at end of file
+    import asyncio
+    
+    async def main():
+        await connect_mongodb()
+        db = get_database()
+        if db is not None:
+            print(f"Connected to database: {settings.MONGODB_DB_NAME}")
+            try:
+                collections = await db.list_collection_names()
+                print(f"Collections: {collections if collections else '(no collections yet)'}")
+            except Exception as e:
+                print(f"Error listing collections: {e}")
+        else:
+            print("Failed to connect to database")
+        await close_mongodb()
+    
+    asyncio.run(main())
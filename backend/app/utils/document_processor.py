@@ -1,141 +1,273 @@
 import os
-from typing import List, Dict, Any
+import codecs
+import tempfile
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Iterator, Optional, Union, BinaryIO
 import PyPDF2
 import docx
-from io import BytesIO
+from io import BytesIO, TextIOWrapper
+
+from app.config import settings
+
+# Process pool for page-parallel PDF extraction (created on first use)
+_extraction_pool = None
+
+# A document's bytes, or the path of the file holding it
+Source = Union[bytes, str]
+
+# Characters read at a time from text files (bytes when checking their encoding)
+TEXT_BLOCK_SIZE = 1024 * 1024
+
+# Per-process cache of the last opened PDF so a worker parses each file only once
+_worker_reader = None
+_worker_reader_key = None
+_worker_file = None
+
+def _get_extraction_pool() -> ProcessPoolExecutor:
+    """Get or create the PDF extraction process pool"""
+    global _extraction_pool
+    if _extraction_pool is None:
+        _extraction_pool = ProcessPoolExecutor(
+            max_workers=settings.PDF_EXTRACT_WORKERS or os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _extraction_pool
+
+def _open_source(source: Source) -> BinaryIO:
+    """Binary file object over a document's bytes or its file"""
+    if isinstance(source, (bytes, bytearray)):
+        return BytesIO(source)
+    return open(source, "rb")
+
+def _extract_pdf_page_range(path: str, start: int, stop: int) -> List[str]:
+    """Extract the text of pages [start, stop) of a PDF file (runs in a worker process)"""
+    global _worker_reader, _worker_reader_key, _worker_file
+    # Reopen when the path now holds another file
+    stat = os.stat(path)
+    key = (path, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    if _worker_reader_key != key:
+        if _worker_file is not None:
+            _worker_file.close()
+        # PdfReader reads objects from the open file as pages need them; given a path it would load the whole file
+        _worker_file = open(path, "rb")
+        _worker_reader = PyPDF2.PdfReader(_worker_file)
+        _worker_reader_key = key
+    return [_worker_reader.pages[i].extract_text() or "" for i in range(start, stop)]
 
 class DocumentProcessor:
     """Handle document text extraction"""
     
+    # Supported file extensions
+    SUPPORTED_EXTENSIONS = {'.pdf', '.docx', '.txt', '.md'}
+    
     @staticmethod
-    def extract_text_from_pdf(file_content: bytes) -> str:
-        """Extract text from PDF file"""
+    def get_file_type(filename: str) -> Optional[str]:
+        """Get the file type ('pdf', 'docx', ...) of a supported file name, or None"""
+        file_ext = os.path.splitext(filename)[1].lower()
+        if file_ext not in DocumentProcessor.SUPPORTED_EXTENSIONS:
+            return None
+        return file_ext.replace('.', '')
+    
+    @staticmethod
+    def iter_pdf_pages(source: Source) -> Iterator[str]:
+        """
+        Yield the text of a PDF one page at a time, in page order
+        
+        Each segment starts with a '--- Page N ---' marker. Large PDFs are
+        split into page ranges that are extracted in parallel on a process
+        pool; at most a few ranges are in flight at once so memory stays
+        bounded by the consumer's pace. A PDF given by path is read from
+        its file as pages are needed rather than loaded whole.
+        """
+        stream = _open_source(source)
+        tmp_path = None
+        pending = deque()
         try:
-            pdf_file = BytesIO(file_content)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
+            try:
+                pdf_reader = PyPDF2.PdfReader(stream)
+                num_pages = len(pdf_reader.pages)
+                pages_per_task = max(1, settings.PDF_PAGES_PER_TASK)
+                workers = settings.PDF_EXTRACT_WORKERS or os.cpu_count() or 1
+            except Exception as e:
+                raise Exception(f"Error extracting PDF text: {str(e)}")
             
-            text = ""
-            for page_num, page in enumerate(pdf_reader.pages):
-                page_text = page.extract_text()
-                if page_text:
-                    text += f"\n--- Page {page_num + 1} ---\n"
-                    text += page_text
+            # Small documents or a single worker: extract in-process
+            if workers <= 1 or num_pages <= pages_per_task:
+                try:
+                    for page_num, page in enumerate(pdf_reader.pages):
+                        page_text = page.extract_text()
+                        if page_text:
+                            yield f"\n--- Page {page_num + 1} ---\n{page_text}"
+                except Exception as e:
+                    raise Exception(f"Error extracting PDF text: {str(e)}")
+                return
             
-            return text.strip()
-        except Exception as e:
-            raise Exception(f"Error extracting PDF text: {str(e)}")
+            # Worker processes read the PDF from its file instead of
+            # receiving the full byte string with every task
+            del pdf_reader
+            if isinstance(source, str):
+                path = source
+            else:
+                with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+                    tmp_path = tmp.name
+                    tmp.write(source)
+                path = tmp_path
+            
+            pool = _get_extraction_pool()
+            ranges = iter(range(0, num_pages, pages_per_task))
+            
+            def submit_next() -> bool:
+                start = next(ranges, None)
+                if start is None:
+                    return False
+                stop = min(start + pages_per_task, num_pages)
+                pending.append((start, pool.submit(_extract_pdf_page_range, path, start, stop)))
+                return True
+            
+            for _ in range(workers * 2):
+                if not submit_next():
+                    break
+            
+            while pending:
+                start, future = pending.popleft()
+                try:
+                    page_texts = future.result()
+                except Exception as e:
+                    raise Exception(f"Error extracting PDF text: {str(e)}")
+                submit_next()
+                for offset, page_text in enumerate(page_texts):
+                    if page_text:
+                        yield f"\n--- Page {start + offset + 1} ---\n{page_text}"
+        finally:
+            for _, future in pending:
+                future.cancel()
+            stream.close()
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
     
     @staticmethod
-    def extract_text_from_docx(file_content: bytes) -> str:
-        """Extract text from DOCX file"""
+    def extract_text_from_pdf(source: Source) -> str:
+        """Extract text from PDF file"""
+        return "".join(DocumentProcessor.iter_pdf_pages(source)).strip()
+    
+    @staticmethod
+    def iter_docx_paragraphs(source: Source) -> Iterator[str]:
+        """Yield the non-empty paragraphs of a DOCX file, one line each"""
         try:
-            docx_file = BytesIO(file_content)
-            doc = docx.Document(docx_file)
+            with _open_source(source) as docx_file:
+                doc = docx.Document(docx_file)
             
-            text = ""
-            for i, para in enumerate(doc.paragraphs):
+            for para in doc.paragraphs:
                 if para.text.strip():
-                    text += para.text + "\n"
-            
-            return text.strip()
+                    yield para.text + "\n"
         except Exception as e:
             raise Exception(f"Error extracting DOCX text: {str(e)}")
     
     @staticmethod
-    def extract_text_from_txt(file_content: bytes) -> str:
-        """Extract text from TXT file"""
+    def extract_text_from_docx(source: Source) -> str:
+        """Extract text from DOCX file"""
+        return "".join(DocumentProcessor.iter_docx_paragraphs(source)).strip()
+    
+    @staticmethod
+    def _text_encoding(source: Source) -> str:
+        """UTF-8 if the whole file decodes as UTF-8, else latin-1 (checked block by block)"""
+        decoder = codecs.getincrementaldecoder('utf-8')()
         try:
-            # Try UTF-8 first, then fallback to latin-1
-            try:
-                text = file_content.decode('utf-8')
-            except UnicodeDecodeError:
-                text = file_content.decode('latin-1')
-            
-            return text.strip()
-        except Exception as e:
-            raise Exception(f"Error extracting TXT text: {str(e)}")
+            with _open_source(source) as f:
+                for block in iter(lambda: f.read(TEXT_BLOCK_SIZE), b""):
+                    decoder.decode(block)
+                decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            return 'latin-1'
+        return 'utf-8'
     
     @staticmethod
-    def extract_text_from_markdown(file_content: bytes) -> str:
-        """Extract text from Markdown file"""
+    def iter_text_blocks(source: Source) -> Iterator[str]:
+        """
+        Yield a plain text file in blocks of about TEXT_BLOCK_SIZE characters
+        
+        Blocks end at paragraph breaks, so chunking the blocks gives the
+        same chunks as chunking the whole text, except for paragraphs
+        longer than four blocks: those are cut at their last line break or
+        space (anywhere if they have neither) and the chunker treats each
+        cut as a paragraph break.
+        """
+        encoding = DocumentProcessor._text_encoding(source)
+        with TextIOWrapper(_open_source(source), encoding=encoding, newline='') as f:
+            pending = ""
+            for block in iter(lambda: f.read(TEXT_BLOCK_SIZE), ""):
+                pending += block
+                cut = pending.rfind('\n\n')
+                if cut <= 0:
+                    if len(pending) < 4 * TEXT_BLOCK_SIZE:
+                        continue
+                    # Not in the break the paragraph starts with, which would leave it whole
+                    start = len(pending) - len(pending.lstrip('\n'))
+                    cut = max(pending.rfind('\n', start), pending.rfind(' ', start))
+                    if cut <= start:
+                        cut = len(pending)
+                yield pending[:cut]
+                pending = pending[cut:]
+            if pending:
+                yield pending
+    
+    @staticmethod
+    def _iter_text_file(source: Source, kind: str) -> Iterator[str]:
+        """iter_text_blocks with extraction errors reported for the file kind"""
         try:
-            # Markdown is plain text, just decode it
-            try:
-                text = file_content.decode('utf-8')
-            except UnicodeDecodeError:
-                text = file_content.decode('latin-1')
-            
-            return text.strip()
+            yield from DocumentProcessor.iter_text_blocks(source)
         except Exception as e:
-            raise Exception(f"Error extracting Markdown text: {str(e)}")
+            raise Exception(f"Error extracting {kind} text: {str(e)}")
     
     @staticmethod
-    def extract_text(file_content: bytes, file_type: str) -> str:
-        """Extract text based on file type"""
+    def extract_text_from_txt(source: Source) -> str:
+        """Extract text from TXT file"""
+        return "".join(DocumentProcessor._iter_text_file(source, "TXT")).strip()
+    
+    @staticmethod
+    def extract_text_from_markdown(source: Source) -> str:
+        """Extract text from Markdown file (plain text, just decoded)"""
+        return "".join(DocumentProcessor._iter_text_file(source, "Markdown")).strip()
+    
+    @staticmethod
+    def iter_text_segments(source: Source, file_type: str) -> Iterator[str]:
+        """
+        Yield the text of a document as a stream of segments
+        
+        Joining the segments and stripping the result gives the same text as
+        extract_text(); PDFs are yielded per page, DOCX per paragraph and
+        text files in blocks, so a file given by path is never held whole.
+        """
         file_type = file_type.lower()
         
         if file_type == 'pdf':
-            return DocumentProcessor.extract_text_from_pdf(file_content)
+            return DocumentProcessor.iter_pdf_pages(source)
         elif file_type == 'docx':
-            return DocumentProcessor.extract_text_from_docx(file_content)
+            return DocumentProcessor.iter_docx_paragraphs(source)
         elif file_type == 'txt':
-            return DocumentProcessor.extract_text_from_txt(file_content)
+            return DocumentProcessor._iter_text_file(source, "TXT")
         elif file_type in ['md', 'markdown']:
-            return DocumentProcessor.extract_text_from_markdown(file_content)
+            return DocumentProcessor._iter_text_file(source, "Markdown")
         else:
             raise ValueError(f"Unsupported file type: {file_type}")
     
     @staticmethod
-    def chunk_text(text: str, chunk_size: int = 700, overlap: int = 150) -> List[Dict[str, Any]]:
-        """
-        Split text into chunks with overlap
-        
-        Args:
-            text: Text to chunk
-            chunk_size: Target chunk size in characters (approximates tokens)
-            overlap: Overlap between chunks in characters
-            
-        Returns:
-            List of chunk dictionaries with content and metadata
-        """
-        # Split by paragraphs first
-        paragraphs = text.split('\n\n')
-        
-        chunks = []
-        current_chunk = ""
-        chunk_index = 0
-        
-        for para in paragraphs:
-            para = para.strip()
-            if not para:
-                continue
-            
-            # If adding this paragraph exceeds chunk size and we have content
-            if len(current_chunk) + len(para) > chunk_size and current_chunk:
-                # Save current chunk
-                chunks.append({
-                    "chunk_index": chunk_index,
-                    "content": current_chunk.strip(),
-                    "char_count": len(current_chunk.strip())
-                })
-                
-                # Start new chunk with overlap
-                overlap_text = current_chunk[-overlap:] if len(current_chunk) > overlap else current_chunk
-                current_chunk = overlap_text + "\n\n" + para
-                chunk_index += 1
-            else:
-                # Add to current chunk
-                if current_chunk:
-                    current_chunk += "\n\n" + para
-                else:
-                    current_chunk = para
-        
-        # Don't forget the last chunk
-        if current_chunk.strip():
-            chunks.append({
-                "chunk_index": chunk_index,
-                "content": current_chunk.strip(),
-                "char_count": len(current_chunk.strip())
-            })
+    def extract_text(source: Source, file_type: str) -> str:
+        """Extract text based on file type"""
+        file_type = file_type.lower()
         
-        return chunks
\ No newline at end of file
+        if file_type == 'pdf':
+            return DocumentProcessor.extract_text_from_pdf(source)
+        elif file_type == 'docx':
+            return DocumentProcessor.extract_text_from_docx(source)
+        elif file_type == 'txt':
+            return DocumentProcessor.extract_text_from_txt(source)
+        elif file_type in ['md', 'markdown']:
+            return DocumentProcessor.extract_text_from_markdown(source)
+        else:
+            raise ValueError(f"Unsupported file type: {file_type}")
@@ -0,0 +1,137 @@
+import asyncio
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+
+from app.config import settings
+from app.utils.embeddings import get_embedding_generator
+
+class EmbeddingBatcher:
+    """
+    Micro-batching scheduler for query embeddings
+    
+    Concurrent requests put their texts on a queue. A single scheduler task
+    collects them for up to max_wait_ms or until max_batch_size texts are
+    waiting, runs one batched encode in a thread and hands each request its
+    rows. While a batch is encoding, new requests keep accumulating, so
+    batches grow with load instead of the number of model calls.
+    """
+    
+    def __init__(self, max_batch_size: int = 64, max_wait_ms: float = 5):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.texts = 0
+        self.requests = 0
+    
+    async def start(self):
+        """Start the scheduler task on the running event loop"""
+        if self._task is not None and not self._task.done():
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name="embedding-batcher")
+        print(f"Embedding batcher started (max {self.max_batch_size} texts, {self.max_wait * 1000:g} ms)")
+    
+    async def stop(self):
+        """Cancel the scheduler task and fail any waiting requests"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        while self._queue is not None and not self._queue.empty():
+            self._fail_stopped([self._queue.get_nowait()])
+    
+    @staticmethod
+    def _fail_stopped(items: List[Tuple[List[str], asyncio.Future]]):
+        """Fail the futures of requests the stopped scheduler will not answer"""
+        for _, future in items:
+            if not future.done():
+                future.set_exception(RuntimeError("Embedding batcher stopped"))
+    
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts as part of the next batch; returns one float32 row per text"""
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((texts, future))
+        return await future
+    
+    async def _collect(self) -> List[Tuple[List[str], asyncio.Future]]:
+        """Wait for one request, then gather more until the batch is full or the wait is over"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        count = len(batch[0][0])
+        deadline = loop.time() + self.max_wait
+        try:
+            while count < self.max_batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                batch.append(item)
+                count += len(item[0])
+        except asyncio.CancelledError:
+            # Taken off the queue, so stop() would not see them
+            self._fail_stopped(batch)
+            raise
+        return batch
+    
+    async def _run(self):
+        """Scheduler loop"""
+        while True:
+            batch = await self._collect()
+            
+            # Encode each distinct text once
+            positions: Dict[str, int] = {}
+            for texts, _ in batch:
+                for text in texts:
+                    positions.setdefault(text, len(positions))
+            distinct = list(positions)
+            
+            try:
+                generator = await asyncio.to_thread(get_embedding_generator)
+                vectors = await asyncio.to_thread(generator.generate_embeddings, distinct, False)
+            except asyncio.CancelledError:
+                self._fail_stopped(batch)
+                raise
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            self.batches += 1
+            self.texts += len(distinct)
+            self.requests += len(batch)
+            for texts, future in batch:
+                if not future.done():
+                    future.set_result(vectors[[positions[text] for text in texts]])
+    
+    def stats(self) -> Dict[str, Any]:
+        """Batching counters"""
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "texts": self.texts,
+            "avg_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0
+        }
+
+# Global instance
+_embedding_batcher = None
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """Get or create the query embedding batcher singleton"""
+    global _embedding_batcher
+    if _embedding_batcher is None:
+        _embedding_batcher = EmbeddingBatcher(
+            max_batch_size=settings.QUERY_BATCH_MAX_SIZE,
+            max_wait_ms=settings.QUERY_BATCH_MAX_WAIT_MS
+        )
+    return _embedding_batcher
@@ -0,0 +1,174 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any
+import numpy as np
+
+from app.config import settings
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache: an in-memory LRU in front of a SQLite file
+    
+    Entries are keyed by a hash of the model name and the exact chunk text,
+    so a cached vector is only reused for the model that produced it. The
+    SQLite file holds at most max_disk_items entries (0 = no limit): once
+    it grows past that, the least recently stored or read from disk are
+    deleted until it is back to 90% of the limit.
+    """
+    
+    def __init__(self, path: str, max_memory_items: int = 20000, max_disk_items: int = 500000):
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL, "
+            "last_used REAL NOT NULL DEFAULT 0) WITHOUT ROWID"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")}
+        if "last_used" not in columns:
+            # Files written before the row cap; their entries count as the oldest
+            self._conn.execute("ALTER TABLE embeddings ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        # Upper bound on the rows in the file (stored keys may have replaced existing ones)
+        self._disk_items = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    
+    @staticmethod
+    def make_key(model_name: str, text: str) -> bytes:
+        """Cache key for a text embedded by a given model"""
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).digest()
+    
+    def get_many(self, model_name: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up embeddings for texts; missing entries are None"""
+        keys = [self.make_key(model_name, text) for text in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+        
+        with self._lock:
+            disk_lookup: Dict[bytes, List[int]] = {}
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+                    self.memory_hits += 1
+                else:
+                    disk_lookup.setdefault(key, []).append(i)
+            
+            if disk_lookup:
+                found = []
+                lookup_keys = list(disk_lookup)
+                for start in range(0, len(lookup_keys), 500):
+                    batch = lookup_keys[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                        batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        self._remember(key, vector)
+                        found.append(key)
+                        for i in disk_lookup.pop(key):
+                            results[i] = vector
+                            self.disk_hits += 1
+                if found:
+                    now = time.time()
+                    self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+                    self._conn.commit()
+            
+            self.misses += sum(len(indices) for indices in disk_lookup.values())
+        
+        return results
+    
+    def put_many(self, model_name: str, texts: List[str], vectors: List[np.ndarray]):
+        """Store embeddings for texts in both tiers"""
+        rows = []
+        now = time.time()
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self.make_key(model_name, text)
+                vector = np.ascontiguousarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, vector.tobytes(), now))
+            
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                rows
+            )
+            self._disk_items += len(rows)
+            if self.max_disk_items and self._disk_items > self.max_disk_items:
+                self._evict()
+            self._conn.commit()
+    
+    def _evict(self):
+        """Delete the least recently used rows until the file is back to 90% of its limit"""
+        self._disk_items = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if self._disk_items > self.max_disk_items:
+            excess = self._disk_items - int(self.max_disk_items * 0.9)
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+            self._disk_items -= excess
+    
+    def clear(self):
+        """Remove every cached embedding"""
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._disk_items = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and sizes"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "memory_items": len(self._memory),
+                "max_memory_items": self.max_memory_items,
+                "disk_items": self._disk_items,
+                "max_disk_items": self.max_disk_items
+            }
+    
+    def _remember(self, key: bytes, vector: np.ndarray):
+        """Put an entry in the memory tier, evicting the least recently used"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+# Global instance
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Get or create embedding cache singleton (None when disabled)"""
+    global _embedding_cache
+    if _embedding_cache is None and settings.EMBEDDING_CACHE_ENABLED:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache(
+                    settings.EMBEDDING_CACHE_PATH,
+                    max_memory_items=settings.EMBEDDING_CACHE_MEMORY_ITEMS,
+                    max_disk_items=settings.EMBEDDING_CACHE_DISK_ITEMS
+                )
+    return _embedding_cache
@@ -1,25 +1,97 @@
-from sentence_transformers import SentenceTransformer
-from typing import List
+from typing import List, Dict, Optional
+import threading
+import time
 import numpy as np
 
+from app.utils.embedding_cache import get_embedding_cache
+from app.utils import model_server
+from app.config import settings
+
 class EmbeddingGenerator:
-    """Generate embeddings using sentence-transformers"""
+    """
+    Generate embeddings using sentence-transformers
+    
+    The backend can be "torch" (default), "onnx" or "openvino"; model_file
+    selects a specific exported file, such as an int8-quantized ONNX model
+    (for example "onnx/model_qint8_avx2.onnx"). The encode API is the same
+    for all of them.
+    """
     
-    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
+    def __init__(
+        self,
+        model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+        backend: str = "torch",
+        model_file: Optional[str] = None
+    ):
         """Initialize the embedding model"""
-        print(f"Loading embedding model: {model_name}")
-        self.model = SentenceTransformer(model_name)
-        print(f"Embedding model loaded successfully")
+        # Imported here so that importing this module stays cheap
+        from sentence_transformers import SentenceTransformer
+        
+        print(f"Loading embedding model: {model_name} ({backend}{', ' + model_file if model_file else ''})")
+        started = time.perf_counter()
+        self.model_name = model_name
+        self.backend = backend
+        self.model_file = model_file
+        self.model = SentenceTransformer(
+            model_name,
+            backend=backend,
+            model_kwargs={"file_name": model_file} if model_file else None
+        )
+        self.load_seconds = time.perf_counter() - started
+        # Other backends produce slightly different vectors, so they get their own cache entries
+        if backend == "torch" and not model_file:
+            self.cache_namespace = model_name
+        else:
+            self.cache_namespace = f"{model_name}|{backend}|{model_file or ''}"
+        # The model is not safe for parallel encode calls from several threads
+        self._encode_lock = threading.Lock()
+        self.cache = get_embedding_cache()
+        print(f"Embedding model loaded successfully in {self.load_seconds:.2f}s")
     
-    def generate_embedding(self, text: str) -> List[float]:
-        """Generate embedding for a single text"""
-        embedding = self.model.encode(text, convert_to_numpy=True)
-        return embedding.tolist()
+    def _encode(self, texts, **kwargs) -> np.ndarray:
+        """Run the model, one call at a time"""
+        with self._encode_lock:
+            return self.model.encode(texts, convert_to_numpy=True, **kwargs)
     
-    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for multiple texts"""
-        embeddings = self.model.encode(texts, convert_to_numpy=True, show_progress_bar=True)
-        return [emb.tolist() for emb in embeddings]
+    def generate_embedding(self, text: str) -> np.ndarray:
+        """Generate embedding for a single text as a float32 vector"""
+        embedding = self._encode(text)
+        return np.ascontiguousarray(embedding, dtype=np.float32)
+    
+    def generate_embeddings(self, texts: List[str], use_cache: bool = True) -> np.ndarray:
+        """
+        Generate embeddings for multiple texts
+        
+        Cached embeddings are reused; only texts not seen before (for this
+        model) are sent to the model, each distinct text once. Pass
+        use_cache=False for one-off texts such as queries.
+        
+        Returns:
+            C-contiguous float32 array of shape (len(texts), dimension)
+        """
+        if self.cache is None or not use_cache:
+            embeddings = self._encode(texts, show_progress_bar=False)
+            return np.ascontiguousarray(embeddings, dtype=np.float32)
+        
+        vectors = self.cache.get_many(self.cache_namespace, texts)
+        
+        # Group the misses by text so duplicates are encoded once
+        missing: Dict[str, List[int]] = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(texts[i], []).append(i)
+        
+        if missing:
+            missing_texts = list(missing)
+            computed = self._encode(missing_texts, show_progress_bar=False)
+            self.cache.put_many(self.cache_namespace, missing_texts, computed)
+            for text, emb in zip(missing_texts, computed):
+                for i in missing[text]:
+                    vectors[i] = emb
+        
+        if not vectors:
+            return np.empty((0, self.get_embedding_dimension()), dtype=np.float32)
+        return np.stack(vectors).astype(np.float32, copy=False)
     
     def get_embedding_dimension(self) -> int:
         """Get the dimension of embeddings"""
@@ -27,10 +99,25 @@ class EmbeddingGenerator:
 
 # Global instance
 _embedding_generator = None
+_embedding_generator_lock = threading.Lock()
 
 def get_embedding_generator() -> EmbeddingGenerator:
-    """Get or create embedding generator singleton"""
+    """
+    Get or create embedding generator singleton
+    
+    With a model server configured (multi-worker mode) this is a proxy to
+    the generator loaded once in that process.
+    """
     global _embedding_generator
     if _embedding_generator is None:
-        _embedding_generator = EmbeddingGenerator()
-    return _embedding_generator
\ No newline at end of file
+        with _embedding_generator_lock:
+            if _embedding_generator is None:
+                if model_server.is_remote():
+                    _embedding_generator = model_server.connect().embedding_generator()
+                else:
+                    _embedding_generator = EmbeddingGenerator(
+                        settings.EMBEDDING_MODEL,
+                        backend=settings.EMBEDDING_BACKEND,
+                        model_file=settings.EMBEDDING_MODEL_FILE or None
+                    )
+    return _embedding_generator
@@ -0,0 +1,33 @@
+import httpx
+from app.config import settings
+
+_http_client = None
+
+def create_http_client() -> httpx.AsyncClient:
+    """Create the shared keep-alive HTTP client (called at app startup)"""
+    global _http_client
+    
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.OLLAMA_TIMEOUT, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+            )
+        )
+    return _http_client
+
+async def close_http_client():
+    """Close the shared HTTP client (called at app shutdown)"""
+    global _http_client
+    
+    if _http_client is not None:
+        await _http_client.aclose()
+    _http_client = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the shared HTTP client"""
+    if _http_client is None:
+        raise RuntimeError("HTTP client is not initialized")
+    return _http_client
@@ -0,0 +1,647 @@
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple, Callable, Union
+from io import BytesIO
+import asyncio
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+import uuid
+import zipfile
+from datetime import datetime
+import numpy as np
+from pymongo import ReplaceOne
+
+from app.utils.database import (
+    get_documents_collection,
+    get_chunks_collection,
+    embedding_to_binary,
+    binary_to_embedding
+)
+from app.utils.document_processor import DocumentProcessor
+from app.utils.chunker import get_chunker
+from app.utils.embeddings import get_embedding_generator
+from app.utils.vector_store import get_vector_store
+from app.utils.retrieval import bump_corpus_generation
+from app.utils.uploads import LocalFile, UploadTooLargeError, spool_stream
+from app.utils import metrics
+from app.config import settings
+
+class IngestionError(Exception):
+    """Raised when a document cannot be ingested because of its content"""
+    pass
+
+def content_hash(data) -> str:
+    """SHA-256 hex digest of file bytes or chunk text"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+class _CharCounter:
+    """Pass text segments through while counting their characters and the time spent extracting them"""
+    
+    def __init__(self, segments: Iterable[str]):
+        self.segments = segments
+        self.total_chars = 0
+        self.stripped_chars = 0
+        self.extract_seconds = 0.0
+    
+    def __iter__(self) -> Iterator[str]:
+        segments = iter(self.segments)
+        while True:
+            started = time.perf_counter()
+            segment = next(segments, None)
+            self.extract_seconds += time.perf_counter() - started
+            if segment is None:
+                return
+            self.total_chars += len(segment)
+            if self.stripped_chars < 10:
+                self.stripped_chars += len(segment.strip())
+            yield segment
+
+class _ChunkBackup:
+    """
+    Stored chunks overwritten by a new version, kept in a temporary file
+    
+    They are only needed if the new version fails and is rolled back, so
+    they are spilled to disk window by window instead of held in memory.
+    """
+    
+    def __init__(self):
+        directory = settings.UPLOAD_SPOOL_DIR or None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = tempfile.TemporaryFile(prefix="chunk-backup-", dir=directory)
+    
+    def write(self, chunks: List[Dict[str, Any]]):
+        pickle.dump(chunks, self._file)
+    
+    def iter_batches(self) -> Iterator[List[Dict[str, Any]]]:
+        """Read back the chunks in the batches they were written in"""
+        self._file.seek(0)
+        while True:
+            try:
+                yield pickle.load(self._file)
+            except EOFError:
+                return
+    
+    def close(self):
+        """Delete the file"""
+        self._file.close()
+
+class _DocumentState:
+    """Progress of one document through the ingestion pipeline"""
+    
+    def __init__(self, filename: str, file_type: Optional[str]):
+        self.document_id = str(uuid.uuid4())
+        self.filename = filename
+        self.file_type = file_type
+        self.content_hash: Optional[str] = None
+        self.segments: Optional[_CharCounter] = None
+        self.chunk_count = 0  # chunks produced, including unchanged ones
+        self.written: List[int] = []  # chunk indexes written to MongoDB and the vector store
+        self.error: Optional[str] = None
+        self.status = "pending"
+        # Set when the file is byte-identical to a stored document
+        self.duplicate_of: Optional[Dict[str, Any]] = None
+        # Set when the file is a new version of a stored document
+        self.previous: Optional[Dict[str, Any]] = None
+        self.previous_hashes: Dict[int, Optional[str]] = {}  # chunk_index -> content_hash
+        self.backup: Optional[_ChunkBackup] = None
+    
+    def discard_backup(self):
+        if self.backup is not None:
+            self.backup.close()
+            self.backup = None
+    
+    def check(self) -> Optional[str]:
+        """Reason this document failed, or None if it can be committed"""
+        if self.error:
+            return self.error
+        if self.segments is None or self.segments.stripped_chars < 10:
+            return "Document appears to be empty or too short"
+        if not self.chunk_count:
+            return "Failed to create chunks from document"
+        return None
+    
+    def report(self) -> Dict[str, Any]:
+        """Per-file result"""
+        if self.status == "duplicate":
+            return {
+                "filename": self.filename,
+                "file_type": self.file_type,
+                "document_id": self.duplicate_of["document_id"],
+                "total_chunks": self.duplicate_of["total_chunks"],
+                "status": "duplicate",
+                "message": f"Identical to already stored document '{self.duplicate_of['filename']}'"
+            }
+        if self.status == "updated":
+            stale = max(0, len(self.previous_hashes) - self.chunk_count)
+            message = (
+                f"Document updated: {len(self.written)} of {self.chunk_count} chunks changed, "
+                f"{stale} removed"
+            )
+        else:
+            message = f"Document processed successfully with {self.chunk_count} chunks"
+        committed = self.status in ("success", "updated")
+        return {
+            "filename": self.filename,
+            "file_type": self.file_type,
+            "document_id": self.document_id if committed else None,
+            "total_chunks": self.chunk_count if committed else 0,
+            "status": self.status if committed else "failed",
+            "message": message if committed else self.error
+        }
+
+async def _find_duplicate(file_hash: str) -> Optional[Dict[str, Any]]:
+    """Stored document with exactly this content, if any"""
+    return await get_documents_collection().find_one({"content_hash": file_hash}, {"_id": 0})
+
+async def _find_previous_version(filename: str) -> Tuple[Optional[Dict[str, Any]], Dict[int, Optional[str]]]:
+    """
+    Latest stored document with this filename and the content hash of each of its chunks
+    
+    Only the hashes are read; chunk text and embeddings stay in MongoDB.
+    Chunks stored without a hash map to None and count as changed.
+    """
+    previous = await get_documents_collection().find_one(
+        {"filename": filename},
+        {"_id": 0},
+        sort=[("upload_date", -1)]
+    )
+    if previous is None:
+        return None, {}
+    
+    hashes = {}
+    async for chunk in get_chunks_collection().find(
+        {"document_id": previous["document_id"]},
+        {"_id": 0, "chunk_index": 1, "content_hash": 1}
+    ):
+        hashes[chunk["chunk_index"]] = chunk.get("content_hash")
+    return previous, hashes
+
+async def _attach_moved_embeddings(items: List[Tuple[_DocumentState, Dict[str, Any]]]):
+    """
+    Give chunks whose text moved within a new version their stored embedding
+    
+    Looked up per window, by the chunk_index the text had in the previous
+    version. A stored chunk already overwritten earlier in this run no
+    longer has that text; such chunks are embedded again.
+    """
+    wanted: Dict[str, Dict[int, List[Dict[str, Any]]]] = {}
+    for state, chunk in items:
+        index = chunk.pop("moved_from", None)
+        if index is not None:
+            wanted.setdefault(state.document_id, {}).setdefault(index, []).append(chunk)
+    
+    for document_id, by_index in wanted.items():
+        async for old in get_chunks_collection().find(
+            {"document_id": document_id, "chunk_index": {"$in": list(by_index)}},
+            {"_id": 0, "chunk_index": 1, "content_hash": 1, "embedding": 1}
+        ):
+            for chunk in by_index[old["chunk_index"]]:
+                if old.get("content_hash") == chunk["content_hash"]:
+                    chunk["embedding"] = binary_to_embedding(old["embedding"])
+
+async def _back_up_overwritten(items: List[Tuple[_DocumentState, Dict[str, Any]]]):
+    """Copy the stored chunks a window of a new version is about to replace to each document's backup"""
+    overwritten: Dict[_DocumentState, List[int]] = {}
+    for state, chunk in items:
+        if chunk["chunk_index"] in state.previous_hashes:
+            overwritten.setdefault(state, []).append(chunk["chunk_index"])
+    
+    for state, indexes in overwritten.items():
+        old = await get_chunks_collection().find(
+            {"document_id": state.document_id, "chunk_index": {"$in": indexes}},
+            {"_id": 0}
+        ).to_list()
+        if old:
+            if state.backup is None:
+                state.backup = await asyncio.to_thread(_ChunkBackup)
+            await asyncio.to_thread(state.backup.write, old)
+
+def _iter_pooled_chunks(
+    files: Iterable[Tuple[str, Any]],
+    states: List[_DocumentState],
+    run: Callable
+) -> Iterator[Tuple[_DocumentState, Optional[Dict[str, Any]]]]:
+    """
+    Yield (document, chunk) pairs for all files in order
+    
+    After the last chunk of a document, (document, None) is yielded. A file
+    that cannot be extracted is marked as failed and skipped. Files that
+    are identical to a stored document yield no chunks; for a new version
+    of a stored filename, chunks whose text is unchanged at the same index
+    are skipped and chunks whose text exists elsewhere in the previous
+    version are marked to reuse its embedding (see _attach_moved_embeddings).
+    
+    Args:
+        run: Runs a coroutine on the event loop and returns its result
+    """
+    chunker = get_chunker()
+    seen_hashes: Dict[str, _DocumentState] = {}
+    seen_filenames = set()
+    
+    for filename, file_content in files:
+        state = _DocumentState(filename, DocumentProcessor.get_file_type(filename))
+        states.append(state)
+        
+        if isinstance(file_content, IngestionError):
+            state.error = str(file_content)
+        elif state.file_type is None:
+            state.error = f"Unsupported file type. Supported types: {', '.join(DocumentProcessor.SUPPORTED_EXTENSIONS)}"
+        else:
+            # Files on disk are extracted from their path; their hash is known from spooling or read in blocks
+            if isinstance(file_content, LocalFile):
+                size, source = file_content.size, file_content.path
+                state.content_hash = file_content.content_hash
+            else:
+                size, source = len(file_content), file_content
+                state.content_hash = content_hash(file_content)
+            metrics.BYTES_PROCESSED.inc(size)
+            
+            # Identical file: stored before, or earlier in this run
+            if state.content_hash in seen_hashes:
+                earlier = seen_hashes[state.content_hash]
+                state.duplicate_of = {
+                    "document_id": earlier.document_id,
+                    "filename": earlier.filename,
+                    "total_chunks": earlier.chunk_count
+                }
+            else:
+                state.duplicate_of = run(_find_duplicate(state.content_hash))
+            
+            if state.duplicate_of is not None:
+                state.status = "duplicate"
+                yield state, None
+                continue
+            seen_hashes[state.content_hash] = state
+            
+            # New version of a known filename
+            if filename not in seen_filenames:
+                state.previous, state.previous_hashes = run(_find_previous_version(filename))
+                if state.previous is not None:
+                    state.document_id = state.previous["document_id"]
+            seen_filenames.add(filename)
+            
+            # Where each chunk text of the previous version was
+            previous_indexes = {h: i for i, h in state.previous_hashes.items() if h is not None}
+            
+            # Time spent producing chunks, excluding the time the consumer holds them
+            busy_seconds = 0.0
+            try:
+                state.segments = _CharCounter(DocumentProcessor.iter_text_segments(source, state.file_type))
+                chunks = chunker.iter_chunks(state.segments)
+                while True:
+                    started = time.perf_counter()
+                    chunk = next(chunks, None)
+                    busy_seconds += time.perf_counter() - started
+                    if chunk is None:
+                        break
+                    state.chunk_count += 1
+                    chunk["content_hash"] = content_hash(chunk["content"])
+                    
+                    if state.previous_hashes.get(chunk["chunk_index"]) == chunk["content_hash"]:
+                        continue
+                    if chunk["content_hash"] in previous_indexes:
+                        chunk["moved_from"] = previous_indexes[chunk["content_hash"]]
+                    
+                    yield state, chunk
+            except Exception as e:
+                state.error = str(e)
+            
+            if state.segments is not None:
+                extract_seconds = state.segments.extract_seconds
+                metrics.record_stage("ingest", "extract", extract_seconds, filename=filename)
+                metrics.record_stage("ingest", "chunk", busy_seconds - extract_seconds, filename=filename, chunks=state.chunk_count)
+                metrics.CHUNKS_PROCESSED.inc(state.chunk_count)
+        
+        yield state, None
+
+def _take_chunks(stream: Iterator, size: int, finished: List[_DocumentState]) -> Tuple[List[Tuple[_DocumentState, Dict[str, Any]]], bool]:
+    """
+    Pull up to size chunks from the pooled stream
+    
+    Documents that end along the way are appended to finished.
+    
+    Returns:
+        The chunks taken and whether the stream is exhausted
+    """
+    items = []
+    for state, chunk in stream:
+        if chunk is None:
+            finished.append(state)
+            continue
+        items.append((state, chunk))
+        if len(items) >= size:
+            return items, False
+    return items, True
+
+def _chunk_doc(document_id: str, chunk: Dict[str, Any], embedding: np.ndarray) -> Dict[str, Any]:
+    """MongoDB document for a chunk"""
+    return {
+        "document_id": document_id,
+        "chunk_index": chunk['chunk_index'],
+        "content": chunk['content'],
+        "content_hash": chunk['content_hash'],
+        "char_count": chunk['char_count'],
+        "token_count": chunk.get('token_count'),
+        "embedding": embedding_to_binary(embedding)
+    }
+
+async def _rollback(state: _DocumentState):
+    """Undo the chunk writes of a document that could not be committed"""
+    if not state.written:
+        return
+    chunks_col = get_chunks_collection()
+    vector_store = get_vector_store()
+    
+    if state.previous is None:
+        await chunks_col.delete_many({"document_id": state.document_id})
+        await asyncio.to_thread(vector_store.delete_by_document_id, state.document_id)
+    else:
+        # Put back the previous version of every overwritten chunk, one backed-up window at a time
+        if state.backup is not None:
+            batches = state.backup.iter_batches()
+            while (restored := await asyncio.to_thread(next, batches, None)) is not None:
+                await chunks_col.bulk_write([
+                    ReplaceOne({"document_id": state.document_id, "chunk_index": chunk["chunk_index"]}, chunk, upsert=True)
+                    for chunk in restored
+                ], ordered=False)
+                await asyncio.to_thread(
+                    vector_store.add_chunk_records,
+                    restored,
+                    np.stack([binary_to_embedding(chunk["embedding"]) for chunk in restored])
+                )
+        added = [i for i in state.written if i not in state.previous_hashes]
+        if added:
+            await chunks_col.delete_many({"document_id": state.document_id, "chunk_index": {"$in": added}})
+            await asyncio.to_thread(vector_store.delete_chunks, state.document_id, added)
+    state.written = []
+    state.discard_backup()
+
+def expand_archives(files: Iterable[Tuple[str, Any]]) -> Iterator[Tuple[str, Any]]:
+    """
+    Yield files, replacing each .zip archive by its supported members
+    
+    Members are spooled to temporary files one at a time, and each is
+    deleted when the next one is requested. An archive (or member) that
+    cannot be read is yielded with an IngestionError in place of its
+    content, so it is reported as a failed file.
+    """
+    for filename, file_content in files:
+        if not filename.lower().endswith('.zip'):
+            yield filename, file_content
+            continue
+        
+        try:
+            archive = zipfile.ZipFile(file_content.path if isinstance(file_content, LocalFile) else BytesIO(file_content))
+        except zipfile.BadZipFile as e:
+            yield filename, IngestionError(f"Invalid zip archive: {str(e)}")
+            continue
+        
+        with archive:
+            members = [
+                info for info in archive.infolist()
+                if not info.is_dir()
+                and not info.filename.startswith('__MACOSX/')
+                and DocumentProcessor.get_file_type(info.filename) is not None
+            ]
+            if len(members) > settings.BULK_MAX_FILES:
+                yield filename, IngestionError(f"Archive contains more than {settings.BULK_MAX_FILES} documents")
+                continue
+            for info in members:
+                name = f"{filename}/{info.filename}"
+                try:
+                    with archive.open(info) as stream:
+                        member = spool_stream(stream, os.path.splitext(info.filename)[1])
+                except UploadTooLargeError as e:
+                    yield name, IngestionError(str(e))
+                    continue
+                except (zipfile.BadZipFile, RuntimeError, NotImplementedError, OSError) as e:
+                    # Corrupt (bad CRC), encrypted or unsupported-compression member
+                    yield name, IngestionError(f"Cannot read archive member: {str(e)}")
+                    continue
+                try:
+                    yield name, member
+                finally:
+                    member.delete()
+
+async def ingest_documents(files: Iterable[Tuple[str, bytes]]) -> List[Dict[str, Any]]:
+    """
+    Ingest many documents, pooling their chunks into shared batches
+    
+    Chunks from consecutive documents fill fixed-size embedding batches of
+    EMBEDDING_BATCH_SIZE, and are written to MongoDB and the vector store
+    in bulk once BULK_WRITE_SIZE chunks are buffered. A document's
+    metadata is written after all its chunks are. Identical files are not
+    processed again, and new versions of a stored filename only write the
+    chunks that changed. Failures are reported per file and do not stop
+    the other files.
+    
+    Args:
+        files: (filename, content) pairs, content being bytes or a LocalFile;
+            consumed lazily in a worker thread
+        
+    Returns:
+        One report dictionary per file, in input order
+    """
+    embedding_gen = await asyncio.to_thread(get_embedding_generator)
+    vector_store = await asyncio.to_thread(get_vector_store)
+    documents_col = get_documents_collection()
+    chunks_col = get_chunks_collection()
+    if documents_col is None or chunks_col is None:
+        raise RuntimeError("MongoDB is not connected")
+    
+    loop = asyncio.get_running_loop()
+    
+    def run(coro):
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+    
+    states: List[_DocumentState] = []
+    stream = _iter_pooled_chunks(files, states, run)
+    finished: List[_DocumentState] = []
+    
+    buffered_chunks: List[Tuple[_DocumentState, Dict[str, Any]]] = []
+    buffered_embeddings: List[np.ndarray] = []
+    
+    async def flush():
+        """Write buffered chunks, then commit or roll back finished documents"""
+        keep = [i for i, (state, _) in enumerate(buffered_chunks) if not state.error]
+        if keep:
+            items = [buffered_chunks[i] for i in keep]
+            embeddings = np.concatenate(buffered_embeddings)[keep]
+            
+            inserts = []
+            replaces = []
+            for (state, chunk), embedding in zip(items, embeddings):
+                doc = _chunk_doc(state.document_id, chunk, embedding)
+                if state.previous is None:
+                    inserts.append(doc)
+                else:
+                    replaces.append(ReplaceOne(
+                        {"document_id": state.document_id, "chunk_index": chunk['chunk_index']},
+                        doc,
+                        upsert=True
+                    ))
+                state.written.append(chunk['chunk_index'])
+            
+            with metrics.stage("ingest", "mongo_write", chunks=len(items)):
+                if replaces:
+                    await _back_up_overwritten([(state, chunk) for state, chunk in items if state.previous is not None])
+                if inserts:
+                    await chunks_col.insert_many(inserts, ordered=False)
+                if replaces:
+                    await chunks_col.bulk_write(replaces, ordered=False)
+            
+            with metrics.stage("ingest", "vector_write", chunks=len(items)):
+                await asyncio.to_thread(
+                    vector_store.add_chunk_records,
+                    [{**chunk, "document_id": state.document_id} for state, chunk in items],
+                    embeddings
+                )
+            metrics.CHUNKS_WRITTEN.inc(len(items))
+        buffered_chunks.clear()
+        buffered_embeddings.clear()
+        
+        # Every finished document has all its chunks written by now
+        new_documents = []
+        for state in finished:
+            if state.status == "duplicate":
+                continue
+            error = state.check()
+            if error:
+                state.error = error
+                state.status = "failed"
+                await _rollback(state)
+                continue
+            
+            metadata = {
+                "document_id": state.document_id,
+                "filename": state.filename,
+                "file_type": state.file_type,
+                "content_hash": state.content_hash,
+                "upload_date": datetime.utcnow(),
+                "total_chunks": state.chunk_count,
+                "total_chars": state.segments.total_chars
+            }
+            if state.previous is None:
+                new_documents.append(metadata)
+                state.status = "success"
+            else:
+                # Remove chunks beyond the end of the new version
+                stale = [i for i in state.previous_hashes if i >= state.chunk_count]
+                if stale:
+                    await chunks_col.delete_many({
+                        "document_id": state.document_id,
+                        "chunk_index": {"$gte": state.chunk_count}
+                    })
+                    await asyncio.to_thread(vector_store.delete_chunks, state.document_id, stale)
+                metadata["version"] = state.previous.get("version", 1) + 1
+                await documents_col.update_one({"document_id": state.document_id}, {"$set": metadata})
+                state.status = "updated"
+                state.discard_backup()
+        
+        if new_documents:
+            await documents_col.insert_many(new_documents, ordered=False)
+        finished.clear()
+    
+    try:
+        exhausted = False
+        while not exhausted:
+            items, exhausted = await asyncio.to_thread(
+                _take_chunks, stream, settings.EMBEDDING_BATCH_SIZE, finished
+            )
+            
+            if items:
+                await _attach_moved_embeddings(items)
+                # Embed the chunks that cannot reuse a stored embedding in one model call
+                texts = [chunk['content'] for _, chunk in items if "embedding" not in chunk]
+                computed = iter(())
+                if texts:
+                    with metrics.stage("ingest", "embed", chunks=len(texts)):
+                        computed = iter(await asyncio.to_thread(embedding_gen.generate_embeddings, texts))
+                    metrics.CHUNKS_EMBEDDED.inc(len(texts))
+                embeddings = np.stack([
+                    chunk.pop("embedding") if "embedding" in chunk else next(computed)
+                    for _, chunk in items
+                ])
+                
+                buffered_chunks.extend(items)
+                buffered_embeddings.append(embeddings)
+            
+            if exhausted or len(buffered_chunks) >= settings.BULK_WRITE_SIZE:
+                await flush()
+    except Exception:
+        # Undo chunk writes of documents that were not committed
+        for state in states:
+            if state.status == "pending":
+                await _rollback(state)
+        raise
+    finally:
+        if any(state.written or state.status == "updated" for state in states):
+            with metrics.stage("ingest", "vector_flush"):
+                await asyncio.to_thread(vector_store.flush)
+            bump_corpus_generation()
+        for state in states:
+            metrics.DOCUMENTS_INGESTED.labels(state.status).inc()
+    
+    return [state.report() for state in states]
+
+def _delete_temporary(files: Iterable[Tuple[str, Any]]):
+    """Delete the spooled upload files of a finished job"""
+    for _, file_content in files:
+        if isinstance(file_content, LocalFile):
+            file_content.delete()
+
+async def ingest_document(file_content: Union[bytes, LocalFile], filename: str) -> Dict[str, Any]:
+    """
+    Run the full ingestion pipeline for one document
+    
+    A spooled upload file is deleted once the document is processed.
+    
+    Returns:
+        Dictionary matching DocumentUploadResponse
+        
+    Raises:
+        IngestionError: if the document could not be processed
+    """
+    try:
+        result = (await ingest_documents([(filename, file_content)]))[0]
+    finally:
+        _delete_temporary([(filename, file_content)])
+    if result["status"] == "failed":
+        raise IngestionError(result["message"])
+    return result
+
+async def ingest_bulk(files: List[Tuple[str, Union[bytes, LocalFile]]]) -> Dict[str, Any]:
+    """
+    Ingest uploaded files and zip archives
+    
+    Spooled upload files are deleted once the job ends.
+    
+    Returns:
+        Dictionary matching BulkUploadResponse
+    """
+    try:
+        results = await ingest_documents(expand_archives(files))
+    finally:
+        _delete_temporary(files)
+    return summarize_results(results)
+
+def summarize_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Count the per-file reports of ingest_documents
+    
+    Duplicates and updated documents count as succeeded.
+    
+    Returns:
+        Dictionary matching BulkUploadResponse
+    """
+    succeeded = sum(1 for result in results if result["status"] != "failed")
+    return {
+        "total_files": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "files": results
+    }
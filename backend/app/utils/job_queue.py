@@ -0,0 +1,166 @@
+import asyncio
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Callable, Awaitable, Optional, List
+
+from app.config import settings
+from app.utils.ingestion import IngestionError
+from app.utils import metrics, model_server
+
+class QueueFullError(Exception):
+    """Raised when the ingestion queue has no room for another job"""
+    pass
+
+class IngestionJobQueue:
+    """Bounded queue of ingestion jobs processed by a pool of background workers"""
+
+    def __init__(self, num_workers: int = 2, max_queue_size: int = 16, max_finished_jobs: int = 1000):
+        self.num_workers = num_workers
+        self.max_queue_size = max_queue_size
+        self.max_finished_jobs = max_finished_jobs
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Job records visible to every worker process (multi-worker mode only)
+        self._shared = model_server.shared_jobs()
+
+    async def start(self):
+        """Start the worker tasks on the running event loop"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"ingest-worker-{i}")
+            for i in range(self.num_workers)
+        ]
+        print(f"Ingestion queue started with {self.num_workers} workers (max depth {self.max_queue_size})")
+
+    async def stop(self):
+        """Cancel the worker tasks"""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, func: Callable[..., Awaitable[Dict[str, Any]]], *args, filename: str = None) -> Dict[str, Any]:
+        """
+        Enqueue a job (a coroutine function and its arguments) without waiting
+
+        Raises:
+            QueueFullError: if the queue is at capacity
+        """
+        if self._queue is None:
+            raise RuntimeError("Ingestion queue is not running")
+
+        job = self._new_job(filename)
+
+        try:
+            self._queue.put_nowait((job["job_id"], func, args))
+        except asyncio.QueueFull:
+            raise QueueFullError("Ingestion queue is full, try again later")
+
+        self._jobs[job["job_id"]] = job
+        self._prune_finished_jobs()
+        self._publish(job)
+        return job
+
+    def add_completed(self, result: Dict[str, Any], filename: str = None) -> Dict[str, Any]:
+        """Record a job that finished without going through the queue"""
+        job = self._new_job(filename)
+        job["status"] = "completed"
+        job["started_at"] = job["finished_at"] = job["created_at"]
+        job["result"] = result
+
+        self._jobs[job["job_id"]] = job
+        self._prune_finished_jobs()
+        self._publish(job)
+        return job
+
+    @staticmethod
+    def _new_job(filename: Optional[str]) -> Dict[str, Any]:
+        """Create a queued job record"""
+        return {
+            "job_id": str(uuid.uuid4()),
+            "status": "queued",
+            "filename": filename,
+            "created_at": datetime.utcnow(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None
+        }
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job by ID, including jobs of other worker processes"""
+        job = self._jobs.get(job_id)
+        if job is None and self._shared is not None:
+            job = self._shared.get(job_id)
+        return job
+
+    def _publish(self, job: Dict[str, Any]):
+        """Share the job's current state with the other worker processes"""
+        if self._shared is not None:
+            self._shared.put(dict(job))
+
+    def get_depth(self) -> int:
+        """Number of jobs waiting to be picked up"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _worker(self):
+        """Take jobs off the queue and run them"""
+        while True:
+            job_id, func, args = await self._queue.get()
+            job = self._jobs.get(job_id)
+            trace = metrics.start_trace("ingest_job", job_id=job_id, filename=job["filename"] if job else None)
+            try:
+                if job is not None:
+                    job["status"] = "processing"
+                    job["started_at"] = datetime.utcnow()
+                    self._publish(job)
+                result = await func(*args)
+                if job is not None:
+                    job["status"] = "completed"
+                    job["result"] = result
+            except IngestionError as e:
+                if job is not None:
+                    job["status"] = "failed"
+                    job["error"] = str(e)
+            except Exception as e:
+                if job is not None:
+                    job["status"] = "failed"
+                    job["error"] = f"Error processing document: {str(e)}"
+            finally:
+                if job is not None:
+                    job["finished_at"] = datetime.utcnow()
+                    self._publish(job)
+                if job is not None:
+                    metrics.end_trace(trace, status=job["status"], error=job["error"])
+                else:
+                    metrics.end_trace(trace)
+                # Drop our reference to the (possibly large) job arguments
+                args = None
+                self._queue.task_done()
+
+    def _prune_finished_jobs(self):
+        """Forget the oldest finished jobs beyond the history limit"""
+        finished = [
+            job_id for job_id, job in self._jobs.items()
+            if job["status"] in ("completed", "failed")
+        ]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+
+# Global instance
+_job_queue = None
+
+def get_job_queue() -> IngestionJobQueue:
+    """Get or create ingestion job queue singleton"""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = IngestionJobQueue(
+            num_workers=settings.INGEST_WORKERS,
+            max_queue_size=settings.INGEST_QUEUE_SIZE,
+            max_finished_jobs=settings.JOB_HISTORY_SIZE
+        )
+    return _job_queue
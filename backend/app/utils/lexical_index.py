@@ -0,0 +1,276 @@
+import os
+import pickle
+import re
+import threading
+import time
+from array import array
+from typing import List, Dict, Any, Optional, Tuple, Iterable
+import numpy as np
+
+# Words, numbers and identifiers such as "ERR-404", "v2.3.1" or "AB_1234"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._\-/:#][a-z0-9]+)*")
+PART_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase terms of a text for lexical matching
+    
+    Compound identifiers are indexed whole and by their parts, so
+    "ERR-404" matches queries for "err-404", "err" and "404".
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        terms.append(token)
+        if not token.isalnum():
+            terms.extend(PART_PATTERN.findall(token))
+    return terms
+
+class LexicalIndex:
+    """
+    In-process BM25 inverted index over chunk text
+    
+    Chunks get an internal number; each term maps to two compact arrays of
+    chunk numbers and term frequencies. Deletes only mark chunks as dead,
+    and dead entries are dropped when the index is compacted on save.
+    """
+    
+    FORMAT_VERSION = 1
+    
+    def __init__(self, path: Optional[str] = None, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._reset()
+        if path and os.path.exists(path):
+            self._load()
+    
+    def _reset(self):
+        """Empty the in-memory structures"""
+        self._chunk_ids: List[Optional[str]] = []
+        self._chunk_documents: List[Optional[str]] = []
+        self._numbers: Dict[str, int] = {}
+        self._document_chunks: Dict[str, List[int]] = {}
+        self._lengths = array('I')
+        self._live = bytearray()
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._live_count = 0
+        self._live_length = 0
+    
+    def __len__(self) -> int:
+        return self._live_count
+    
+    @property
+    def exists_on_disk(self) -> bool:
+        """Whether the index has been saved before"""
+        return bool(self.path) and os.path.exists(self.path)
+    
+    def add(self, chunks: Iterable[Dict[str, Any]]):
+        """Index chunks (dictionaries with id, document_id and content), replacing existing ids"""
+        with self._lock:
+            for chunk in chunks:
+                chunk_id = chunk["id"]
+                if chunk_id in self._numbers:
+                    self._remove_number(self._numbers[chunk_id])
+                
+                number = len(self._chunk_ids)
+                terms = tokenize(chunk["content"])
+                self._chunk_ids.append(chunk_id)
+                self._chunk_documents.append(chunk["document_id"])
+                self._numbers[chunk_id] = number
+                self._document_chunks.setdefault(chunk["document_id"], []).append(number)
+                self._lengths.append(len(terms))
+                self._live.append(1)
+                self._live_count += 1
+                self._live_length += len(terms)
+                
+                counts: Dict[str, int] = {}
+                for term in terms:
+                    counts[term] = counts.get(term, 0) + 1
+                for term, count in counts.items():
+                    postings = self._postings.get(term)
+                    if postings is None:
+                        postings = self._postings[term] = (array('I'), array('I'))
+                    postings[0].append(number)
+                    postings[1].append(count)
+            self._dirty = True
+    
+    def delete_ids(self, chunk_ids: Iterable[str]):
+        """Remove chunks by id"""
+        with self._lock:
+            for chunk_id in chunk_ids:
+                number = self._numbers.get(chunk_id)
+                if number is not None:
+                    self._remove_number(number)
+            self._dirty = True
+    
+    def delete_document(self, document_id: str):
+        """Remove every chunk of a document"""
+        with self._lock:
+            for number in self._document_chunks.pop(document_id, []):
+                if self._live[number]:
+                    self._remove_number(number, keep_document_entry=True)
+            self._dirty = True
+    
+    def clear(self):
+        """Remove every chunk"""
+        with self._lock:
+            self._reset()
+            self._dirty = True
+    
+    def _remove_number(self, number: int, keep_document_entry: bool = False):
+        """Mark a chunk as dead"""
+        if not self._live[number]:
+            return
+        self._live[number] = 0
+        self._live_count -= 1
+        self._live_length -= self._lengths[number]
+        del self._numbers[self._chunk_ids[number]]
+        if not keep_document_entry:
+            numbers = self._document_chunks.get(self._chunk_documents[number])
+            if numbers is not None:
+                numbers.remove(number)
+                if not numbers:
+                    del self._document_chunks[self._chunk_documents[number]]
+    
+    def search(self, query: str, top_k: int = 5, document_ids: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Rank chunks by BM25 score for a query
+        
+        Returns:
+            (chunk id, score) pairs, best first
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            if not terms or not self._live_count:
+                return []
+            
+            live = np.frombuffer(self._live, dtype=np.uint8).astype(bool)
+            if document_ids:
+                allowed = np.zeros(len(live), dtype=bool)
+                for document_id in document_ids:
+                    numbers = self._document_chunks.get(document_id)
+                    if numbers:
+                        allowed[numbers] = True
+                live &= allowed
+            
+            lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+            average_length = self._live_length / self._live_count or 1.0
+            scores = np.zeros(len(live), dtype=np.float32)
+            
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                numbers = np.frombuffer(postings[0], dtype=np.uint32)
+                frequencies = np.frombuffer(postings[1], dtype=np.uint32).astype(np.float32)
+                alive = live[numbers]
+                if not alive.any():
+                    continue
+                numbers = numbers[alive]
+                frequencies = frequencies[alive]
+                
+                document_frequency = len(numbers)
+                idf = np.log(1 + (self._live_count - document_frequency + 0.5) / (document_frequency + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * lengths[numbers] / average_length)
+                scores[numbers] += idf * frequencies * (self.k1 + 1) / (frequencies + norm)
+            
+            candidates = np.flatnonzero(scores)
+            if len(candidates) > top_k:
+                candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+            candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+            return [(self._chunk_ids[n], float(scores[n])) for n in candidates]
+    
+    def save(self, force: bool = False, min_interval: float = 0.0):
+        """
+        Compact the index and write it to disk if it changed
+        
+        Each save rewrites the whole index, so its cost grows with the
+        corpus, not with the change. Unless forced, a save within
+        min_interval seconds of the previous one is skipped; the changes
+        are written by a later save.
+        """
+        if not self.path:
+            return
+        with self._lock:
+            if not force and (not self._dirty or time.monotonic() - self._saved_at < min_interval):
+                return
+            self._compact()
+            data = {
+                "version": self.FORMAT_VERSION,
+                "chunk_ids": self._chunk_ids,
+                "chunk_documents": self._chunk_documents,
+                "lengths": self._lengths.tobytes(),
+                "terms": list(self._postings),
+                "numbers": [postings[0].tobytes() for postings in self._postings.values()],
+                "frequencies": [postings[1].tobytes() for postings in self._postings.values()]
+            }
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            self._saved_at = time.monotonic()
+    
+    def _load(self):
+        """Read the index written by save()"""
+        with open(self.path, "rb") as f:
+            data = pickle.load(f)
+        if data.get("version") != self.FORMAT_VERSION:
+            print(f"Ignoring lexical index with unknown format at {self.path}")
+            return
+        
+        self._chunk_ids = data["chunk_ids"]
+        self._chunk_documents = data["chunk_documents"]
+        self._lengths = array('I')
+        self._lengths.frombytes(data["lengths"])
+        self._live = bytearray(b"\x01" * len(self._chunk_ids))
+        self._numbers = {chunk_id: n for n, chunk_id in enumerate(self._chunk_ids)}
+        self._document_chunks = {}
+        for n, document_id in enumerate(self._chunk_documents):
+            self._document_chunks.setdefault(document_id, []).append(n)
+        self._live_count = len(self._chunk_ids)
+        self._live_length = sum(self._lengths)
+        
+        self._postings = {}
+        for term, numbers_bytes, frequencies_bytes in zip(data["terms"], data["numbers"], data["frequencies"]):
+            numbers = array('I')
+            numbers.frombytes(numbers_bytes)
+            frequencies = array('I')
+            frequencies.frombytes(frequencies_bytes)
+            self._postings[term] = (numbers, frequencies)
+    
+    def _compact(self):
+        """Renumber live chunks and drop dead postings"""
+        if self._live_count == len(self._chunk_ids):
+            return
+        
+        live = np.frombuffer(self._live, dtype=np.uint8).astype(bool)
+        new_numbers = np.cumsum(live, dtype=np.int64) - 1
+        
+        self._chunk_ids = [c for c, alive in zip(self._chunk_ids, live) if alive]
+        self._chunk_documents = [d for d, alive in zip(self._chunk_documents, live) if alive]
+        lengths = array('I')
+        lengths.frombytes(np.frombuffer(self._lengths, dtype=np.uint32)[live].tobytes())
+        self._lengths = lengths
+        self._live = bytearray(b"\x01" * len(self._chunk_ids))
+        self._numbers = {chunk_id: n for n, chunk_id in enumerate(self._chunk_ids)}
+        self._document_chunks = {}
+        for n, document_id in enumerate(self._chunk_documents):
+            self._document_chunks.setdefault(document_id, []).append(n)
+        
+        postings = {}
+        for term, (numbers, frequencies) in self._postings.items():
+            numbers_np = np.frombuffer(numbers, dtype=np.uint32)
+            alive = live[numbers_np]
+            if not alive.any():
+                continue
+            compact_numbers = array('I')
+            compact_numbers.frombytes(new_numbers[numbers_np[alive]].astype(np.uint32).tobytes())
+            compact_frequencies = array('I')
+            compact_frequencies.frombytes(np.frombuffer(frequencies, dtype=np.uint32)[alive].tobytes())
+            postings[term] = (compact_numbers, compact_frequencies)
+        self._postings = postings
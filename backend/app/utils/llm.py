@@ -0,0 +1,62 @@
+import json
+from typing import AsyncIterator, List, Dict, Any
+import httpx
+
+from app.utils.http_client import get_http_client
+from app.utils.context_builder import passage_label
+from app.config import settings
+
+SYSTEM_PROMPT = (
+    "You are a helpful assistant that answers questions using only the provided document excerpts. "
+    "Cite the excerpts you use with their numbers in square brackets, e.g. [1]. "
+    "If the excerpts do not contain the answer, say that you don't know."
+)
+
+class OllamaError(Exception):
+    """Raised when Ollama returns an error or cannot be reached"""
+    pass
+
+def build_messages(question: str, passages: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Build the chat messages for a question and its context passages (see build_context)"""
+    context = "\n\n".join(
+        f"[{passage['number']}] {passage_label(passage)}\n{passage['content']}"
+        for passage in passages
+    )
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"Document excerpts:\n\n{context}\n\nQuestion: {question}"}
+    ]
+
+async def stream_chat(messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+    """
+    Stream a chat completion from Ollama, yielding text as it is generated
+    
+    Uses the streaming /api/chat endpoint, which returns one JSON object per
+    line until an object with "done": true.
+    """
+    client = get_http_client()
+    payload = {
+        "model": settings.OLLAMA_MODEL,
+        "messages": messages,
+        "stream": True
+    }
+    
+    try:
+        async with client.stream("POST", f"{settings.OLLAMA_BASE_URL}/api/chat", json=payload) as response:
+            if response.status_code != 200:
+                body = await response.aread()
+                raise OllamaError(f"Ollama returned {response.status_code}: {body.decode(errors='replace')}")
+            
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise OllamaError(data["error"])
+                content = data.get("message", {}).get("content")
+                if content:
+                    yield content
+                if data.get("done"):
+                    break
+    except httpx.HTTPError as e:
+        raise OllamaError(f"Error contacting Ollama: {str(e)}")
@@ -0,0 +1,152 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, Iterator
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.config import settings
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram(
+    "docqa_stage_seconds",
+    "Time spent in each stage of the ingestion and query pipelines",
+    ["pipeline", "stage"],
+    buckets=STAGE_BUCKETS
+)
+DOCUMENTS_INGESTED = Counter(
+    "docqa_documents_ingested_total",
+    "Documents processed by the ingestion pipeline, by outcome",
+    ["status"]
+)
+BYTES_PROCESSED = Counter(
+    "docqa_bytes_processed_total",
+    "Bytes of uploaded files processed by the ingestion pipeline"
+)
+CHUNKS_PROCESSED = Counter(
+    "docqa_chunks_processed_total",
+    "Chunks produced by chunking, including unchanged chunks of updated documents"
+)
+CHUNKS_EMBEDDED = Counter(
+    "docqa_chunks_embedded_total",
+    "Chunks sent to the embedding model (cache hits included)"
+)
+CHUNKS_WRITTEN = Counter(
+    "docqa_chunks_written_total",
+    "Chunks written to MongoDB and the vector store"
+)
+QUERIES = Counter(
+    "docqa_queries_total",
+    "Questions answered by /api/query, by how the answer was produced",
+    ["source"]
+)
+INGEST_QUEUE_DEPTH = Gauge(
+    "docqa_ingest_queue_depth",
+    "Ingestion jobs waiting in the queue"
+)
+ANSWER_CACHE_LOOKUPS = Counter(
+    "docqa_answer_cache_lookups_total",
+    "Answer cache lookups, by result (stale: a match whose cited documents changed, also a miss)",
+    ["result"]
+)
+ANSWER_CACHE_HIT_RATE = Gauge(
+    "docqa_answer_cache_hit_rate",
+    "Share of answer cache lookups answered from the cache since the server started"
+)
+ANSWER_CACHE_SAVED_SECONDS = Counter(
+    "docqa_answer_cache_saved_seconds_total",
+    "Generation time saved by answering from the answer cache"
+)
+VECTOR_COUNT = Gauge(
+    "docqa_vector_count",
+    "Chunks in the vector store"
+)
+
+# Trace of the current request or job, if tracing is enabled
+_current_trace: ContextVar[Optional[Dict[str, Any]]] = ContextVar("current_trace", default=None)
+_trace_lock = threading.Lock()
+
+def start_trace(name: str, **attributes) -> Optional[Dict[str, Any]]:
+    """
+    Start a trace for the current request or job
+    
+    Stages recorded in this context (including threads started with
+    asyncio.to_thread) are added to it as spans. Returns None when
+    tracing is disabled.
+    """
+    if not settings.TRACE_ENABLED:
+        return None
+    record = {
+        "trace_id": uuid.uuid4().hex,
+        "name": name,
+        "start": time.time(),
+        "attributes": attributes,
+        "spans": [],
+        "_started": time.perf_counter()
+    }
+    _current_trace.set(record)
+    return record
+
+def use_trace(record: Optional[Dict[str, Any]]):
+    """Make a trace current again, e.g. in a streaming response generator"""
+    if record is not None:
+        _current_trace.set(record)
+
+def end_trace(record: Optional[Dict[str, Any]], **attributes):
+    """Finish a trace and append it as one JSON line to TRACE_PATH"""
+    if record is None or "_started" not in record:
+        return
+    record["duration_ms"] = round((time.perf_counter() - record.pop("_started")) * 1000, 3)
+    record["attributes"].update(attributes)
+    if _current_trace.get() is record:
+        _current_trace.set(None)
+    
+    directory = os.path.dirname(os.path.abspath(settings.TRACE_PATH))
+    with _trace_lock:
+        os.makedirs(directory, exist_ok=True)
+        with open(settings.TRACE_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+@contextmanager
+def trace(name: str, **attributes) -> Iterator[Optional[Dict[str, Any]]]:
+    """Trace a block of work; see start_trace"""
+    record = start_trace(name, **attributes)
+    try:
+        yield record
+    except Exception as e:
+        if record is not None:
+            record["attributes"]["error"] = str(e)
+        raise
+    finally:
+        end_trace(record)
+
+def record_stage(pipeline: str, stage: str, seconds: float, **attributes):
+    """Record a stage duration measured by the caller"""
+    STAGE_SECONDS.labels(pipeline, stage).observe(seconds)
+    record = _current_trace.get()
+    if record is not None:
+        record["spans"].append({
+            "stage": f"{pipeline}.{stage}",
+            "start": time.time() - seconds,
+            "duration_ms": round(seconds * 1000, 3),
+            **attributes
+        })
+
+@contextmanager
+def stage(pipeline: str, name: str, **attributes) -> Iterator[Dict[str, Any]]:
+    """
+    Time a pipeline stage
+    
+    The duration goes to the docqa_stage_seconds histogram and, when a
+    trace is active, into it as a span. Attributes added to the yielded
+    dictionary are stored on the span.
+    """
+    started = time.perf_counter()
+    try:
+        yield attributes
+    finally:
+        record_stage(pipeline, name, time.perf_counter() - started, **attributes)
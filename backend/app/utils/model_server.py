@@ -0,0 +1,185 @@
+import multiprocessing
+import multiprocessing.util
+import os
+import secrets
+import tempfile
+import threading
+from collections import OrderedDict
+from multiprocessing.managers import BaseManager
+from typing import Dict, Any, Optional, Union, Tuple
+
+from app.config import settings
+
+# Set in the server process so that it loads the models itself
+_serving = False
+
+def is_remote() -> bool:
+    """Whether models and the vector store live in a model server"""
+    return bool(settings.MODEL_SERVER_ADDRESS) and not _serving
+
+class Counter:
+    """Integer counter that can be shared through the server"""
+    
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+    
+    def get(self) -> int:
+        return self._value
+    
+    def increment(self) -> int:
+        with self._lock:
+            self._value += 1
+            return self._value
+
+class JobRegistry:
+    """Ingestion job records shared by the workers, oldest dropped beyond max_jobs"""
+    
+    def __init__(self, max_jobs: int):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def put(self, job: Dict[str, Any]):
+        with self._lock:
+            self._jobs[job["job_id"]] = job
+            self._jobs.move_to_end(job["job_id"])
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._jobs.get(job_id)
+
+# Objects served to the workers; created in the server process
+_generation = Counter()
+_jobs: Optional[JobRegistry] = None
+
+def _embedding_generator():
+    from app.utils.embeddings import get_embedding_generator
+    return get_embedding_generator()
+
+def _reranker():
+    from app.utils.reranker import get_reranker
+    return get_reranker()
+
+def _vector_store():
+    from app.utils.vector_store import get_vector_store
+    return get_vector_store()
+
+def _corpus_generation() -> Counter:
+    return _generation
+
+def _job_registry() -> JobRegistry:
+    return _jobs
+
+class ModelServerManager(BaseManager):
+    """
+    Model server shared by the API worker processes (multi-worker mode)
+    
+    The embedding model, the re-ranker and the vector store are loaded
+    once, in a process started by the launcher (backend/main.py), and the
+    uvicorn workers call them through manager proxies. That keeps one copy
+    of each model in memory and makes the server the only process that
+    opens the vector store, so it is also its single writer. The server
+    also holds the corpus generation and the ingestion job records, so
+    caches and job status lookups agree across workers.
+    """
+
+ModelServerManager.register(
+    "embedding_generator", callable=_embedding_generator,
+    exposed=("generate_embedding", "generate_embeddings", "get_embedding_dimension")
+)
+ModelServerManager.register(
+    "reranker", callable=_reranker,
+    exposed=("rerank_many", "stats", "warm_up")
+)
+ModelServerManager.register(
+    "vector_store", callable=_vector_store,
+    exposed=(
+        "add_chunks", "add_chunk_records", "search_many", "search_lexical_many", "similarities",
+        "get_document_chunk_ids", "get_chunks_by_ids", "delete_by_document_id",
+        "delete_chunks", "clear_all", "flush", "get_count"
+    )
+)
+ModelServerManager.register("corpus_generation", callable=_corpus_generation)
+ModelServerManager.register("job_registry", callable=_job_registry)
+
+def _parse_address(address: str) -> Union[str, Tuple[str, int]]:
+    """'host:port' for TCP, anything else is a Unix socket path"""
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return host, int(port)
+    return address
+
+def _format_address(address: Union[str, Tuple[str, int]]) -> str:
+    return f"{address[0]}:{address[1]}" if isinstance(address, tuple) else address
+
+def _init_server():
+    """Load everything the workers will use before the server accepts connections"""
+    global _serving, _jobs
+    _serving = True
+    _jobs = JobRegistry(settings.JOB_HISTORY_SIZE)
+    _embedding_generator().generate_embedding("warm-up")
+    # Closed when the launcher shuts the server down, as the lifespan does in single-process mode
+    multiprocessing.util.Finalize(None, _vector_store().close, exitpriority=10)
+    if settings.RERANK_ENABLED:
+        _reranker().warm_up()
+    print(f"Model server ready (pid {os.getpid()})")
+
+def start_server() -> ModelServerManager:
+    """
+    Start the model server process and export its address to child processes
+    
+    Blocks until the models and the vector store are loaded. The address
+    and a fresh auth key are put in the environment, so workers started
+    afterwards connect to this server.
+    """
+    if os.name == "posix":
+        address: Union[str, Tuple[str, int]] = os.path.join(tempfile.mkdtemp(prefix="docqa-"), "model-server.sock")
+    else:
+        address = ("127.0.0.1", 0)
+    authkey = secrets.token_hex(16)
+    manager = ModelServerManager(address=address, authkey=authkey.encode(), ctx=multiprocessing.get_context("spawn"))
+    manager.start(initializer=_init_server)
+    
+    os.environ["MODEL_SERVER_ADDRESS"] = _format_address(manager.address)
+    os.environ["MODEL_SERVER_AUTHKEY"] = authkey
+    print(f"Model server listening on {os.environ['MODEL_SERVER_ADDRESS']}")
+    return manager
+
+# Connection of this worker process
+_manager: Optional[ModelServerManager] = None
+_manager_lock = threading.Lock()
+
+def connect() -> ModelServerManager:
+    """Connect to the model server (once per process)"""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                manager = ModelServerManager(
+                    address=_parse_address(settings.MODEL_SERVER_ADDRESS),
+                    authkey=settings.MODEL_SERVER_AUTHKEY.encode()
+                )
+                manager.connect()
+                _manager = manager
+                print(f"Connected to model server at {settings.MODEL_SERVER_ADDRESS}")
+    return _manager
+
+# Proxies to the shared counter and job records, created on first use
+_shared_generation = None
+_shared_jobs = None
+
+def shared_generation() -> Optional[Counter]:
+    """The corpus generation counter shared by all workers, or None when running in-process"""
+    global _shared_generation
+    if _shared_generation is None and is_remote():
+        _shared_generation = connect().corpus_generation()
+    return _shared_generation
+
+def shared_jobs() -> Optional[JobRegistry]:
+    """The job records shared by all workers, or None when running in-process"""
+    global _shared_jobs
+    if _shared_jobs is None and is_remote():
+        _shared_jobs = connect().job_registry()
+    return _shared_jobs
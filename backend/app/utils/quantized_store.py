@@ -0,0 +1,371 @@
+import os
+import sqlite3
+import threading
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+import numpy as np
+
+from app.config import settings
+from app.utils.vector_store import VectorStore
+
+# SQLite caps the number of bound parameters per statement
+_SQL_BATCH = 500
+
+class QuantizedVectorStore(VectorStore):
+    """
+    Vector store with int8 vectors in memory-mapped files
+    
+    Vectors are L2-normalized and quantized to int8 with one float32 scale
+    per row. Search scans the int8 matrix block by block, keeps
+    top_k * rerank_factor candidates per query and re-ranks them with the
+    exact float32 vectors, which stay on disk and are only paged in for
+    those candidates. Chunk content and metadata live in SQLite; deleted
+    rows are reused by later inserts.
+    """
+    
+    INITIAL_CAPACITY = 1024
+    BLOCK_ROWS = 16384
+    
+    def __init__(self, persist_dir: Optional[str] = None, rerank_factor: Optional[int] = None, indexed: bool = True):
+        persist_dir = persist_dir or settings.QUANTIZED_STORE_DIR
+        os.makedirs(persist_dir, exist_ok=True)
+        self.rerank_factor = max(1, rerank_factor or settings.QUANTIZED_RERANK_FACTOR)
+        self._lock = threading.RLock()
+        self._dir = persist_dir
+        
+        self._conn = sqlite3.connect(os.path.join(persist_dir, "chunks.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "row INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, document_id TEXT NOT NULL, "
+            "chunk_index INTEGER NOT NULL, content TEXT NOT NULL, char_count INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_document_id ON chunks (document_id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.commit()
+        
+        meta = dict(self._conn.execute("SELECT key, value FROM meta"))
+        self.dimension: Optional[int] = meta.get("dimension")
+        self._capacity = meta.get("capacity", 0)
+        self._vectors: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+        self._exact: Optional[np.memmap] = None
+        
+        # Live rows are tracked in memory; gaps below the high-water mark are free
+        rows = np.fromiter((row for (row,) in self._conn.execute("SELECT row FROM chunks")), dtype=np.int64)
+        self._next_row = int(rows.max()) + 1 if rows.size else 0
+        self._live = np.zeros(max(self._capacity, self._next_row), dtype=bool)
+        self._live[rows] = True
+        self._free = np.flatnonzero(~self._live[:self._next_row]).tolist()
+        if self.dimension:
+            self._open_files()
+        
+        print(f"Quantized vector store initialized with {rows.size} existing chunks")
+        
+        super().__init__(persist_dir, indexed)
+    
+    def _path(self, name: str) -> str:
+        return os.path.join(self._dir, name)
+    
+    def _open_files(self):
+        """Size the vector files to the current capacity and map them"""
+        files = (
+            ("vectors.int8", np.int8, (self._capacity, self.dimension)),
+            ("scales.f32", np.float32, (self._capacity,)),
+            ("vectors.f32", np.float32, (self._capacity, self.dimension)),
+        )
+        mapped = []
+        for name, dtype, shape in files:
+            path = self._path(name)
+            size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            with open(path, "ab") as f:
+                if f.tell() < size:
+                    f.truncate(size)
+            mapped.append(np.memmap(path, dtype=dtype, mode="r+", shape=shape))
+        self._vectors, self._scales, self._exact = mapped
+    
+    def _check_dimension(self, dimension: int):
+        """Fix the store's dimension on the first write and reject vectors of another one"""
+        if self.dimension is None:
+            self.dimension = dimension
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dimension', ?)", (dimension,))
+            self._conn.commit()
+        elif dimension != self.dimension:
+            raise ValueError(f"Embedding dimension {dimension} does not match the store ({self.dimension})")
+    
+    def _ensure_capacity(self, rows: int):
+        """Create or grow the vector files so they hold at least `rows` rows"""
+        if rows <= self._capacity and self._vectors is not None:
+            return
+        capacity = max(rows, self._capacity * 2, self.INITIAL_CAPACITY)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._scales.flush()
+            self._exact.flush()
+        self._capacity = capacity
+        self._open_files()
+        live = np.zeros(capacity, dtype=bool)
+        live[:len(self._live)] = self._live
+        self._live = live
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('capacity', ?)", (capacity,))
+        self._conn.commit()
+    
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+    
+    @staticmethod
+    def _quantize(vectors: np.ndarray):
+        """Symmetric per-row int8 quantization"""
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.rint(vectors / scales[:, None]).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+    
+    def _rows_for_ids(self, ids: List[str]) -> Dict[str, int]:
+        rows = {}
+        for start in range(0, len(ids), _SQL_BATCH):
+            batch = ids[start:start + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows.update(self._conn.execute(
+                f"SELECT id, row FROM chunks WHERE id IN ({placeholders})", batch
+            ))
+        return rows
+    
+    def _allocate_row(self) -> int:
+        if self._free:
+            return self._free.pop()
+        row = self._next_row
+        self._next_row += 1
+        return row
+    
+    def _release_rows(self, rows: List[int]):
+        if rows:
+            self._live[rows] = False
+            self._free.extend(rows)
+    
+    def _upsert(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict[str, Any]]):
+        """Write quantized and exact vectors, then the chunk rows"""
+        vectors = self._normalize(embeddings)
+        if len(vectors) != len(ids):
+            raise ValueError(f"Got {len(vectors)} embeddings for {len(ids)} chunks")
+        quantized, scales = self._quantize(vectors)
+        
+        with self._lock:
+            self._check_dimension(vectors.shape[1])
+            rows_by_id = self._rows_for_ids(ids)
+            rows = []
+            new_rows = []
+            for chunk_id in ids:
+                row = rows_by_id.get(chunk_id)
+                if row is None:
+                    row = rows_by_id[chunk_id] = self._allocate_row()
+                    new_rows.append(row)
+                rows.append(row)
+            
+            try:
+                self._ensure_capacity(max(rows) + 1)
+                row_array = np.asarray(rows, dtype=np.int64)
+                self._vectors[row_array] = quantized
+                self._scales[row_array] = scales
+                self._exact[row_array] = vectors
+                self._live[row_array] = True
+                # The vectors reach disk before the rows that point to them are committed
+                self._vectors.flush()
+                self._scales.flush()
+                self._exact.flush()
+                
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO chunks (row, id, document_id, chunk_index, content, char_count) VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (row, chunk_id, metadata["document_id"], metadata["chunk_index"], content, metadata["char_count"])
+                        for row, chunk_id, content, metadata in zip(rows, ids, documents, metadatas)
+                    ]
+                )
+                self._conn.commit()
+            except Exception:
+                # Rows taken for new chunks go back to the free list (the files may not have grown to them)
+                self._conn.rollback()
+                self._live[[row for row in new_rows if row < len(self._live)]] = False
+                self._free.extend(new_rows)
+                raise
+    
+    def _document_rows(self, document_ids: List[str]) -> np.ndarray:
+        rows = []
+        for start in range(0, len(document_ids), _SQL_BATCH):
+            batch = document_ids[start:start + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows.extend(row for (row,) in self._conn.execute(
+                f"SELECT row FROM chunks WHERE document_id IN ({placeholders})", batch
+            ))
+        return np.asarray(rows, dtype=np.int64)
+    
+    def _search_many(self, query_embeddings: np.ndarray, top_k: int, document_ids: List[str] = None) -> List[List[Dict[str, Any]]]:
+        """Approximate int8 scan followed by exact re-ranking of the best candidates"""
+        queries = self._normalize(query_embeddings)
+        
+        with self._lock:
+            if self._vectors is None:
+                return [[] for _ in queries]
+            total = self._next_row
+            if document_ids:
+                mask = np.zeros(total, dtype=bool)
+                mask[self._document_rows(document_ids)] = True
+                mask &= self._live[:total]
+            else:
+                mask = self._live[:total].copy()
+            vectors, scales, exact = self._vectors, self._scales, self._exact
+        
+        # Scan outside the lock; numpy releases the GIL during the matmuls
+        candidates = self._scan(queries, vectors, scales, mask, top_k * self.rerank_factor)
+        
+        ranked = []
+        for query, rows in zip(queries, candidates):
+            if not rows.size:
+                ranked.append([])
+                continue
+            rows = np.sort(rows)
+            scores = exact[rows] @ query
+            order = np.argsort(-scores)[:top_k]
+            ranked.append([(int(rows[i]), float(scores[i])) for i in order])
+        
+        chunks = self._fetch_rows([row for hits in ranked for row, _ in hits])
+        return [
+            [
+                {**chunks[row], "score": score}
+                for row, score in hits
+                if row in chunks
+            ]
+            for hits in ranked
+        ]
+    
+    def _scan(self, queries: np.ndarray, vectors: np.ndarray, scales: np.ndarray, mask: np.ndarray, limit: int) -> List[np.ndarray]:
+        """Best `limit` rows per query by approximate (int8) cosine similarity"""
+        query_count = len(queries)
+        best_rows = np.empty((query_count, 0), dtype=np.int64)
+        best_scores = np.empty((query_count, 0), dtype=np.float32)
+        queries_t = np.ascontiguousarray(queries.T)
+        
+        for start in range(0, len(mask), self.BLOCK_ROWS):
+            rows = np.flatnonzero(mask[start:start + self.BLOCK_ROWS]) + start
+            if not rows.size:
+                continue
+            block = vectors[rows].astype(np.float32)
+            scores = ((block @ queries_t) * scales[rows][:, None]).T
+            
+            merged_scores = np.concatenate([best_scores, scores], axis=1)
+            merged_rows = np.concatenate([best_rows, np.broadcast_to(rows, scores.shape)], axis=1)
+            if merged_scores.shape[1] > limit:
+                keep = np.argpartition(-merged_scores, limit - 1, axis=1)[:, :limit]
+                merged_scores = np.take_along_axis(merged_scores, keep, axis=1)
+                merged_rows = np.take_along_axis(merged_rows, keep, axis=1)
+            best_scores, best_rows = merged_scores, merged_rows
+        
+        return list(best_rows)
+    
+    def _fetch_rows(self, rows: List[int]) -> Dict[int, Dict[str, Any]]:
+        chunks = {}
+        rows = list(set(rows))
+        with self._lock:
+            for start in range(0, len(rows), _SQL_BATCH):
+                batch = rows[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                for row, chunk_id, document_id, chunk_index, content in self._conn.execute(
+                    f"SELECT row, id, document_id, chunk_index, content FROM chunks WHERE row IN ({placeholders})", batch
+                ):
+                    chunks[row] = {
+                        "id": chunk_id,
+                        "document_id": document_id,
+                        "chunk_index": chunk_index,
+                        "content": content
+                    }
+        return chunks
+    
+    def get_chunks_by_ids(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get chunk content and metadata by chunk id"""
+        chunks = {}
+        with self._lock:
+            for start in range(0, len(ids), _SQL_BATCH):
+                batch = ids[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                for chunk_id, document_id, chunk_index, content in self._conn.execute(
+                    f"SELECT id, document_id, chunk_index, content FROM chunks WHERE id IN ({placeholders})", batch
+                ):
+                    chunks[chunk_id] = {
+                        "id": chunk_id,
+                        "document_id": document_id,
+                        "chunk_index": chunk_index,
+                        "content": content
+                    }
+        return chunks
+    
+    def _get_embeddings(self, ids: List[str]) -> Tuple[List[str], np.ndarray]:
+        """Exact (float32) vectors by chunk id"""
+        with self._lock:
+            rows_by_id = self._rows_for_ids(ids)
+            if not rows_by_id:
+                return [], np.empty((0, self.dimension or 0), dtype=np.float32)
+            found = list(rows_by_id)
+            return found, np.asarray(self._exact[[rows_by_id[chunk_id] for chunk_id in found]])
+    
+    def _find_document_chunk_ids(self, document_id: str) -> List[str]:
+        with self._lock:
+            return [chunk_id for (chunk_id,) in self._conn.execute(
+                "SELECT id FROM chunks WHERE document_id = ?", (document_id,)
+            )]
+    
+    def _delete_ids(self, ids: List[str]):
+        with self._lock:
+            rows = list(self._rows_for_ids(ids).values())
+            for start in range(0, len(ids), _SQL_BATCH):
+                batch = ids[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                self._conn.execute(f"DELETE FROM chunks WHERE id IN ({placeholders})", batch)
+            self._conn.commit()
+            self._release_rows(rows)
+    
+    def _clear(self):
+        """Delete every chunk; the vector files keep their size and are reused"""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.commit()
+            self._live[:] = False
+            self._free = []
+            self._next_row = 0
+    
+    def get_count(self) -> int:
+        """Get total number of chunks in the store"""
+        with self._lock:
+            return int(np.count_nonzero(self._live[:self._next_row]))
+    
+    def flush(self):
+        """Flush the memory-mapped vectors and the lexical index"""
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+                self._scales.flush()
+                self._exact.flush()
+        super().flush()
+    
+    def _iter_chunks(self, page_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        cursor = self._conn.execute("SELECT id, document_id, content FROM chunks ORDER BY row")
+        while True:
+            page = cursor.fetchmany(page_size)
+            if not page:
+                break
+            yield [
+                {"id": chunk_id, "document_id": document_id, "content": content}
+                for chunk_id, document_id, content in page
+            ]
+    
+    def _iter_chunk_refs(self, page_size: int = 10000) -> Iterator[List[Tuple[str, int]]]:
+        cursor = self._conn.execute("SELECT document_id, chunk_index FROM chunks")
+        while True:
+            page = cursor.fetchmany(page_size)
+            if not page:
+                break
+            yield page
@@ -0,0 +1,133 @@
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+from app.utils.cache import TTLCache
+from app.utils import model_server
+from app.config import settings
+
+class Reranker:
+    """Re-rank retrieved chunks with a cross-encoder on CPU"""
+    
+    def __init__(
+        self,
+        model_name: str,
+        batch_size: int = 16,
+        cache_size: int = 10000,
+        cache_ttl: float = 3600
+    ):
+        """Load the cross-encoder"""
+        from sentence_transformers import CrossEncoder
+        
+        print(f"Loading re-ranking model: {model_name}")
+        self.model_name = model_name
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.batch_size = batch_size
+        # Pair scores keyed by (question, chunk id, chunk content hash)
+        self.pair_cache = TTLCache(cache_size, cache_ttl)
+        self._lock = threading.Lock()
+        self.reranked = 0
+        self.fallbacks = 0
+        print(f"Re-ranking model loaded successfully")
+    
+    def warm_up(self):
+        """Score one pair so the model's lazy initialisation happens now"""
+        with self._lock:
+            self.model.predict([("warm-up", "warm-up")], show_progress_bar=False)
+    
+    @staticmethod
+    def _pair_key(question: str, hit: Dict[str, Any]) -> Tuple:
+        return (" ".join(question.split()).lower(), hit["id"], hash(hit["content"]))
+    
+    def rerank_many(
+        self,
+        questions: List[str],
+        candidates: List[List[Dict[str, Any]]],
+        top_k: int,
+        budget_seconds: float
+    ) -> Tuple[List[List[Dict[str, Any]]], List[bool]]:
+        """
+        Re-rank candidate hits for several questions within one time budget
+        
+        Uncached (question, chunk) pairs are scored in batches. Once the
+        budget runs out no further batches are started, and questions whose
+        pairs were not all scored keep their vector-search order.
+        
+        Returns:
+            The top_k hits per question, and per question whether it was
+            actually re-ranked (False means vector order was kept)
+        """
+        deadline = time.monotonic() + budget_seconds
+        scores: List[List[Optional[float]]] = []
+        pending: List[Tuple[int, int]] = []
+        for q, (question, hits) in enumerate(zip(questions, candidates)):
+            row = [self.pair_cache.get(self._pair_key(question, hit)) for hit in hits]
+            scores.append(row)
+            pending.extend((q, i) for i, score in enumerate(row) if score is None)
+        
+        for start in range(0, len(pending), self.batch_size):
+            if time.monotonic() >= deadline:
+                break
+            batch = pending[start:start + self.batch_size]
+            pairs = [(questions[q], candidates[q][i]["content"]) for q, i in batch]
+            with self._lock:
+                predicted = self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+            for (q, i), score in zip(batch, predicted):
+                scores[q][i] = float(score)
+                self.pair_cache.set(self._pair_key(questions[q], candidates[q][i]), float(score))
+        
+        results = []
+        complete = []
+        for hits, row in zip(candidates, scores):
+            if any(score is None for score in row):
+                self.fallbacks += 1
+                results.append(hits[:top_k])
+                complete.append(False)
+                continue
+            self.reranked += 1
+            ranked = sorted(
+                ({**hit, "score": score} for hit, score in zip(hits, row)),
+                key=lambda hit: hit["score"],
+                reverse=True
+            )
+            results.append(ranked[:top_k])
+            complete.append(True)
+        return results, complete
+    
+    def stats(self) -> Dict[str, Any]:
+        """Re-ranking counters and pair-score cache statistics"""
+        return {
+            "model": self.model_name,
+            "reranked": self.reranked,
+            "fallbacks": self.fallbacks,
+            "pair_cache": self.pair_cache.stats()
+        }
+
+# Global instance
+_reranker = None
+_reranker_lock = threading.Lock()
+
+def get_reranker() -> Optional[Reranker]:
+    """
+    Get or create the re-ranker singleton; None when re-ranking is disabled
+    
+    With a model server configured this is a proxy to the re-ranker there.
+    """
+    global _reranker
+    if _reranker is None and settings.RERANK_ENABLED:
+        with _reranker_lock:
+            if _reranker is None:
+                if model_server.is_remote():
+                    _reranker = model_server.connect().reranker()
+                else:
+                    _reranker = Reranker(
+                        settings.RERANK_MODEL,
+                        batch_size=settings.RERANK_BATCH_SIZE,
+                        cache_size=settings.RERANK_CACHE_SIZE,
+                        cache_ttl=settings.RERANK_CACHE_TTL
+                    )
+    return _reranker
+
+def peek_reranker() -> Optional[Reranker]:
+    """The re-ranker if it has been loaded, without loading it"""
+    return _reranker
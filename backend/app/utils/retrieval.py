@@ -0,0 +1,200 @@
+import asyncio
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+
+from app.utils.cache import TTLCache
+from app.utils.embedding_batcher import get_embedding_batcher
+from app.utils.reranker import get_reranker, peek_reranker
+from app.utils import metrics, model_server
+from app.utils.vector_store import get_vector_store
+from app.config import settings
+
+# Query embeddings keyed by normalized question text
+_query_embedding_cache = TTLCache(settings.QUERY_CACHE_SIZE, settings.QUERY_CACHE_TTL)
+
+# Retrieval results keyed by (question, top_k, document_ids, corpus generation)
+_retrieval_cache = TTLCache(settings.RETRIEVAL_CACHE_SIZE, settings.RETRIEVAL_CACHE_TTL)
+
+# Incremented whenever documents are added or removed (kept by the model server in multi-worker mode)
+_corpus_generation = 0
+_generation_lock = threading.Lock()
+
+def get_corpus_generation() -> int:
+    """Current corpus generation"""
+    shared = model_server.shared_generation()
+    return shared.get() if shared is not None else _corpus_generation
+
+def bump_corpus_generation():
+    """Mark the corpus as changed so cached retrieval results are no longer used"""
+    global _corpus_generation
+    with _generation_lock:
+        _corpus_generation += 1
+    shared = model_server.shared_generation()
+    if shared is not None:
+        shared.increment()
+    _retrieval_cache.clear()
+
+def normalize_question(question: str) -> str:
+    """Normalize a question for use as a cache key"""
+    return " ".join(question.split()).lower()
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Statistics of the read-path caches"""
+    reranker = peek_reranker()
+    return {
+        "query_embeddings": _query_embedding_cache.stats(),
+        "retrieval": _retrieval_cache.stats(),
+        "rerank": reranker.stats() if reranker is not None else None,
+        "query_batching": get_embedding_batcher().stats(),
+        "corpus_generation": get_corpus_generation()
+    }
+
+async def embed_questions(questions: List[str]) -> np.ndarray:
+    """
+    Embed questions, reusing cached query embeddings where possible
+    
+    Cache misses go through the micro-batching scheduler, so concurrent
+    requests share model calls.
+    """
+    keys = [normalize_question(q) for q in questions]
+    vectors = [_query_embedding_cache.get(key) for key in keys]
+    
+    missing = {}
+    for i, vector in enumerate(vectors):
+        if vector is None:
+            missing.setdefault(keys[i], []).append(i)
+    
+    if missing:
+        missing_keys = list(missing)
+        computed = await get_embedding_batcher().embed(missing_keys)
+        for key, vector in zip(missing_keys, computed):
+            _query_embedding_cache.set(key, vector)
+            for i in missing[key]:
+                vectors[i] = vector
+    
+    return np.stack(vectors)
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict[str, Any]]], top_k: int, k: int = 60) -> List[Dict[str, Any]]:
+    """
+    Merge ranked hit lists with reciprocal-rank fusion
+    
+    Each hit scores sum(1 / (k + rank)) over the lists it appears in and is
+    returned with that value as fusion_score; its other fields, score
+    included, come from the first list it appears in.
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for hits in result_lists:
+        for rank, hit in enumerate(hits, start=1):
+            entry = fused.get(hit["id"])
+            if entry is None:
+                entry = fused[hit["id"]] = {**hit, "fusion_score": 0.0}
+            entry["fusion_score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda hit: hit["fusion_score"], reverse=True)[:top_k]
+
+async def _search(questions: List[str], embeddings: np.ndarray, top_k: int, document_ids: Optional[List[str]]) -> List[List[Dict[str, Any]]]:
+    """
+    Dense search, or dense plus lexical search fused by rank when hybrid search is enabled
+    
+    Every hit's score is its cosine similarity to the question; fused hits
+    also carry their fusion_score, by which they are ordered.
+    """
+    vector_store = await asyncio.to_thread(get_vector_store)
+    
+    if not settings.HYBRID_SEARCH_ENABLED:
+        return await asyncio.to_thread(vector_store.search_many, embeddings, top_k, document_ids)
+    
+    # Each list holds at least top_k hits, so fusion can return top_k (and the re-ranker sees the full candidate set)
+    dense_k = max(settings.HYBRID_DENSE_TOP_K, top_k)
+    lexical_k = max(settings.HYBRID_LEXICAL_TOP_K, top_k)
+    
+    dense, lexical = await asyncio.gather(
+        asyncio.to_thread(vector_store.search_many, embeddings, dense_k, document_ids),
+        asyncio.to_thread(vector_store.search_lexical_many, questions, lexical_k, document_ids)
+    )
+    fused = [
+        reciprocal_rank_fusion([dense_hits, lexical_hits], top_k, settings.RRF_K)
+        for dense_hits, lexical_hits in zip(dense, lexical)
+    ]
+    
+    # Hits found only by the lexical search still have their BM25 score
+    lexical_only = []
+    for hits, dense_hits in zip(fused, dense):
+        dense_ids = {hit["id"] for hit in dense_hits}
+        lexical_only.append([hit["id"] for hit in hits if hit["id"] not in dense_ids])
+    if any(lexical_only):
+        similarities = await asyncio.to_thread(vector_store.similarities, embeddings, lexical_only)
+        for hits, ids, scores in zip(fused, lexical_only, similarities):
+            for hit in hits:
+                if hit["id"] in ids:
+                    hit["score"] = scores.get(hit["id"], 0.0)
+    return fused
+
+async def _rerank(
+    questions: List[str],
+    candidates: List[List[Dict[str, Any]]],
+    top_k: int
+) -> Tuple[List[List[Dict[str, Any]]], List[bool]]:
+    """Re-rank candidates with the cross-encoder when enabled"""
+    reranker = await asyncio.to_thread(get_reranker)
+    if reranker is None:
+        return [hits[:top_k] for hits in candidates], [True] * len(candidates)
+    with metrics.stage("query", "rerank", questions=len(questions)):
+        return await asyncio.to_thread(
+            reranker.rerank_many, questions, candidates, top_k, settings.RERANK_BUDGET_MS / 1000
+        )
+
+async def retrieve_many(
+    questions: List[str],
+    top_k: Optional[int] = None,
+    document_ids: Optional[List[str]] = None
+) -> List[List[Dict[str, Any]]]:
+    """
+    Retrieve the most relevant chunks for several questions
+    
+    Results are served from the retrieval cache when the corpus has not
+    changed; the remaining questions are embedded in one model call and
+    searched in one vector store query (plus the lexical index when hybrid
+    search is enabled). With re-ranking enabled, RERANK_CANDIDATES hits are
+    fetched per question and re-ordered by the cross-encoder; results that
+    fell back to vector order because the time budget ran out are not
+    cached. The blocking work runs in threads.
+    
+    Returns:
+        One list of hits per question, in the same order (shared with the
+        cache, so callers must not modify them)
+    """
+    if not questions:
+        return []
+    top_k = top_k or settings.TOP_K_RETRIEVAL
+    filter_key = tuple(sorted(document_ids)) if document_ids else None
+    generation = get_corpus_generation()
+    
+    cache_keys = [(normalize_question(q), top_k, filter_key, generation) for q in questions]
+    results = [_retrieval_cache.get(key) for key in cache_keys]
+    missing = [i for i, result in enumerate(results) if result is None]
+    
+    if missing:
+        missing_questions = [questions[i] for i in missing]
+        with metrics.stage("query", "embed", questions=len(missing_questions)):
+            embeddings = await embed_questions(missing_questions)
+        candidate_k = max(top_k, settings.RERANK_CANDIDATES) if settings.RERANK_ENABLED else top_k
+        with metrics.stage("query", "search", questions=len(missing_questions)):
+            candidates = await _search(missing_questions, embeddings, candidate_k, document_ids)
+        found, reranked = await _rerank(missing_questions, candidates, top_k)
+        for i, hits, complete in zip(missing, found, reranked):
+            results[i] = hits
+            # Skip caching if the corpus changed while we were searching
+            if complete and generation == get_corpus_generation():
+                _retrieval_cache.set(cache_keys[i], hits)
+    
+    return results
+
+async def retrieve(
+    question: str,
+    top_k: Optional[int] = None,
+    document_ids: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """Retrieve the most relevant chunks for one question"""
+    results = await retrieve_many([question], top_k, document_ids)
+    return results[0]
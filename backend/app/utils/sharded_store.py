@@ -0,0 +1,266 @@
+import hashlib
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+import numpy as np
+
+from app.config import settings
+from app.utils.vector_store import VectorStore, ChromaVectorStore
+
+def shard_of(document_id: str, num_shards: int) -> int:
+    """Shard holding a document; stable across processes and restarts"""
+    digest = hashlib.blake2b(document_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % num_shards
+
+def _open_backend(backend: str, persist_dir: str) -> VectorStore:
+    """Open one shard's store without the document map and lexical index"""
+    if backend == "quantized":
+        from app.utils.quantized_store import QuantizedVectorStore
+        return QuantizedVectorStore(persist_dir, indexed=False)
+    if backend == "chroma":
+        return ChromaVectorStore(persist_dir, indexed=False)
+    raise ValueError(f"Unknown VECTOR_BACKEND: {backend}")
+
+class _ShardWorker:
+    """Owns one shard's store and runs calls on it, one at a time"""
+    
+    def __init__(self, backend: str, persist_dir: str):
+        self.store = _open_backend(backend, persist_dir)
+        self._pages: Dict[int, Iterator] = {}
+        self._page_ids = itertools.count()
+    
+    def call(self, method: str, *args):
+        return getattr(self.store, method)(*args)
+    
+    def start_pages(self, method: str, page_size: int) -> int:
+        """Start one of the store's paging iterators; returns its handle"""
+        handle = next(self._page_ids)
+        self._pages[handle] = getattr(self.store, method)(page_size)
+        return handle
+    
+    def next_page(self, handle: int) -> Optional[list]:
+        """Next page of an iterator, or None (and the iterator is dropped) when done"""
+        page = next(self._pages[handle], None)
+        if page is None:
+            del self._pages[handle]
+        return page
+
+# Shard worker of this process, when running in a shard process
+_process_worker: Optional[_ShardWorker] = None
+
+def _init_shard_process(backend: str, persist_dir: str):
+    global _process_worker
+    _process_worker = _ShardWorker(backend, persist_dir)
+
+def _run_in_shard_process(name: str, *args):
+    return getattr(_process_worker, name)(*args)
+
+class _Shard:
+    """
+    Handle to one shard and the single-worker executor that owns it
+    
+    With processes, the shard's store lives in its own process and every
+    call is sent there; otherwise it lives in this process behind a
+    one-thread executor. Either way calls to a shard run one at a time.
+    """
+    
+    def __init__(self, index: int, backend: str, persist_dir: str, use_processes: bool):
+        self.index = index
+        self.persist_dir = persist_dir
+        self._worker: Optional[_ShardWorker] = None
+        self._executor: Executor
+        if use_processes:
+            self._executor = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_shard_process,
+                initargs=(backend, persist_dir)
+            )
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"vector-shard-{index}")
+            self._worker = _ShardWorker(backend, persist_dir)
+    
+    def submit(self, method: str, *args) -> Future:
+        """Call a method of the shard's store without waiting"""
+        if self._worker is None:
+            return self._executor.submit(_run_in_shard_process, "call", method, *args)
+        return self._executor.submit(self._worker.call, method, *args)
+    
+    def call(self, method: str, *args):
+        return self.submit(method, *args).result()
+    
+    def iter_pages(self, method: str, page_size: int) -> Iterator[list]:
+        """Page through one of the shard store's paging iterators"""
+        if self._worker is not None:
+            yield from getattr(self._worker.store, method)(page_size)
+            return
+        handle = self._executor.submit(_run_in_shard_process, "start_pages", method, page_size).result()
+        while True:
+            page = self._executor.submit(_run_in_shard_process, "next_page", handle).result()
+            if page is None:
+                return
+            yield page
+    
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+class ShardedVectorStore(VectorStore):
+    """
+    Vector store split into VECTOR_SHARDS independent shards by document_id
+    
+    Each shard is a complete store of the configured backend in its own
+    directory, owned by one worker process (or thread). Writes, deletes and
+    lookups are routed to the shard of each document; searches fan out to
+    every shard in parallel (or only to the shards of the filtered
+    documents) and the per-shard top_k lists are merged by score. The
+    document map and the lexical index are kept once, in this process.
+    
+    The number of shards is fixed when the store is created; changing
+    VECTOR_SHARDS later requires clearing the store and ingesting again.
+    """
+    
+    def __init__(
+        self,
+        num_shards: Optional[int] = None,
+        backend: Optional[str] = None,
+        persist_dir: Optional[str] = None,
+        use_processes: Optional[bool] = None
+    ):
+        self.num_shards = num_shards or settings.VECTOR_SHARDS
+        self.backend = backend or settings.VECTOR_BACKEND
+        if persist_dir is None:
+            base = settings.QUANTIZED_STORE_DIR if self.backend == "quantized" else settings.CHROMA_PERSIST_DIR
+            persist_dir = os.path.join(base, "shards")
+        use_processes = settings.VECTOR_SHARD_PROCESSES if use_processes is None else use_processes
+        os.makedirs(persist_dir, exist_ok=True)
+        self._check_layout(persist_dir)
+        
+        self.shards = [
+            _Shard(i, self.backend, os.path.join(persist_dir, f"shard_{i:02d}"), use_processes)
+            for i in range(self.num_shards)
+        ]
+        mode = "processes" if use_processes else "threads"
+        print(f"Sharded vector store: {self.num_shards} {self.backend} shards in {mode}")
+        
+        try:
+            super().__init__(persist_dir)
+        except Exception:
+            for shard in self.shards:
+                shard.close()
+            raise
+    
+    def _check_layout(self, persist_dir: str):
+        """Record the shard layout on first use and refuse to open a store created with another one"""
+        path = os.path.join(persist_dir, "shards.json")
+        layout = {"num_shards": self.num_shards, "backend": self.backend}
+        if os.path.exists(path):
+            with open(path) as f:
+                existing = json.load(f)
+            if existing != layout:
+                raise ValueError(
+                    f"Vector store in {persist_dir} was created with {existing}, not {layout}; "
+                    "clear it or restore the previous VECTOR_SHARDS and VECTOR_BACKEND"
+                )
+        else:
+            with open(path, "w") as f:
+                json.dump(layout, f)
+    
+    def _shard_for(self, document_id: str) -> int:
+        return shard_of(document_id, self.num_shards)
+    
+    def _group_ids(self, ids: List[str]) -> Dict[int, List[str]]:
+        """Chunk ids grouped by shard"""
+        groups: Dict[int, List[str]] = {}
+        for chunk_id in ids:
+            groups.setdefault(self._shard_for(self.document_id_of(chunk_id)), []).append(chunk_id)
+        return groups
+    
+    def _fan_out(self, calls: Dict[int, Tuple]) -> Dict[int, Any]:
+        """Run one call per shard in parallel ({shard: (method, *args)}) and wait for all results"""
+        futures = {index: self.shards[index].submit(*call) for index, call in calls.items()}
+        return {index: future.result() for index, future in futures.items()}
+    
+    def _upsert(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict[str, Any]]):
+        """Write each chunk to its document's shard"""
+        rows: Dict[int, List[int]] = {}
+        for row, metadata in enumerate(metadatas):
+            rows.setdefault(self._shard_for(metadata["document_id"]), []).append(row)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        self._fan_out({
+            index: (
+                "_upsert",
+                [ids[row] for row in shard_rows],
+                embeddings[shard_rows],
+                [documents[row] for row in shard_rows],
+                [metadatas[row] for row in shard_rows]
+            )
+            for index, shard_rows in rows.items()
+        })
+    
+    def _search_many(self, query_embeddings: np.ndarray, top_k: int, document_ids: List[str] = None) -> List[List[Dict[str, Any]]]:
+        """Search the relevant shards in parallel and merge their top_k lists by score"""
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+        if document_ids:
+            targets: Dict[int, List[str]] = {}
+            for document_id in document_ids:
+                targets.setdefault(self._shard_for(document_id), []).append(document_id)
+        else:
+            targets = {index: None for index in range(self.num_shards)}
+        
+        results = self._fan_out({
+            index: ("_search_many", query_embeddings, top_k, shard_documents)
+            for index, shard_documents in targets.items()
+        })
+        return [
+            heapq.nlargest(top_k, (hit for shard_hits in results.values() for hit in shard_hits[i]), key=lambda hit: hit["score"])
+            for i in range(len(query_embeddings))
+        ]
+    
+    def _get_embeddings(self, ids: List[str]) -> Tuple[List[str], np.ndarray]:
+        results = self._fan_out({index: ("_get_embeddings", shard_ids) for index, shard_ids in self._group_ids(ids).items()})
+        found = [chunk_id for shard_ids, _ in results.values() for chunk_id in shard_ids]
+        vectors = [rows for shard_ids, rows in results.values() if len(shard_ids)]
+        if not vectors:
+            return [], np.zeros((0, 0), dtype=np.float32)
+        return found, np.vstack(vectors)
+    
+    def get_chunks_by_ids(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        results = self._fan_out({index: ("get_chunks_by_ids", shard_ids) for index, shard_ids in self._group_ids(ids).items()})
+        return {chunk_id: chunk for chunks in results.values() for chunk_id, chunk in chunks.items()}
+    
+    def _find_document_chunk_ids(self, document_id: str) -> List[str]:
+        return self.shards[self._shard_for(document_id)].call("_find_document_chunk_ids", document_id)
+    
+    def _delete_ids(self, ids: List[str]):
+        self._fan_out({index: ("_delete_ids", shard_ids) for index, shard_ids in self._group_ids(ids).items()})
+    
+    def _clear(self):
+        self._fan_out({index: ("_clear",) for index in range(self.num_shards)})
+    
+    def get_count(self) -> int:
+        return sum(self._fan_out({index: ("get_count",) for index in range(self.num_shards)}).values())
+    
+    def _iter_chunks(self, page_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        for shard in self.shards:
+            yield from shard.iter_pages("_iter_chunks", page_size)
+    
+    def _iter_chunk_refs(self, page_size: int = 10000) -> Iterator[List[Tuple[str, int]]]:
+        for shard in self.shards:
+            yield from shard.iter_pages("_iter_chunk_refs", page_size)
+    
+    def flush(self):
+        """Flush every shard, then the lexical index"""
+        self._fan_out({index: ("flush",) for index in range(self.num_shards)})
+        super().flush()
+    
+    def close(self):
+        """Flush and stop the shard workers, then write the lexical index"""
+        self.flush()
+        for shard in self.shards:
+            shard.close()
+        super().close()
+        print("Sharded vector store closed")
@@ -0,0 +1,100 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from typing import BinaryIO, Optional
+
+from fastapi import UploadFile
+
+from app.config import settings
+
+# Bytes read at a time when copying or hashing a file
+COPY_BLOCK_BYTES = 1024 * 1024
+
+class UploadTooLargeError(Exception):
+    """Raised when a file is larger than MAX_UPLOAD_BYTES"""
+    pass
+
+class LocalFile:
+    """
+    A document on local disk, ingested from its path instead of from memory
+    
+    Uploads are spooled to temporary files (temporary=True) that are
+    deleted once the job that ingests them ends; the bulk CLI refers to the
+    user's own files, which delete() leaves alone.
+    """
+    
+    def __init__(self, path: str, size: Optional[int] = None, sha256: Optional[str] = None, temporary: bool = False):
+        self.path = path
+        self.size = os.path.getsize(path) if size is None else size
+        self.temporary = temporary
+        self._sha256 = sha256
+    
+    @property
+    def content_hash(self) -> str:
+        """SHA-256 hex digest of the file (read in blocks on first use unless computed while spooling)"""
+        if self._sha256 is None:
+            digest = hashlib.sha256()
+            with open(self.path, "rb") as f:
+                for block in iter(lambda: f.read(COPY_BLOCK_BYTES), b""):
+                    digest.update(block)
+            self._sha256 = digest.hexdigest()
+        return self._sha256
+    
+    def delete(self):
+        """Remove the file if it is a temporary copy"""
+        if not self.temporary:
+            return
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+def _too_large(size: int, max_bytes: int) -> UploadTooLargeError:
+    return UploadTooLargeError(f"File is too large ({size} bytes). Maximum size: {max_bytes} bytes")
+
+def spool_stream(stream: BinaryIO, suffix: str = "", max_bytes: Optional[int] = None) -> LocalFile:
+    """
+    Copy a binary stream to a temporary file, hashing it on the way
+    
+    Only one block is held in memory at a time. The partial file is
+    removed if the stream turns out to be larger than max_bytes
+    (MAX_UPLOAD_BYTES by default, 0 for no limit).
+    
+    Raises:
+        UploadTooLargeError: if the stream is larger than max_bytes
+    """
+    max_bytes = settings.MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    directory = settings.UPLOAD_SPOOL_DIR or None
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(prefix="upload-", suffix=suffix, dir=directory, delete=False) as tmp:
+        try:
+            for block in iter(lambda: stream.read(COPY_BLOCK_BYTES), b""):
+                size += len(block)
+                if max_bytes and size > max_bytes:
+                    raise _too_large(size, max_bytes)
+                digest.update(block)
+                tmp.write(block)
+        except BaseException:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+    return LocalFile(tmp.name, size=size, sha256=digest.hexdigest(), temporary=True)
+
+async def spool_upload(upload: UploadFile, max_bytes: Optional[int] = None) -> LocalFile:
+    """
+    Stream an uploaded file to a temporary file (in a worker thread)
+    
+    Raises:
+        UploadTooLargeError: if the file is larger than max_bytes (MAX_UPLOAD_BYTES by default)
+    """
+    max_bytes = settings.MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    # Reject early when the multipart parser already knows the size
+    if max_bytes and upload.size is not None and upload.size > max_bytes:
+        raise _too_large(upload.size, max_bytes)
+    suffix = os.path.splitext(upload.filename or "")[1]
+    return await asyncio.to_thread(spool_stream, upload.file, suffix, max_bytes)
@@ -1,20 +1,354 @@
-import chromadb
-from chromadb.config import Settings
-from typing import List, Dict, Any
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, IO, Iterator, Optional, Set, Tuple
+import numpy as np
 from app.config import settings as app_settings
+from app.utils.lexical_index import LexicalIndex
+from app.utils import model_server
 import os
+import threading
 
-class VectorStore:
+try:
+    import fcntl
+except ImportError:  # Windows: stores are not locked
+    fcntl = None
+
+class VectorStoreInUseError(Exception):
+    """Raised when the vector store is already open in another process"""
+    pass
+
+def _lock_store(persist_dir: str) -> Optional[IO]:
+    """
+    Take the exclusive lock of a store directory
+    
+    Only one process may write a store: the others would not see its
+    writes in their document map, lexical index and caches. The lock is
+    released by close(), or by the operating system if the process dies.
+    
+    Raises:
+        VectorStoreInUseError: if another process holds the lock
+    """
+    if fcntl is None:
+        return None
+    lock_file = open(os.path.join(persist_dir, "store.lock"), "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        raise VectorStoreInUseError(
+            f"Vector store in {persist_dir} is open in another process (is the API server running?)"
+        )
+    return lock_file
+
+class VectorStore(ABC):
+    """
+    Base class for vector store backends
+    
+    Backends store chunk vectors, content and metadata. The base class
+    builds chunk records and keeps the lexical index and an in-memory
+    document_id -> chunk_index map in step with every write, so backends
+    only implement the storage primitives.
+    
+    A store opened with indexed=False skips the map and the lexical index;
+    only its storage primitives may then be used (see ShardedVectorStore).
+    An indexed store holds the lock of its directory until it is closed.
+    """
+    
+    def __init__(self, persist_dir: str, indexed: bool = True):
+        """Build the document map and open the lexical index stored next to the backend's data"""
+        self.persist_dir = persist_dir
+        self.exact_search_max_chunks = app_settings.EXACT_SEARCH_MAX_CHUNKS
+        self._document_chunks: Dict[str, Set[int]] = {}
+        self._document_lock = threading.Lock()
+        self.lexical_index: Optional[LexicalIndex] = None
+        self._store_lock: Optional[IO] = None
+        if not indexed:
+            return
+        
+        self._store_lock = _lock_store(persist_dir)
+        for page in self._iter_chunk_refs():
+            for document_id, chunk_index in page:
+                self._document_chunks.setdefault(document_id, set()).add(chunk_index)
+        
+        self.lexical_index = LexicalIndex(
+            os.path.join(persist_dir, "lexical_index.pkl")
+        )
+        # Missing, or behind the store after a shutdown that skipped the final save
+        stored = sum(len(indexes) for indexes in self._document_chunks.values())
+        if stored and (not self.lexical_index.exists_on_disk or len(self.lexical_index) != stored):
+            self._rebuild_lexical_index()
+    
+    @staticmethod
+    def make_chunk_id(document_id: str, chunk_index: int) -> str:
+        """ID of a chunk in the vector store"""
+        return f"{document_id}_chunk_{chunk_index}"
+    
+    @staticmethod
+    def document_id_of(chunk_id: str) -> str:
+        """Document ID part of a chunk ID made by make_chunk_id"""
+        return chunk_id.rsplit("_chunk_", 1)[0]
+    
+    def add_chunks(self, chunks: List[Dict[str, Any]], document_id: str, embeddings: np.ndarray):
+        """Add chunks with embeddings (float32 array, one row per chunk) to the vector store"""
+        self.add_chunk_records(
+            [{**chunk, "document_id": document_id} for chunk in chunks],
+            embeddings
+        )
+    
+    def add_chunk_records(self, chunks: List[Dict[str, Any]], embeddings: np.ndarray):
+        """
+        Add chunks from any number of documents in one write
+        
+        Each chunk dictionary must carry its own document_id. Existing
+        chunks with the same document_id and chunk_index are replaced.
+        """
+        if not chunks:
+            return
+        
+        ids = [self.make_chunk_id(chunk['document_id'], chunk['chunk_index']) for chunk in chunks]
+        documents = [chunk['content'] for chunk in chunks]
+        metadatas = [
+            {
+                "document_id": chunk['document_id'],
+                "chunk_index": chunk['chunk_index'],
+                "char_count": chunk['char_count']
+            }
+            for chunk in chunks
+        ]
+        
+        self._upsert(ids, embeddings, documents, metadatas)
+        
+        with self._document_lock:
+            for chunk in chunks:
+                self._document_chunks.setdefault(chunk['document_id'], set()).add(chunk['chunk_index'])
+        
+        self.lexical_index.add(
+            {"id": chunk_id, "document_id": chunk['document_id'], "content": chunk['content']}
+            for chunk_id, chunk in zip(ids, chunks)
+        )
+        
+        document_count = len({chunk['document_id'] for chunk in chunks})
+        print(f"Added {len(chunks)} chunks to vector store for {document_count} document(s)")
+    
+    def get_document_chunk_ids(self, document_ids: List[str]) -> List[str]:
+        """IDs of every chunk of the given documents, from the in-memory map"""
+        with self._document_lock:
+            return [
+                self.make_chunk_id(document_id, chunk_index)
+                for document_id in document_ids
+                for chunk_index in self._document_chunks.get(document_id, ())
+            ]
+    
+    def search_many(self, query_embeddings: np.ndarray, top_k: int = 5, document_ids: List[str] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search for similar chunks for several queries in one round trip
+        
+        Searches restricted to documents with at most exact_search_max_chunks
+        chunks in total score just those chunks' vectors exactly instead of
+        running a filtered index search.
+        
+        Args:
+            query_embeddings: float32 array with one row per query
+            top_k: Number of results per query
+            document_ids: Optional list of document IDs to restrict the search to
+        
+        Returns:
+            One list of hits per query, best first; score is the cosine similarity
+        """
+        if len(query_embeddings) == 0:
+            return []
+        
+        if document_ids:
+            chunk_ids = self.get_document_chunk_ids(document_ids)
+            if not chunk_ids:
+                return [[] for _ in query_embeddings]
+            if len(chunk_ids) <= self.exact_search_max_chunks:
+                return self._search_exact(query_embeddings, chunk_ids, top_k)
+        
+        return self._search_many(query_embeddings, top_k, document_ids)
+    
+    def _search_exact(self, query_embeddings: np.ndarray, chunk_ids: List[str], top_k: int) -> List[List[Dict[str, Any]]]:
+        """Brute-force cosine similarity over the given chunks"""
+        chunk_ids, vectors = self._get_embeddings(chunk_ids)
+        if not chunk_ids:
+            return [[] for _ in query_embeddings]
+        
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        scores = queries @ vectors.T
+        
+        k = min(top_k, len(chunk_ids))
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        ranked = []
+        for row_scores, candidates in zip(scores, best):
+            order = candidates[np.argsort(-row_scores[candidates])]
+            ranked.append([(chunk_ids[i], float(row_scores[i])) for i in order])
+        
+        chunks = self.get_chunks_by_ids(list({chunk_id for hits in ranked for chunk_id, _ in hits}))
+        return [
+            [
+                {**chunks[chunk_id], "score": score}
+                for chunk_id, score in hits
+                if chunk_id in chunks
+            ]
+            for hits in ranked
+        ]
+    
+    def similarities(self, query_embeddings: np.ndarray, chunk_ids: List[List[str]]) -> List[Dict[str, float]]:
+        """
+        Cosine similarity of each query to the given chunks
+        
+        Args:
+            query_embeddings: float32 array with one row per query
+            chunk_ids: One list of chunk IDs per query
+        
+        Returns:
+            One {chunk_id: similarity} dictionary per query (chunks that no longer exist are left out)
+        """
+        found, vectors = self._get_embeddings(list({chunk_id for ids in chunk_ids for chunk_id in ids}))
+        if not found:
+            return [{} for _ in chunk_ids]
+        
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        scores = queries @ vectors.T
+        
+        columns = {chunk_id: i for i, chunk_id in enumerate(found)}
+        return [
+            {chunk_id: float(row[columns[chunk_id]]) for chunk_id in ids if chunk_id in columns}
+            for row, ids in zip(scores, chunk_ids)
+        ]
+    
+    def search_lexical_many(self, queries: List[str], top_k: int = 5, document_ids: List[str] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search the lexical (BM25) index for several queries
+        
+        Returns:
+            One list of hits per query, best first; score is the BM25 score
+        """
+        ranked = [self.lexical_index.search(query, top_k, document_ids) for query in queries]
+        chunks = self.get_chunks_by_ids(list({chunk_id for hits in ranked for chunk_id, _ in hits}))
+        return [
+            [
+                {**chunks[chunk_id], "score": score}
+                for chunk_id, score in hits
+                if chunk_id in chunks
+            ]
+            for hits in ranked
+        ]
+    
+    def delete_by_document_id(self, document_id: str):
+        """Delete all chunks for a specific document"""
+        with self._document_lock:
+            chunk_indexes = self._document_chunks.pop(document_id, None)
+        if chunk_indexes is None:
+            # Not in the map (written by another process since this store was opened): ask the backend
+            ids = self._find_document_chunk_ids(document_id)
+        else:
+            ids = [self.make_chunk_id(document_id, i) for i in chunk_indexes]
+        if ids:
+            self._delete_ids(ids)
+            print(f"Deleted {len(ids)} chunks for document {document_id}")
+        self.lexical_index.delete_document(document_id)
+    
+    def delete_chunks(self, document_id: str, chunk_indexes: List[int]):
+        """Delete specific chunks of a document"""
+        if chunk_indexes:
+            ids = [self.make_chunk_id(document_id, i) for i in chunk_indexes]
+            self._delete_ids(ids)
+            self.lexical_index.delete_ids(ids)
+            with self._document_lock:
+                remaining = self._document_chunks.get(document_id)
+                if remaining is not None:
+                    remaining.difference_update(chunk_indexes)
+                    if not remaining:
+                        del self._document_chunks[document_id]
+    
+    def clear_all(self):
+        """Clear all data from the vector store"""
+        self._clear()
+        with self._document_lock:
+            self._document_chunks.clear()
+        self.lexical_index.clear()
+        print("Vector store cleared")
+    
+    def flush(self):
+        """Persist the lexical index if it changed, at most every LEXICAL_SAVE_INTERVAL seconds"""
+        if self.lexical_index is not None:
+            self.lexical_index.save(min_interval=app_settings.LEXICAL_SAVE_INTERVAL)
+    
+    def close(self):
+        """Write pending lexical index changes and release the store's lock (backends release their own resources)"""
+        if self.lexical_index is not None:
+            self.lexical_index.save()
+        if self._store_lock is not None:
+            self._store_lock.close()
+            self._store_lock = None
+    
+    def _rebuild_lexical_index(self):
+        """Index every chunk already in the store"""
+        self.lexical_index.clear()
+        for page in self._iter_chunks():
+            self.lexical_index.add(page)
+        self.lexical_index.save(force=True)
+        print(f"Lexical index rebuilt with {len(self.lexical_index)} chunks")
+    
+    @abstractmethod
+    def _upsert(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict[str, Any]]):
+        """Insert or replace chunks by id"""
+    
+    @abstractmethod
+    def _search_many(self, query_embeddings: np.ndarray, top_k: int, document_ids: List[str] = None) -> List[List[Dict[str, Any]]]:
+        """Index search for several queries, optionally filtered by document"""
+    
+    @abstractmethod
+    def _get_embeddings(self, ids: List[str]) -> Tuple[List[str], np.ndarray]:
+        """Stored vectors for the given chunk ids, as (found ids, float32 rows)"""
+    
+    @abstractmethod
+    def get_chunks_by_ids(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get chunk content and metadata by chunk id"""
+    
+    @abstractmethod
+    def _find_document_chunk_ids(self, document_id: str) -> List[str]:
+        """IDs of a document's chunks, read from the backend's own storage"""
+    
+    @abstractmethod
+    def _delete_ids(self, ids: List[str]):
+        """Delete chunks by id"""
+    
+    @abstractmethod
+    def _clear(self):
+        """Delete every chunk"""
+    
+    @abstractmethod
+    def get_count(self) -> int:
+        """Get total number of chunks in the store"""
+    
+    @abstractmethod
+    def _iter_chunks(self, page_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        """Yield pages of {id, document_id, content} for every stored chunk"""
+    
+    @abstractmethod
+    def _iter_chunk_refs(self, page_size: int = 10000) -> Iterator[List[Tuple[str, int]]]:
+        """Yield pages of (document_id, chunk_index) for every stored chunk"""
+
+class ChromaVectorStore(VectorStore):
     """Manage ChromaDB vector store"""
     
-    def __init__(self):
+    def __init__(self, persist_dir: Optional[str] = None, indexed: bool = True):
         """Initialize ChromaDB client"""
+        # Imported here so the quantized backend never pays for chromadb
+        import chromadb
+        
         # Create persist directory if it doesn't exist
-        os.makedirs(app_settings.CHROMA_PERSIST_DIR, exist_ok=True)
+        persist_dir = persist_dir or app_settings.CHROMA_PERSIST_DIR
+        os.makedirs(persist_dir, exist_ok=True)
         
         # Initialize ChromaDB client with persistence
         self.client = chromadb.PersistentClient(
-            path=app_settings.CHROMA_PERSIST_DIR
+            path=persist_dir
         )
         
         # Get or create collection
@@ -24,73 +358,151 @@ class VectorStore:
         )
         
         print(f"ChromaDB initialized with {self.collection.count()} existing chunks")
-    
-    def add_chunks(self, chunks: List[Dict[str, Any]], document_id: str, embeddings: List[List[float]]):
-        """Add chunks with embeddings to the vector store"""
-        ids = [f"{document_id}_chunk_{chunk['chunk_index']}" for chunk in chunks]
-        documents = [chunk['content'] for chunk in chunks]
-        metadatas = [
-            {
-                "document_id": document_id,
-                "chunk_index": chunk['chunk_index'],
-                "char_count": chunk['char_count']
-            }
-            for chunk in chunks
-        ]
-        
-        self.collection.add(
-            ids=ids,
-            embeddings=embeddings,
-            documents=documents,
-            metadatas=metadatas
-        )
         
-        print(f"Added {len(chunks)} chunks to vector store for document {document_id}")
+        super().__init__(persist_dir, indexed)
     
-    def search(self, query_embedding: List[float], top_k: int = 5, document_ids: List[str] = None) -> Dict[str, Any]:
-        """Search for similar chunks"""
+    def _upsert(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict[str, Any]]):
+        """Upsert chunks into the collection"""
+        # Chroma limits the size of a single write
+        max_batch = self.client.get_max_batch_size()
+        for start in range(0, len(ids), max_batch):
+            end = start + max_batch
+            self.collection.upsert(
+                ids=ids[start:end],
+                embeddings=embeddings[start:end],
+                documents=documents[start:end],
+                metadatas=metadatas[start:end]
+            )
+    
+    def _search_many(self, query_embeddings: np.ndarray, top_k: int, document_ids: List[str] = None) -> List[List[Dict[str, Any]]]:
+        """Search for similar chunks for several queries in one Chroma query"""
         where_filter = None
         if document_ids:
             where_filter = {"document_id": {"$in": document_ids}}
         
         results = self.collection.query(
-            query_embeddings=[query_embedding],
+            query_embeddings=query_embeddings,
             n_results=top_k,
             where=where_filter
         )
         
-        return results
+        return self._format_results(results)
     
-    def delete_by_document_id(self, document_id: str):
-        """Delete all chunks for a specific document"""
-        # Get all chunk IDs for this document
-        results = self.collection.get(
-            where={"document_id": document_id}
-        )
-        
-        if results['ids']:
-            self.collection.delete(ids=results['ids'])
-            print(f"Deleted {len(results['ids'])} chunks for document {document_id}")
-        
-    def clear_all(self):
-        """Clear all data from the vector store"""
+    @staticmethod
+    def _format_results(results: Dict[str, Any]) -> List[List[Dict[str, Any]]]:
+        """Turn a Chroma query result into one list of hit dictionaries per query"""
+        formatted = []
+        for ids, documents, metadatas, distances in zip(
+            results['ids'], results['documents'], results['metadatas'], results['distances']
+        ):
+            formatted.append([
+                {
+                    "id": chunk_id,
+                    "document_id": metadata["document_id"],
+                    "chunk_index": metadata["chunk_index"],
+                    "content": content,
+                    "score": 1.0 - distance
+                }
+                for chunk_id, content, metadata, distance in zip(ids, documents, metadatas, distances)
+            ])
+        return formatted
+    
+    def get_chunks_by_ids(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get chunk content and metadata by chunk id"""
+        if not ids:
+            return {}
+        results = self.collection.get(ids=ids, include=["documents", "metadatas"])
+        return {
+            chunk_id: {
+                "id": chunk_id,
+                "document_id": metadata["document_id"],
+                "chunk_index": metadata["chunk_index"],
+                "content": content
+            }
+            for chunk_id, content, metadata in zip(results['ids'], results['documents'], results['metadatas'])
+        }
+    
+    def _get_embeddings(self, ids: List[str]) -> Tuple[List[str], np.ndarray]:
+        """Fetch stored embeddings by chunk id"""
+        results = self.collection.get(ids=ids, include=["embeddings"])
+        return results['ids'], np.asarray(results['embeddings'], dtype=np.float32)
+    
+    def _find_document_chunk_ids(self, document_id: str) -> List[str]:
+        """IDs of a document's chunks, by metadata filter"""
+        return self.collection.get(where={"document_id": document_id}, include=[])['ids']
+    
+    def _delete_ids(self, ids: List[str]):
+        """Delete chunks by id"""
+        self.collection.delete(ids=ids)
+    
+    def _clear(self):
+        """Drop and recreate the collection"""
         self.client.delete_collection("document_chunks")
         self.collection = self.client.create_collection(
             name="document_chunks",
             metadata={"hnsw:space": "cosine"}
         )
-        print("Vector store cleared")
     
     def get_count(self) -> int:
         """Get total number of chunks in the store"""
         return self.collection.count()
+    
+    def _iter_chunks(self, page_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        """Page through the collection"""
+        total = self.collection.count()
+        for offset in range(0, total, page_size):
+            results = self.collection.get(
+                include=["documents", "metadatas"],
+                limit=page_size,
+                offset=offset
+            )
+            yield [
+                {"id": chunk_id, "document_id": metadata["document_id"], "content": content}
+                for chunk_id, content, metadata in zip(results['ids'], results['documents'], results['metadatas'])
+            ]
+    
+    def _iter_chunk_refs(self, page_size: int = 10000) -> Iterator[List[Tuple[str, int]]]:
+        """Page through the collection's metadata"""
+        total = self.collection.count()
+        for offset in range(0, total, page_size):
+            results = self.collection.get(
+                include=["metadatas"],
+                limit=page_size,
+                offset=offset
+            )
+            yield [(metadata["document_id"], metadata["chunk_index"]) for metadata in results['metadatas']]
 
 # Global instance
 _vector_store = None
+_vector_store_lock = threading.Lock()
 
 def get_vector_store() -> VectorStore:
-    """Get or create vector store singleton"""
+    """
+    Get or create vector store singleton for the configured backend
+    
+    With a model server configured (multi-worker mode) this is a proxy to
+    the store opened in that process, which is then its only writer.
+    """
     global _vector_store
     if _vector_store is None:
-        _vector_store = VectorStore()
-    return _vector_store
\ No newline at end of file
+        with _vector_store_lock:
+            if _vector_store is None:
+                _vector_store = _open_vector_store()
+    return _vector_store
+
+def _open_vector_store() -> VectorStore:
+    if model_server.is_remote():
+        return model_server.connect().vector_store()
+    if app_settings.VECTOR_SHARDS > 1:
+        from app.utils.sharded_store import ShardedVectorStore
+        return ShardedVectorStore()
+    if app_settings.VECTOR_BACKEND == "quantized":
+        from app.utils.quantized_store import QuantizedVectorStore
+        return QuantizedVectorStore()
+    if app_settings.VECTOR_BACKEND == "chroma":
+        return ChromaVectorStore()
+    raise ValueError(f"Unknown VECTOR_BACKEND: {app_settings.VECTOR_BACKEND}")
+
+def peek_vector_store() -> Optional[VectorStore]:
+    """The vector store if it has been opened, without opening it"""
+    return _vector_store
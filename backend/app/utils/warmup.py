@@ -0,0 +1,37 @@
+import time
+from typing import Dict, Any, Callable
+
+from app.config import settings
+from app.utils.chunker import get_tokenizer
+from app.utils.embeddings import get_embedding_generator
+from app.utils.reranker import get_reranker
+from app.utils.vector_store import get_vector_store
+
+def _timed(report: Dict[str, Any], name: str, func: Callable[[], Any]):
+    """Run one warm-up step and record its duration or error"""
+    started = time.perf_counter()
+    try:
+        func()
+        report[name] = round(time.perf_counter() - started, 3)
+    except Exception as e:
+        report[name] = f"error: {str(e)}"
+        print(f"Warm-up of {name} failed: {str(e)}")
+
+def warm_up() -> Dict[str, Any]:
+    """
+    Load the tokenizer, models and vector store before the first request
+    
+    Each model also runs once so that lazy initialisation inside the
+    runtime happens here. Failures are reported but not raised; the
+    component is then loaded on first use as before.
+    
+    Returns:
+        Seconds spent per component (or an error message)
+    """
+    report: Dict[str, Any] = {}
+    _timed(report, "tokenizer", get_tokenizer)
+    _timed(report, "embedding_model", lambda: get_embedding_generator().generate_embedding("warm-up"))
+    _timed(report, "vector_store", get_vector_store)
+    if settings.RERANK_ENABLED:
+        _timed(report, "reranker", lambda: get_reranker().warm_up())
+    return report
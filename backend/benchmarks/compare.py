@@ -0,0 +1,85 @@
+"""
+Compare two benchmark result files and flag regressions
+
+Throughputs (keys ending in _per_second) are better when higher, latency
+percentiles (under latency_ms) when lower. A metric regresses when it is
+worse than the baseline by more than the threshold.
+
+Usage:
+    uv run python -m benchmarks.compare <baseline.json> <current.json> [--threshold 0.15] [--fail]
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Any, List, Iterator, Tuple
+
+COMPARED_PERCENTILES = ("p50", "p95")
+
+def iter_metrics(results: Dict[str, Any], prefix: str = "") -> Iterator[Tuple[str, float, bool]]:
+    """Yield (name, value, higher_is_better) for every compared metric"""
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if key == "latency_ms" and isinstance(value, dict):
+            for percentile in COMPARED_PERCENTILES:
+                if percentile in value:
+                    yield f"{name}.{percentile}", value[percentile], False
+        elif isinstance(value, dict):
+            yield from iter_metrics(value, f"{name}.")
+        elif key.endswith("_per_second") and isinstance(value, (int, float)):
+            yield name, value, True
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.15) -> List[Dict[str, Any]]:
+    """
+    Compare the metrics present in both result files
+    
+    Returns:
+        One row per metric with baseline, current, relative change (positive
+        is better) and whether it is a regression
+    """
+    previous = {name: value for name, value, _ in iter_metrics(baseline["results"])}
+    rows = []
+    for name, value, higher_is_better in iter_metrics(current["results"]):
+        old = previous.get(name)
+        if old is None or old == 0:
+            continue
+        change = (value - old) / old if higher_is_better else (old - value) / old
+        rows.append({
+            "metric": name,
+            "baseline": old,
+            "current": value,
+            "change": round(change, 4),
+            "regression": change < -threshold
+        })
+    return rows
+
+def print_comparison(baseline: Dict[str, Any], current: Dict[str, Any], rows: List[Dict[str, Any]]):
+    """Print the comparison table, worst changes first"""
+    if baseline["metadata"].get("corpus") != current["metadata"].get("corpus"):
+        print("Warning: the runs used different corpora, numbers are not directly comparable")
+    print(f"Baseline: {baseline['metadata'].get('git_commit')}  Current: {current['metadata'].get('git_commit')}")
+    for row in sorted(rows, key=lambda row: row["change"]):
+        flag = "REGRESSION" if row["regression"] else ""
+        print(f"{row['metric']:<55} {row['baseline']:>12.3f} {row['current']:>12.3f} {row['change']:>+8.1%} {flag}")
+    regressions = sum(1 for row in rows if row["regression"])
+    print(f"{regressions} regression(s) in {len(rows)} compared metrics")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline", help="Results of the reference commit")
+    parser.add_argument("current", help="Results to check")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed relative slowdown (default 0.15)")
+    parser.add_argument("--fail", action="store_true", help="Exit with status 1 if any metric regressed")
+    args = parser.parse_args()
+    
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    
+    rows = compare(baseline, current, args.threshold)
+    print_comparison(baseline, current, rows)
+    if args.fail and any(row["regression"] for row in rows):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Deterministic synthetic corpora for the benchmarks
+
+Every file is generated from a seed, so two runs with the same preset and
+seed produce byte-identical documents. Each corpus also records a set of
+fact sentences planted in the text together with questions about them,
+which the retrieval and query benchmarks ask.
+
+Usage:
+    uv run python -m benchmarks.corpus <directory> [--size small] [--seed 42]
+"""
+import argparse
+import io
+import os
+import random
+import zipfile
+from datetime import datetime
+from typing import List, Dict, Tuple
+import numpy as np
+
+FILE_TYPES = ("pdf", "docx", "txt", "md")
+
+# Files per type and the text size range (bytes) they are spread over
+PRESETS: Dict[str, Dict[str, int]] = {
+    "tiny": {"files_per_type": 2, "min_bytes": 1_000, "max_bytes": 20_000},
+    "small": {"files_per_type": 4, "min_bytes": 2_000, "max_bytes": 200_000},
+    "medium": {"files_per_type": 8, "min_bytes": 2_000, "max_bytes": 2_000_000},
+    "large": {"files_per_type": 12, "min_bytes": 2_000, "max_bytes": 20_000_000}
+}
+
+_SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "da", "fe", "gu", "hi", "jo", "pe", "qu", "ri", "to", "ul", "xa"]
+_SUBJECTS = ["system", "protocol", "reactor", "archive", "treaty", "compiler", "vaccine", "bridge", "satellite", "algorithm"]
+
+# Timestamp written into DOCX files instead of the current time
+_FIXED_TIME = datetime(2024, 1, 1)
+
+class TextGenerator:
+    """Pseudo-random prose from a fixed vocabulary, with planted facts"""
+    
+    def __init__(self, seed: int, vocabulary_size: int = 5000):
+        self.random = random.Random(seed)
+        words = set()
+        while len(words) < vocabulary_size:
+            words.add("".join(self.random.choice(_SYLLABLES) for _ in range(self.random.randint(1, 4))))
+        self.words = sorted(words)
+        # Zipf-like word frequencies, as in natural text
+        weights = 1 / np.arange(1, len(self.words) + 1)
+        self.cumulative = np.cumsum(weights / weights.sum())
+        self.facts: List[Dict[str, str]] = []
+    
+    def _word(self) -> str:
+        return self.words[int(np.searchsorted(self.cumulative, self.random.random()))]
+    
+    def sentence(self) -> str:
+        words = [self._word() for _ in range(self.random.randint(8, 20))]
+        return " ".join(words).capitalize() + "."
+    
+    def fact(self, filename: str) -> str:
+        """A sentence stating a unique fact, remembered with a question about it"""
+        name = f"{self._word().capitalize()}-{len(self.facts) + 1}"
+        subject = self.random.choice(_SUBJECTS)
+        year = self.random.randint(1900, 2030)
+        self.facts.append({
+            "filename": filename,
+            "question": f"When was the {name} {subject} introduced?",
+            "answer": str(year)
+        })
+        return f"The {name} {subject} was introduced in {year}."
+    
+    def paragraph(self, filename: str, fact_probability: float = 0.05) -> str:
+        sentences = [self.sentence() for _ in range(self.random.randint(3, 8))]
+        if self.random.random() < fact_probability:
+            sentences.insert(self.random.randrange(len(sentences) + 1), self.fact(filename))
+        return " ".join(sentences)
+    
+    def paragraphs(self, filename: str, size: int) -> List[str]:
+        """Paragraphs totalling about size characters"""
+        result = [self.paragraph(filename, fact_probability=1.0)]
+        total = len(result[0])
+        while total < size:
+            result.append(self.paragraph(filename))
+            total += len(result[-1]) + 2
+        return result
+
+def _escape_pdf(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def _wrap(text: str, width: int) -> List[str]:
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + len(word) + 1 > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+def make_pdf(paragraphs: List[str], lines_per_page: int = 60, width: int = 95) -> bytes:
+    """Minimal PDF with one Helvetica text stream per page"""
+    lines: List[str] = []
+    for paragraph in paragraphs:
+        lines.extend(_wrap(paragraph, width))
+        lines.append("")
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+    
+    # Objects: 1 catalog, 2 page tree, 3 font, then a page and its content stream per page
+    objects: List[bytes] = [b"", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_refs = []
+    for page in pages:
+        stream = "BT /F1 10 Tf 12 TL 50 780 Td " + " ".join(f"({_escape_pdf(line)}) '" for line in page) + " ET"
+        data = stream.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(data), data))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % ref for ref in page_refs), len(page_refs)
+    )
+    
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+def make_docx(paragraphs: List[str], title: str) -> bytes:
+    """DOCX with a heading and one paragraph per entry"""
+    import docx
+    document = docx.Document()
+    document.core_properties.created = document.core_properties.modified = _FIXED_TIME
+    document.add_heading(title, level=1)
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    saved = io.BytesIO()
+    document.save(saved)
+    
+    # Re-pack with fixed timestamps so the bytes depend only on the seed
+    out = io.BytesIO()
+    with zipfile.ZipFile(saved) as source, zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as target:
+        for name in source.namelist():
+            target.writestr(zipfile.ZipInfo(name, date_time=_FIXED_TIME.timetuple()[:6]), source.read(name), zipfile.ZIP_DEFLATED)
+    return out.getvalue()
+
+def make_markdown(paragraphs: List[str], title: str, generator: TextGenerator) -> bytes:
+    """Markdown with section headings, paragraphs and an occasional list"""
+    parts = [f"# {title}"]
+    for i, paragraph in enumerate(paragraphs):
+        if i % 10 == 0:
+            parts.append(f"## Section {i // 10 + 1}")
+        parts.append(paragraph)
+        if i % 10 == 5:
+            parts.append("\n".join(f"- {generator.sentence()}" for _ in range(3)))
+    return "\n\n".join(parts).encode("utf-8")
+
+def file_sizes(files_per_type: int, min_bytes: int, max_bytes: int) -> List[int]:
+    """Text sizes spread geometrically from min_bytes to max_bytes"""
+    if files_per_type == 1:
+        return [min_bytes]
+    return [int(size) for size in np.geomspace(min_bytes, max_bytes, files_per_type)]
+
+def generate_corpus(
+    files_per_type: int,
+    min_bytes: int,
+    max_bytes: int,
+    seed: int = 42,
+    file_types: Tuple[str, ...] = FILE_TYPES
+) -> Tuple[List[Tuple[str, bytes]], List[Dict[str, str]]]:
+    """
+    Generate a corpus in memory
+    
+    Returns:
+        (filename, content) pairs, and the planted facts (filename, question, answer)
+    """
+    generator = TextGenerator(seed)
+    files = []
+    for file_type in file_types:
+        for i, size in enumerate(file_sizes(files_per_type, min_bytes, max_bytes)):
+            filename = f"{file_type}_{i:02d}_{size}.{file_type}"
+            paragraphs = generator.paragraphs(filename, size)
+            title = f"Synthetic document {filename}"
+            if file_type == "pdf":
+                content = make_pdf(paragraphs)
+            elif file_type == "docx":
+                content = make_docx(paragraphs, title)
+            elif file_type == "md":
+                content = make_markdown(paragraphs, title, generator)
+            else:
+                content = "\n\n".join(paragraphs).encode("utf-8")
+            files.append((filename, content))
+    return files, generator.facts
+
+def generate_preset(size: str, seed: int = 42) -> Tuple[List[Tuple[str, bytes]], List[Dict[str, str]]]:
+    """Generate one of the PRESETS"""
+    return generate_corpus(seed=seed, **PRESETS[size])
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic benchmark corpus to a directory")
+    parser.add_argument("directory", help="Output directory")
+    parser.add_argument("--size", choices=sorted(PRESETS), default="small", help="Corpus preset")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    args = parser.parse_args()
+    
+    os.makedirs(args.directory, exist_ok=True)
+    files, facts = generate_preset(args.size, args.seed)
+    for filename, content in files:
+        with open(os.path.join(args.directory, filename), "wb") as f:
+            f.write(content)
+    total = sum(len(content) for _, content in files)
+    print(f"Wrote {len(files)} files ({total / 1e6:.1f} MB) and {len(facts)} facts to {args.directory}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+"""
+Benchmark extraction, chunking, embedding, the vector store, ingestion and queries
+
+A synthetic corpus (see benchmarks.corpus) is generated from a seed and run
+through each stage in turn. MongoDB and Ollama are replaced by the
+in-process stand-ins in benchmarks.stand_ins, and the vector store, caches
+and indexes live in a temporary directory, so runs do not touch local data.
+The embedding, answer and retrieval caches are disabled so every run does
+the same work. Results are written as JSON; pass --baseline to compare
+them with an earlier run.
+
+Usage:
+    uv run python -m benchmarks.run [--size small] [--output results.json] [--baseline old.json]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional
+import numpy as np
+
+from benchmarks.corpus import PRESETS, generate_corpus
+from benchmarks.compare import compare, print_comparison
+
+PERCENTILES = (50, 90, 95, 99)
+
+def summarize(latencies: List[float], total_seconds: Optional[float] = None, **totals) -> Dict[str, Any]:
+    """
+    Latency percentiles (ms) of the timed operations, and throughput per total
+    
+    Each keyword (e.g. chunks=1200) is reported as a count and as
+    <name>_per_second over total_seconds (the sum of latencies by default).
+    """
+    total_seconds = total_seconds if total_seconds is not None else float(sum(latencies))
+    result: Dict[str, Any] = {"operations": len(latencies), "total_seconds": round(total_seconds, 4)}
+    for name, count in totals.items():
+        result[name] = count
+        result[f"{name}_per_second"] = round(count / total_seconds, 3) if total_seconds > 0 else 0.0
+    if latencies:
+        values = np.asarray(latencies) * 1000
+        result["latency_ms"] = {
+            **{f"p{p}": round(float(np.percentile(values, p)), 3) for p in PERCENTILES},
+            "mean": round(float(values.mean()), 3),
+            "max": round(float(values.max()), 3)
+        }
+    return result
+
+def _git_commit() -> Optional[str]:
+    """Current commit, suffixed with -dirty if the tree has changes"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _isolate(workdir: str, vector_backend: Optional[str]):
+    """Point every on-disk store at workdir and disable caches (before app modules are imported)"""
+    os.environ["CHROMA_PERSIST_DIR"] = os.path.join(workdir, "chroma_db")
+    os.environ["QUANTIZED_STORE_DIR"] = os.path.join(workdir, "vector_index")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(workdir, "embeddings.sqlite3")
+    os.environ["ANSWER_CACHE_PATH"] = os.path.join(workdir, "answers.sqlite3")
+    os.environ["TRACE_PATH"] = os.path.join(workdir, "traces.jsonl")
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+    os.environ["ANSWER_CACHE_ENABLED"] = "false"
+    os.environ["TRACE_ENABLED"] = "false"
+    if vector_backend:
+        os.environ["VECTOR_BACKEND"] = vector_backend
+
+def bench_extract(files) -> Dict[str, Any]:
+    """Text extraction per file type; returns the segments for the chunking stage too"""
+    from app.utils.document_processor import DocumentProcessor
+    results, segments = {}, {}
+    for file_type in sorted({DocumentProcessor.get_file_type(name) for name, _ in files}):
+        latencies, total_bytes, total_chars = [], 0, 0
+        for name, content in files:
+            if DocumentProcessor.get_file_type(name) != file_type:
+                continue
+            started = time.perf_counter()
+            segments[name] = list(DocumentProcessor.iter_text_segments(content, file_type))
+            latencies.append(time.perf_counter() - started)
+            total_bytes += len(content)
+            total_chars += sum(len(segment) for segment in segments[name])
+        results[file_type] = summarize(latencies, bytes=total_bytes, chars=total_chars)
+    return {"by_type": results, "segments": segments}
+
+def bench_chunk(segments: Dict[str, List[str]]) -> Dict[str, Any]:
+    """Token chunking per document"""
+    from app.utils.chunker import get_chunker
+    chunker = get_chunker()
+    latencies, chunks = [], {}
+    for name, document_segments in segments.items():
+        started = time.perf_counter()
+        chunks[name] = list(chunker.iter_chunks(document_segments))
+        latencies.append(time.perf_counter() - started)
+    total_chunks = sum(len(document_chunks) for document_chunks in chunks.values())
+    total_tokens = sum(chunk["token_count"] for document_chunks in chunks.values() for chunk in document_chunks)
+    return {"result": summarize(latencies, documents=len(segments), chunks=total_chunks, tokens=total_tokens), "chunks": chunks}
+
+def bench_embed(texts: List[str], questions: List[str]) -> Dict[str, Any]:
+    """Batched chunk embedding at EMBEDDING_BATCH_SIZE, and single-query embedding"""
+    from app.config import settings
+    from app.utils.embeddings import get_embedding_generator
+    generator = get_embedding_generator()
+    batch_size = settings.EMBEDDING_BATCH_SIZE
+    
+    latencies, embeddings = [], []
+    for i in range(0, len(texts), batch_size):
+        started = time.perf_counter()
+        embeddings.append(generator.generate_embeddings(texts[i:i + batch_size], use_cache=False))
+        latencies.append(time.perf_counter() - started)
+    
+    query_latencies, query_embeddings = [], []
+    for question in questions:
+        started = time.perf_counter()
+        query_embeddings.append(generator.generate_embeddings([question], use_cache=False)[0])
+        query_latencies.append(time.perf_counter() - started)
+    
+    return {
+        "result": {
+            "batches": summarize(latencies, chunks=len(texts)),
+            "single_query": summarize(query_latencies, queries=len(questions))
+        },
+        "embeddings": np.vstack(embeddings) if embeddings else np.zeros((0, generator.get_embedding_dimension()), dtype=np.float32),
+        "query_embeddings": np.vstack(query_embeddings)
+    }
+
+def bench_vector_store(records: List[Dict[str, Any]], embeddings: np.ndarray, facts: List[Dict[str, str]], query_embeddings: np.ndarray, batch_queries: int) -> Dict[str, Any]:
+    """Inserts at BULK_WRITE_SIZE, then dense, filtered, batched and lexical searches"""
+    from app.config import settings
+    from app.utils.vector_store import get_vector_store
+    store = get_vector_store()
+    top_k = settings.TOP_K_RETRIEVAL
+    
+    insert_latencies = []
+    for i in range(0, len(records), settings.BULK_WRITE_SIZE):
+        started = time.perf_counter()
+        store.add_chunk_records(records[i:i + settings.BULK_WRITE_SIZE], embeddings[i:i + settings.BULK_WRITE_SIZE])
+        insert_latencies.append(time.perf_counter() - started)
+    started = time.perf_counter()
+    store.flush()
+    flush_seconds = time.perf_counter() - started
+    
+    dense, filtered, lexical, found = [], [], [], 0
+    for fact, embedding in zip(facts, query_embeddings):
+        started = time.perf_counter()
+        hits = store.search_many(embedding[None, :], top_k)[0]
+        dense.append(time.perf_counter() - started)
+        found += any(fact["answer"] in hit["content"] and fact["question"].split()[3] in hit["content"] for hit in hits)
+        
+        started = time.perf_counter()
+        store.search_many(embedding[None, :], top_k, [fact["document_id"]])
+        filtered.append(time.perf_counter() - started)
+        
+        started = time.perf_counter()
+        store.search_lexical_many([fact["question"]], top_k)
+        lexical.append(time.perf_counter() - started)
+    
+    batched = []
+    for i in range(0, len(query_embeddings), batch_queries):
+        started = time.perf_counter()
+        store.search_many(query_embeddings[i:i + batch_queries], top_k)
+        batched.append(time.perf_counter() - started)
+    
+    return {
+        "insert": {**summarize(insert_latencies, chunks=len(records)), "flush_seconds": round(flush_seconds, 4)},
+        "search": summarize(dense, queries=len(dense)),
+        "search_filtered": summarize(filtered, queries=len(filtered)),
+        "search_batched": {**summarize(batched, queries=len(query_embeddings)), "batch_size": batch_queries},
+        "search_lexical": summarize(lexical, queries=len(lexical)),
+        "vectors": store.get_count(),
+        "quality": {"fact_recall_at_k": round(found / len(facts), 4) if facts else None}
+    }
+
+def _stage_seconds(pipeline: str) -> Dict[str, float]:
+    """Total seconds per stage recorded in the docqa_stage_seconds histogram so far"""
+    from app.utils.metrics import STAGE_SECONDS
+    totals = {}
+    for metric in STAGE_SECONDS.collect():
+        for sample in metric.samples:
+            if sample.name.endswith("_sum") and sample.labels["pipeline"] == pipeline:
+                totals[sample.labels["stage"]] = sample.value
+    return totals
+
+async def bench_ingest(files) -> Dict[str, Any]:
+    """End-to-end ingest_documents into a fresh vector store and the MongoDB stand-in"""
+    from app.utils.ingestion import ingest_documents
+    from app.utils.retrieval import bump_corpus_generation
+    from app.utils.vector_store import get_vector_store
+    from benchmarks.stand_ins import install_mongo
+    
+    await asyncio.to_thread(get_vector_store().clear_all)
+    install_mongo()
+    
+    before = _stage_seconds("ingest")
+    started = time.perf_counter()
+    reports = await ingest_documents(iter(files))
+    total = time.perf_counter() - started
+    bump_corpus_generation()
+    after = _stage_seconds("ingest")
+    
+    failed = [report for report in reports if report["status"] not in ("success", "updated")]
+    for report in failed:
+        print(f"Ingestion of {report['filename']} failed: {report['message']}")
+    return {
+        **summarize(
+            [],
+            total_seconds=total,
+            documents=len(reports),
+            bytes=sum(len(content) for _, content in files),
+            chunks=sum(report["total_chunks"] for report in reports)
+        ),
+        "failed": len(failed),
+        "stage_seconds": {stage: round(seconds - before.get(stage, 0.0), 4) for stage, seconds in after.items()},
+        "document_ids": {report["filename"]: report["document_id"] for report in reports}
+    }
+
+async def bench_retrieve(questions: List[str], concurrency: int) -> Dict[str, Any]:
+    """retrieve() one question at a time, then many concurrent requests, with cold caches"""
+    from app.utils import retrieval
+    
+    sequential = []
+    for question in questions:
+        started = time.perf_counter()
+        await retrieval.retrieve(question)
+        sequential.append(time.perf_counter() - started)
+    
+    retrieval._query_embedding_cache.clear()
+    retrieval.bump_corpus_generation()
+    semaphore = asyncio.Semaphore(concurrency)
+    concurrent = []
+    
+    async def one(question: str):
+        async with semaphore:
+            started = time.perf_counter()
+            await retrieval.retrieve(question)
+            concurrent.append(time.perf_counter() - started)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(one(question) for question in questions))
+    total = time.perf_counter() - started
+    retrieval._query_embedding_cache.clear()
+    retrieval.bump_corpus_generation()
+    
+    return {
+        "sequential": summarize(sequential, queries=len(questions)),
+        "concurrent": {**summarize(concurrent, total_seconds=total, queries=len(questions)), "concurrency": concurrency}
+    }
+
+async def bench_query(questions: List[str], tokens: int, token_delay: float) -> Dict[str, Any]:
+    """POST /api/query through the ASGI app with the Ollama stub"""
+    import httpx
+    from app.main import app
+    from benchmarks.stand_ins import install_ollama
+    stub = install_ollama(tokens, token_delay)
+    
+    # ASGITransport delivers the response once the stream has finished, so
+    # only the total time per request is measured
+    total = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for question in questions:
+            started = time.perf_counter()
+            response = await client.post("/api/query", json={"question": question})
+            response.raise_for_status()
+            total.append(time.perf_counter() - started)
+    
+    return {
+        "total": summarize(total, queries=len(questions)),
+        "stub": {"tokens": tokens, "token_delay_ms": token_delay * 1000, "requests": stub.requests}
+    }
+
+async def run(args, files, facts) -> Dict[str, Any]:
+    """Run every stage and collect the results"""
+    from app.utils.embedding_batcher import get_embedding_batcher
+    from app.utils.warmup import warm_up
+    
+    # Load models and open the store first so no stage pays for it
+    warmup = await asyncio.to_thread(warm_up)
+    questions = [fact["question"] for fact in facts][:args.queries]
+    
+    print("Benchmarking extraction")
+    extracted = await asyncio.to_thread(bench_extract, files)
+    print("Benchmarking chunking")
+    chunked = await asyncio.to_thread(bench_chunk, extracted["segments"])
+    
+    # Stable synthetic document IDs for the component stages
+    document_ids = {name: hashlib.sha1(name.encode()).hexdigest()[:24] for name in chunked["chunks"]}
+    records = [
+        {**chunk, "document_id": document_ids[name]}
+        for name, document_chunks in chunked["chunks"].items()
+        for chunk in document_chunks
+    ]
+    component_facts = [{**fact, "document_id": document_ids[fact["filename"]]} for fact in facts][:args.queries]
+    
+    print(f"Benchmarking embedding of {len(records)} chunks")
+    embedded = await asyncio.to_thread(bench_embed, [record["content"] for record in records], questions)
+    print("Benchmarking the vector store")
+    vector_store = await asyncio.to_thread(
+        bench_vector_store, records, embedded["embeddings"], component_facts, embedded["query_embeddings"], args.search_batch
+    )
+    
+    print("Benchmarking end-to-end ingestion")
+    ingest = await bench_ingest(files)
+    ingest.pop("document_ids")
+    print("Benchmarking retrieval")
+    retrieve = await bench_retrieve(questions, args.concurrency)
+    print("Benchmarking /api/query")
+    query = await bench_query(questions, args.tokens, args.token_delay_ms / 1000)
+    
+    await get_embedding_batcher().stop()
+    return {
+        "warmup_seconds": warmup,
+        "extract": extracted["by_type"],
+        "chunk": chunked["result"],
+        "embed": embedded["result"],
+        "vector_store": vector_store,
+        "ingest": ingest,
+        "retrieve": retrieve,
+        "query": query
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion and retrieval on a synthetic corpus")
+    parser.add_argument("--size", choices=sorted(PRESETS), default="small", help="Corpus preset (default small)")
+    parser.add_argument("--files-per-type", type=int, help="Override the preset's number of files per type")
+    parser.add_argument("--max-bytes", type=int, help="Override the preset's largest text size")
+    parser.add_argument("--seed", type=int, default=42, help="Corpus seed")
+    parser.add_argument("--queries", type=int, default=50, help="Questions asked in the search, retrieval and query stages")
+    parser.add_argument("--search-batch", type=int, default=32, help="Queries per batched vector search")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent requests in the retrieval stage")
+    parser.add_argument("--tokens", type=int, default=20, help="Tokens streamed by the Ollama stub per answer")
+    parser.add_argument("--token-delay-ms", type=float, default=0.0, help="Delay of the Ollama stub before each token")
+    parser.add_argument("--vector-backend", choices=["chroma", "quantized"], help="Override VECTOR_BACKEND")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the results")
+    parser.add_argument("--baseline", help="Earlier results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed relative slowdown when comparing")
+    parser.add_argument("--keep-workdir", action="store_true", help="Keep the temporary stores for inspection")
+    args = parser.parse_args()
+    
+    spec = {**PRESETS[args.size], "seed": args.seed}
+    if args.files_per_type:
+        spec["files_per_type"] = args.files_per_type
+    if args.max_bytes:
+        spec["max_bytes"] = args.max_bytes
+    
+    print(f"Generating corpus {spec}")
+    files, facts = generate_corpus(**spec)
+    corpus_hash = hashlib.sha256(b"".join(content for _, content in files)).hexdigest()[:16]
+    
+    workdir = tempfile.mkdtemp(prefix="docqa-bench-")
+    _isolate(workdir, args.vector_backend)
+    from app.config import settings
+    
+    started = time.perf_counter()
+    try:
+        results = asyncio.run(run(args, files, facts))
+    finally:
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    output = {
+        "metadata": {
+            "git_commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "duration_seconds": round(time.perf_counter() - started, 3),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "corpus": {
+                **spec,
+                "files": len(files),
+                "bytes": sum(len(content) for _, content in files),
+                "facts": len(facts),
+                "sha256": corpus_hash
+            },
+            "settings": {
+                "vector_backend": settings.VECTOR_BACKEND,
+                "embedding_model": settings.EMBEDDING_MODEL,
+                "embedding_backend": settings.EMBEDDING_BACKEND,
+                "embedding_batch_size": settings.EMBEDDING_BATCH_SIZE,
+                "bulk_write_size": settings.BULK_WRITE_SIZE,
+                "chunk_tokens": settings.CHUNK_TOKENS,
+                "chunk_overlap_tokens": settings.CHUNK_OVERLAP_TOKENS,
+                "top_k": settings.TOP_K_RETRIEVAL,
+                "hybrid_search": settings.HYBRID_SEARCH_ENABLED,
+                "rerank": settings.RERANK_ENABLED
+            }
+        },
+        "results": results
+    }
+    
+    directory = os.path.dirname(os.path.abspath(args.output))
+    os.makedirs(directory, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"Results written to {args.output}")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print_comparison(baseline, output, compare(baseline, output, args.threshold))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+In-process stand-ins for MongoDB and Ollama
+
+The benchmarks install these in place of the real clients so that they run
+without external services and measure the application's own work. MongoDB
+timings therefore exclude network and server costs, and generation time
+is whatever the Ollama stub is configured to take.
+"""
+import asyncio
+import json
+from typing import List, Dict, Any, Optional
+import httpx
+import mongomock
+
+class AsyncCursor:
+    """Async view of a mongomock cursor"""
+    
+    def __init__(self, cursor):
+        self._cursor = cursor
+    
+    def sort(self, *args, **kwargs) -> "AsyncCursor":
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+    
+    def skip(self, count: int) -> "AsyncCursor":
+        self._cursor = self._cursor.skip(count)
+        return self
+    
+    def limit(self, count: int) -> "AsyncCursor":
+        self._cursor = self._cursor.limit(count)
+        return self
+    
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        documents = list(self._cursor)
+        return documents[:length] if length else documents
+    
+    def __aiter__(self):
+        return self._iterate()
+    
+    async def _iterate(self):
+        for document in self._cursor:
+            yield document
+
+class AsyncCollection:
+    """Async view of a mongomock collection with the methods the app uses"""
+    
+    def __init__(self, collection: mongomock.Collection):
+        self._collection = collection
+    
+    def find(self, *args, **kwargs) -> AsyncCursor:
+        return AsyncCursor(self._collection.find(*args, **kwargs))
+    
+    async def bulk_write(self, requests, ordered: bool = True):
+        # mongomock cannot take pymongo's operation objects, so apply them one by one
+        for request in requests:
+            kind = type(request).__name__
+            if kind == "InsertOne":
+                self._collection.insert_one(request._doc)
+            elif kind == "ReplaceOne":
+                self._collection.replace_one(request._filter, request._doc, upsert=request._upsert)
+            elif kind == "UpdateOne":
+                self._collection.update_one(request._filter, request._doc, upsert=request._upsert)
+            elif kind == "UpdateMany":
+                self._collection.update_many(request._filter, request._doc, upsert=request._upsert)
+            elif kind == "DeleteOne":
+                self._collection.delete_one(request._filter)
+            elif kind == "DeleteMany":
+                self._collection.delete_many(request._filter)
+            else:
+                raise NotImplementedError(f"Unsupported bulk operation: {kind}")
+    
+    def __getattr__(self, name: str):
+        method = getattr(self._collection, name)
+        
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+class AsyncDatabase:
+    """Async view of a mongomock database"""
+    
+    def __init__(self, database: mongomock.Database):
+        self._database = database
+    
+    def __getitem__(self, name: str) -> AsyncCollection:
+        return AsyncCollection(self._database[name])
+    
+    async def list_collection_names(self) -> List[str]:
+        return self._database.list_collection_names()
+
+class _Admin:
+    async def command(self, *args, **kwargs) -> Dict[str, Any]:
+        return {"ok": 1.0}
+
+class AsyncMongoStandIn:
+    """Replacement for pymongo's AsyncMongoClient backed by mongomock"""
+    
+    def __init__(self):
+        self._client = mongomock.MongoClient()
+        self.admin = _Admin()
+    
+    def __getitem__(self, name: str) -> AsyncDatabase:
+        return AsyncDatabase(self._client[name])
+    
+    async def close(self):
+        self._client.close()
+
+def install_mongo() -> AsyncMongoStandIn:
+    """Connect app.utils.database to a fresh in-memory MongoDB stand-in"""
+    from app.config import settings
+    from app.utils import database
+    client = AsyncMongoStandIn()
+    database._client = client
+    database._db = client[settings.MONGODB_DB_NAME]
+    return client
+
+class OllamaStub:
+    """
+    Answers Ollama's /api/version and streaming /api/chat requests
+    
+    Each chat reply streams `tokens` short pieces, waiting token_delay
+    seconds before each, so time to first token and generation time can
+    be set to mimic a model or kept at zero to measure the pipeline alone.
+    With `error` set, chat requests fail with that message the way Ollama
+    reports errors (HTTP 500 and a JSON error body).
+    """
+    
+    def __init__(self, tokens: int = 20, token_delay: float = 0.0, error: Optional[str] = None):
+        self.tokens = tokens
+        self.token_delay = token_delay
+        self.error = error
+        self.requests = 0
+        self.prompt_chars = 0
+        self.urls: List[str] = []
+    
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/api/version":
+            return httpx.Response(200, json={"version": "0.0.0-stub"})
+        if request.url.path != "/api/chat":
+            return httpx.Response(404, json={"error": f"not found: {request.url.path}"})
+        
+        body = json.loads(request.content)
+        self.requests += 1
+        self.urls.append(str(request.url))
+        self.prompt_chars += sum(len(message["content"]) for message in body["messages"])
+        if self.error:
+            return httpx.Response(500, json={"error": self.error})
+        return httpx.Response(200, content=self._stream(body["model"]), headers={"Content-Type": "application/x-ndjson"})
+    
+    async def _stream(self, model: str):
+        for i in range(self.tokens):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            piece = "[1]." if i == self.tokens - 1 else f"word{i} "
+            yield (json.dumps({"model": model, "message": {"role": "assistant", "content": piece}, "done": False}) + "\n").encode()
+        yield (json.dumps({"model": model, "message": {"role": "assistant", "content": ""}, "done": True}) + "\n").encode()
+
+def install_ollama(tokens: int = 20, token_delay: float = 0.0, error: Optional[str] = None) -> OllamaStub:
+    """Point the shared HTTP client at an in-process Ollama stub"""
+    from app.utils import http_client
+    stub = OllamaStub(tokens, token_delay, error)
+    http_client._http_client = httpx.AsyncClient(transport=httpx.MockTransport(stub.handle))
+    return stub
@@ -1,6 +1,35 @@
-def main():
-    print("Hello from backend!")
+"""
+Run the API server
+
+With --workers greater than one, the embedding model, the re-ranker and the
+vector store are loaded once in a model server process and shared by all
+uvicorn workers, instead of being loaded again by each of them.
+
+Usage:
+    uv run python main.py [--host 0.0.0.0] [--port 8000] [--workers 4]
+"""
+import argparse
+import uvicorn
 
+from app.config import settings
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Document Q&A API")
+    parser.add_argument("--host", default=settings.API_HOST, help=f"Bind address (default {settings.API_HOST})")
+    parser.add_argument("--port", type=int, default=settings.API_PORT, help=f"Port (default {settings.API_PORT})")
+    parser.add_argument("--workers", type=int, default=settings.WEB_WORKERS, help=f"Worker processes (default {settings.WEB_WORKERS})")
+    args = parser.parse_args()
+    
+    if args.workers <= 1:
+        uvicorn.run("app.main:app", host=args.host, port=args.port)
+        return
+    
+    from app.utils.model_server import start_server
+    manager = start_server()
+    try:
+        uvicorn.run("app.main:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        manager.shutdown()
 
 if __name__ == "__main__":
     main()
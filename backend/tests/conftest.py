@@ -0,0 +1,91 @@
+"""
+Shared fixtures for the backend tests
+
+The tests run without the embedding model, MongoDB or Ollama: stores live
+in temporary directories, MongoDB is the in-memory stand-in from the
+benchmarks, and the tokenizer and embedding model are replaced by small
+deterministic doubles.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+# Settings are read when app.config is imported, so isolate them first
+_workdir = tempfile.mkdtemp(prefix="docqa-tests-")
+os.environ.update({
+    "CHROMA_PERSIST_DIR": os.path.join(_workdir, "chroma_db"),
+    "QUANTIZED_STORE_DIR": os.path.join(_workdir, "vector_index"),
+    "VECTOR_BACKEND": "quantized",
+    "VECTOR_SHARDS": "1",
+    "EMBEDDING_CACHE_ENABLED": "false",
+    "ANSWER_CACHE_ENABLED": "false",
+    "TRACE_ENABLED": "false",
+    "RERANK_ENABLED": "false",
+    "WARMUP_ON_STARTUP": "false",
+    "MODEL_SERVER_ADDRESS": "",
+    "UPLOAD_SPOOL_DIR": os.path.join(_workdir, "spool"),
+})
+
+import numpy as np
+import pytest
+
+class WhitespaceTokenizer:
+    """Tokenizer double: one token per run of non-space characters"""
+    
+    def __call__(self, texts, **kwargs):
+        return {"offset_mapping": [[m.span() for m in re.finditer(r"\S+", text)] for text in texts]}
+
+class HashEmbeddings:
+    """Embedding generator double: unit vectors derived from a hash of the text"""
+    
+    dimension = 32
+    
+    def generate_embeddings(self, texts, use_cache=True):
+        vectors = np.stack([
+            np.frombuffer(hashlib.sha256(text.encode("utf-8")).digest(), dtype=np.uint8).astype(np.float32) - 127.5
+            for text in texts
+        ])
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    
+    def generate_embedding(self, text):
+        return self.generate_embeddings([text])[0]
+    
+    def get_embedding_dimension(self):
+        return self.dimension
+
+@pytest.fixture
+def tokenizer(monkeypatch):
+    """Whitespace tokenizer installed as the embedding model's tokenizer"""
+    from app.utils import chunker
+    tokenizer = WhitespaceTokenizer()
+    monkeypatch.setattr(chunker, "_tokenizer", tokenizer)
+    return tokenizer
+
+@pytest.fixture
+def embeddings():
+    return HashEmbeddings()
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """Fresh in-memory MongoDB stand-in, disconnected after the test"""
+    from app.utils import database
+    from benchmarks.stand_ins import install_mongo
+    monkeypatch.setattr(database, "_client", None)
+    monkeypatch.setattr(database, "_db", None)
+    return install_mongo()
+
+@pytest.fixture
+def search_store(tmp_path, monkeypatch, tokenizer, embeddings, mongo):
+    """Empty quantized store used by retrieval, with fresh read-path caches and query batcher"""
+    from app.utils import embedding_batcher, retrieval
+    from app.utils.cache import TTLCache
+    from app.utils.quantized_store import QuantizedVectorStore
+    store = QuantizedVectorStore(str(tmp_path / "search_store"))
+    monkeypatch.setattr(retrieval, "get_vector_store", lambda: store)
+    monkeypatch.setattr(retrieval, "_query_embedding_cache", TTLCache())
+    monkeypatch.setattr(retrieval, "_retrieval_cache", TTLCache())
+    monkeypatch.setattr(embedding_batcher, "_embedding_batcher", None)
+    monkeypatch.setattr(embedding_batcher, "get_embedding_generator", lambda: embeddings)
+    yield store
+    store.close()
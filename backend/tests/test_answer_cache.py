@@ -0,0 +1,139 @@
+import asyncio
+import sqlite3
+
+import numpy as np
+import pytest
+from prometheus_client import REGISTRY
+
+from app.utils import database
+from app.utils.answer_cache import SemanticAnswerCache
+
+def unit(seed, dimension=16):
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+@pytest.fixture
+def documents(mongo):
+    """Two stored documents with content hashes"""
+    async def insert():
+        await database.get_documents_collection().insert_many([
+            {"document_id": "a", "filename": "a.txt", "content_hash": "hash-a"},
+            {"document_id": "b", "filename": "b.txt", "content_hash": "hash-b"}
+        ])
+    asyncio.run(insert())
+
+def open_cache(tmp_path, model="llama3"):
+    return SemanticAnswerCache(str(tmp_path / "answers.sqlite3"), model, max_items=10)
+
+def store_answer(cache, seed, documents=None, top_k=5):
+    cache.store(f"question {seed}", unit(seed), top_k, None, f"answer {seed}", [], documents or {"a": "hash-a"}, 2.5)
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+def near(seed, noise, dimension=16):
+    """Unit vector close to unit(seed), like the embedding of a paraphrase"""
+    vector = unit(seed, dimension) + noise * unit(seed + 100, dimension)
+    return vector / np.linalg.norm(vector)
+
+def test_similar_question_with_the_same_request_is_answered(tmp_path, documents):
+    cache = open_cache(tmp_path)
+    store_answer(cache, 0)
+    
+    entry = asyncio.run(cache.lookup(near(0, 0.1), 5, None))
+    
+    assert entry["answer"] == "answer 0"
+    assert entry["similarity"] >= cache.threshold
+    assert asyncio.run(cache.lookup(near(0, 1.0), 5, None)) is None
+    assert asyncio.run(cache.lookup(unit(0), 3, None)) is None
+    assert asyncio.run(cache.lookup(unit(0), 5, ["a"])) is None
+    assert (cache.hits, cache.misses) == (1, 3)
+
+def test_answer_citing_a_changed_document_is_dropped(tmp_path, documents):
+    cache = open_cache(tmp_path)
+    store_answer(cache, 0, {"a": "hash-a", "b": "hash-b"})
+    
+    async def change():
+        await database.get_documents_collection().update_one({"document_id": "b"}, {"$set": {"content_hash": "new"}})
+    asyncio.run(change())
+    
+    assert asyncio.run(cache.lookup(unit(0), 5, None)) is None
+    assert (cache.stale, cache.stats()["items"]) == (1, 0)
+    assert open_cache(tmp_path).stats()["items"] == 0
+
+def test_invalidation_removes_answers_citing_the_document(tmp_path, documents):
+    cache = open_cache(tmp_path)
+    store_answer(cache, 0, {"a": "hash-a"})
+    store_answer(cache, 1, {"a": "hash-a", "b": "hash-b"})
+    store_answer(cache, 2, {"b": "hash-b"})
+    
+    removed = cache.invalidate_documents(["a"])
+    
+    assert removed == 2
+    assert asyncio.run(cache.lookup(unit(2), 5, None))["answer"] == "answer 2"
+    assert open_cache(tmp_path).stats()["items"] == 1
+    cache.clear()
+    assert open_cache(tmp_path).stats()["items"] == 0
+
+def test_least_recently_used_answer_is_evicted_when_full(tmp_path, documents):
+    cache = SemanticAnswerCache(str(tmp_path / "answers.sqlite3"), "llama3", max_items=2)
+    store_answer(cache, 0)
+    store_answer(cache, 1)
+    asyncio.run(cache.lookup(unit(0), 5, None))
+    
+    store_answer(cache, 2)
+    
+    assert asyncio.run(cache.lookup(unit(1), 5, None)) is None
+    assert [asyncio.run(cache.lookup(unit(seed), 5, None))["answer"] for seed in (0, 2)] == ["answer 0", "answer 2"]
+
+def test_answers_are_only_reused_for_the_model_that_generated_them(tmp_path, documents):
+    cache = open_cache(tmp_path)
+    store_answer(cache, 0)
+    cache._conn.close()
+    
+    other = open_cache(tmp_path, model="mistral")
+    assert asyncio.run(other.lookup(unit(0), 5, None)) is None
+    store_answer(other, 0)
+    other._conn.close()
+    
+    reopened = open_cache(tmp_path)
+    assert reopened.stats()["items"] == 1
+    assert asyncio.run(reopened.lookup(unit(0), 5, None))["answer"] == "answer 0"
+
+def test_cache_written_before_model_keys_is_upgraded(tmp_path, documents):
+    conn = sqlite3.connect(tmp_path / "answers.sqlite3")
+    conn.execute(
+        "CREATE TABLE answers (id INTEGER PRIMARY KEY AUTOINCREMENT, question TEXT NOT NULL, embedding BLOB NOT NULL, "
+        "top_k INTEGER NOT NULL, filter_key TEXT NOT NULL, answer TEXT NOT NULL, citations TEXT NOT NULL, "
+        "documents TEXT NOT NULL, generation_seconds REAL NOT NULL, last_used REAL NOT NULL)"
+    )
+    conn.execute(
+        "INSERT INTO answers (question, embedding, top_k, filter_key, answer, citations, documents, generation_seconds, "
+        "last_used) VALUES ('old', ?, 5, '', 'old answer', '[]', '{}', 1.0, 0)",
+        (unit(0).tobytes(),)
+    )
+    conn.commit()
+    conn.close()
+    
+    cache = open_cache(tmp_path)
+    
+    assert cache.stats()["items"] == 0
+    store_answer(cache, 0)
+    assert asyncio.run(cache.lookup(unit(0), 5, None))["answer"] == "answer 0"
+
+def test_lookups_are_exported_as_metrics(tmp_path, documents):
+    cache = open_cache(tmp_path)
+    store_answer(cache, 0)
+    store_answer(cache, 1, {"b": "changed"})
+    before = {result: sample("docqa_answer_cache_lookups_total", result=result) for result in ("hit", "miss", "stale")}
+    saved = sample("docqa_answer_cache_saved_seconds_total")
+    
+    asyncio.run(cache.lookup(unit(0), 5, None))
+    asyncio.run(cache.lookup(unit(1), 5, None))
+    asyncio.run(cache.lookup(unit(2), 5, None))
+    
+    assert sample("docqa_answer_cache_lookups_total", result="hit") - before["hit"] == 1
+    assert sample("docqa_answer_cache_lookups_total", result="miss") - before["miss"] == 2
+    assert sample("docqa_answer_cache_lookups_total", result="stale") - before["stale"] == 1
+    assert sample("docqa_answer_cache_saved_seconds_total") - saved == pytest.approx(2.5)
+    assert sample("docqa_answer_cache_hit_rate") == pytest.approx(1 / 3)
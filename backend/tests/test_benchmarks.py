@@ -0,0 +1,61 @@
+import re
+
+import pytest
+
+from app.utils.document_processor import DocumentProcessor
+from benchmarks.compare import compare
+from benchmarks.corpus import generate_corpus
+from benchmarks.run import summarize
+
+def corpus(seed=42):
+    return generate_corpus(files_per_type=2, min_bytes=1_000, max_bytes=5_000, seed=seed)
+
+def results(**metrics):
+    return {"metadata": {"corpus": "tiny"}, "results": metrics}
+
+def test_corpus_is_identical_for_a_seed():
+    files, facts = corpus()
+    
+    assert corpus() == (files, facts)
+    assert corpus(seed=7)[0] != files
+    assert sorted({name.rsplit(".", 1)[1] for name, _ in files}) == ["docx", "md", "pdf", "txt"]
+
+def test_planted_facts_are_in_the_extracted_text():
+    files, facts = corpus()
+    texts = {
+        name: " ".join(DocumentProcessor.extract_text(content, DocumentProcessor.get_file_type(name)).split())
+        for name, content in files
+    }
+    
+    assert {fact["filename"] for fact in facts} == set(texts)
+    for fact in facts:
+        name, subject = re.match(r"When was the (\S+) (\S+) introduced\?", fact["question"]).groups()
+        assert f"The {name} {subject} was introduced in {fact['answer']}." in texts[fact["filename"]]
+
+def test_summary_reports_percentiles_and_throughput():
+    summary = summarize([0.01, 0.02, 0.03, 0.04], chunks=100)
+    
+    assert summary["operations"] == 4
+    assert summary["total_seconds"] == pytest.approx(0.1)
+    assert summary["chunks_per_second"] == pytest.approx(1000)
+    assert summary["latency_ms"]["p50"] == pytest.approx(25)
+    assert summary["latency_ms"]["max"] == pytest.approx(40)
+
+def test_comparison_flags_slower_throughput_and_latency():
+    baseline = results(
+        ingest={"chunks_per_second": 100.0, "latency_ms": {"p50": 10.0, "p95": 20.0}},
+        query={"questions_per_second": 50.0}
+    )
+    current = results(
+        ingest={"chunks_per_second": 90.0, "latency_ms": {"p50": 10.0, "p95": 30.0}},
+        query={"questions_per_second": 80.0},
+        new_stage={"items_per_second": 5.0}
+    )
+    
+    rows = {row["metric"]: row for row in compare(baseline, current, threshold=0.15)}
+    
+    assert set(rows) == {"ingest.chunks_per_second", "ingest.latency_ms.p50", "ingest.latency_ms.p95", "query.questions_per_second"}
+    assert rows["ingest.chunks_per_second"]["change"] == pytest.approx(-0.1)
+    assert not rows["ingest.chunks_per_second"]["regression"]
+    assert rows["ingest.latency_ms.p95"]["regression"]
+    assert rows["query.questions_per_second"]["change"] == pytest.approx(0.6)
@@ -0,0 +1,62 @@
+import pytest
+
+from app.utils.chunker import TokenChunker
+
+def words(start, count):
+    return " ".join(f"w{i}" for i in range(start, start + count))
+
+def test_chunks_respect_the_token_budget_and_overlap(tokenizer):
+    chunker = TokenChunker(tokenizer, chunk_size=10, overlap=3)
+    paragraphs = [words(i * 4, 4) for i in range(10)]
+    
+    chunks = list(chunker.iter_chunks(["\n\n".join(paragraphs)]))
+    
+    assert [chunk["chunk_index"] for chunk in chunks] == list(range(len(chunks)))
+    assert all(chunk["token_count"] <= 10 for chunk in chunks)
+    assert all(chunk["token_count"] == len(chunk["content"].split()) for chunk in chunks)
+    # Consecutive chunks share the last overlap tokens
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk["content"].split()[:3] == previous["content"].split()[-3:]
+    # Nothing is lost
+    covered = {token for chunk in chunks for token in chunk["content"].split()}
+    assert covered == {f"w{i}" for i in range(40)}
+
+def test_long_paragraph_is_split_into_token_windows(tokenizer):
+    chunker = TokenChunker(tokenizer, chunk_size=8, overlap=2)
+    
+    chunks = list(chunker.iter_chunks([words(0, 30)]))
+    
+    assert len(chunks) > 1
+    assert all(chunk["token_count"] <= 8 for chunk in chunks)
+    assert chunks[0]["content"].startswith("w0 ")
+    assert chunks[-1]["content"].endswith("w29")
+
+def test_segment_boundaries_act_as_paragraph_breaks(tokenizer):
+    chunker = TokenChunker(tokenizer, chunk_size=12, overlap=2)
+    paragraphs = [words(i * 5, 5) for i in range(8)]
+    
+    whole = [chunk["content"] for chunk in chunker.iter_chunks(["\n\n".join(paragraphs)])]
+    segmented = [chunk["content"] for chunk in chunker.iter_chunks(paragraphs)]
+    
+    assert segmented == whole
+
+def test_chunks_are_yielded_before_the_input_is_consumed(tokenizer):
+    chunker = TokenChunker(tokenizer, chunk_size=5, overlap=1)
+    consumed = []
+    
+    def segments():
+        for i in range(100):
+            consumed.append(i)
+            yield words(i * 5, 5)
+    
+    next(chunker.iter_chunks(segments()))
+    
+    assert len(consumed) < 100
+
+def test_empty_input_yields_no_chunks(tokenizer):
+    chunker = TokenChunker(tokenizer, chunk_size=5, overlap=1)
+    assert list(chunker.iter_chunks(["", "  \n\n  "])) == []
+
+def test_overlap_must_be_smaller_than_chunk_size(tokenizer):
+    with pytest.raises(ValueError):
+        TokenChunker(tokenizer, chunk_size=5, overlap=5)
@@ -0,0 +1,76 @@
+import pytest
+
+from app.utils.context_builder import build_context, coalesce_hits, overlap_length
+
+def hit(document_id, chunk_index, content, score=0.5):
+    return {"id": f"{document_id}_chunk_{chunk_index}", "document_id": document_id, "chunk_index": chunk_index, "content": content, "score": score}
+
+def words(start, count):
+    return " ".join(f"w{i}" for i in range(start, start + count))
+
+def tokens(text):
+    return len(text.split())
+
+@pytest.mark.parametrize("previous, following, expected", [
+    ("abc def", "def ghi", 3),
+    ("abcabc", "abcabd", 3),
+    ("abc", "xyz", 0),
+    ("", "abc", 0),
+])
+def test_overlap_length(previous, following, expected):
+    assert overlap_length(previous, following) == expected
+
+def test_adjacent_chunks_are_merged_with_their_overlap_once():
+    hits = [
+        hit("d", 3, words(10, 10), score=0.9),
+        hit("d", 2, words(0, 14), score=0.7),
+        hit("e", 0, "other document"),
+        hit("d", 3, words(10, 10), score=0.9),
+    ]
+    
+    passages = coalesce_hits(hits)
+    
+    assert [passage["chunk_indexes"] for passage in passages] == [[2, 3], [0]]
+    merged = passages[0]
+    assert merged["content"] == words(0, 20)
+    assert merged["score"] == 0.9
+    for span, chunk in zip(merged["spans"], (words(0, 14), words(10, 10))):
+        assert merged["content"][span["start"]:span["end"]].strip() in chunk
+
+def test_chunks_without_shared_text_are_kept_whole():
+    passages = coalesce_hits([hit("d", 0, "first part"), hit("d", 1, "second part"), hit("d", 5, "later part")])
+    
+    assert [passage["content"] for passage in passages] == ["first part\n\nsecond part", "later part"]
+    assert passages[0]["spans"][1] == {"chunk_index": 1, "start": 12, "end": 23}
+
+def test_passages_fit_the_token_budget(tokenizer):
+    hits = [hit("a", 0, words(0, 30)), hit("b", 0, words(100, 30)), hit("c", 0, words(200, 5))]
+    
+    passages = build_context(hits, token_budget=50, min_passage_tokens=10, tokenizer=tokenizer)
+    
+    assert [passage["document_id"] for passage in passages] == ["a", "b"]
+    assert [passage["number"] for passage in passages] == [1, 2]
+    header = tokens("[3] (document a, chunk 0)")
+    assert passages[0]["token_count"] == 30
+    assert passages[1]["token_count"] == 50 - 2 * header - 30
+    assert passages[1]["truncated"] is True
+    assert passages[1]["content"] == words(100, passages[1]["token_count"])
+    assert sum(passage["token_count"] for passage in passages) + 2 * header <= 50
+
+def test_passage_too_short_to_cut_is_skipped_for_a_smaller_one(tokenizer):
+    hits = [hit("a", 0, words(0, 30)), hit("b", 0, words(100, 30)), hit("c", 0, words(200, 3))]
+    
+    passages = build_context(hits, token_budget=45, min_passage_tokens=20, tokenizer=tokenizer)
+    
+    assert [passage["document_id"] for passage in passages] == ["a", "c"]
+    assert [passage["number"] for passage in passages] == [1, 2]
+
+def test_truncation_clips_citation_spans(tokenizer):
+    hits = [hit("d", 0, words(0, 10)), hit("d", 1, "unrelated " + words(50, 10))]
+    
+    # The 5-token header leaves 12 tokens: all of chunk 0 and two of chunk 1
+    [passage] = build_context(hits, token_budget=17, min_passage_tokens=5, tokenizer=tokenizer)
+    
+    assert passage["chunk_indexes"] == [0, 1]
+    assert passage["spans"][-1]["end"] == len(passage["content"])
+    assert passage["content"].endswith("unrelated w50")
@@ -0,0 +1,24 @@
+from app.utils import document_processor
+from app.utils.chunker import TokenChunker
+from app.utils.document_processor import DocumentProcessor
+
+def test_text_blocks_end_at_paragraph_breaks(tokenizer, monkeypatch):
+    monkeypatch.setattr(document_processor, "TEXT_BLOCK_SIZE", 16)
+    text = "\n\n".join(" ".join(f"p{i}w{j}" for j in range(3)) for i in range(20))
+    
+    blocks = list(DocumentProcessor.iter_text_blocks(text.encode()))
+    
+    assert len(blocks) > 1
+    assert "".join(blocks) == text
+    assert all(block.startswith("\n\n") for block in blocks[1:])
+    chunker = TokenChunker(tokenizer, chunk_size=7, overlap=2)
+    assert list(chunker.iter_chunks(blocks)) == list(chunker.iter_chunks([text]))
+
+def test_long_paragraph_is_not_cut_at_its_leading_break(monkeypatch):
+    monkeypatch.setattr(document_processor, "TEXT_BLOCK_SIZE", 16)
+    text = "short\n\n" + "x" * 100
+    
+    blocks = list(DocumentProcessor.iter_text_blocks(text.encode()))
+    
+    assert "".join(blocks) == text
+    assert all(block.strip() for block in blocks)
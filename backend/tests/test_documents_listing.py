@@ -0,0 +1,92 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+from app.main import app
+from app.utils import database
+
+START = datetime(2025, 1, 1)
+
+def stored_documents():
+    """20 documents, three to an upload time, alternating between pdf and txt"""
+    return [
+        {
+            "document_id": f"doc{i:02d}",
+            "filename": f"file{i}.{'pdf' if i % 2 else 'txt'}",
+            "file_type": "pdf" if i % 2 else "txt",
+            "upload_date": START + timedelta(hours=i // 3),
+            "total_chunks": i,
+            "content_hash": f"hash{i}"
+        }
+        for i in range(20)
+    ]
+
+def newest_first(documents):
+    return [doc["document_id"] for doc in sorted(documents, key=lambda doc: (doc["upload_date"], doc["document_id"]), reverse=True)]
+
+@pytest.fixture
+def client(mongo):
+    """Request a path of the app with the stored documents in MongoDB"""
+    async def insert():
+        await database.get_documents_collection().insert_many(stored_documents())
+    asyncio.run(insert())
+    
+    def get(path, **params):
+        async def request():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+                return await http.get(path, params=params)
+        return asyncio.run(request())
+    return get
+
+def list_all(client, **params):
+    """Follow next_cursor until the last page; returns the pages"""
+    pages = [client("/api/documents/", **params).json()]
+    while pages[-1].get("next_cursor"):
+        pages.append(client("/api/documents/", **params, cursor=pages[-1]["next_cursor"]).json())
+    return pages
+
+def test_pages_return_every_document_once_newest_first(client):
+    pages = list_all(client, limit=7)
+    
+    assert [page["total"] for page in pages] == [7, 7, 6]
+    listed = [doc["document_id"] for page in pages for doc in page["documents"]]
+    assert listed == newest_first(stored_documents())
+
+def test_filters_apply_to_every_page(client):
+    pages = list_all(
+        client,
+        limit=2,
+        file_type=".PDF",
+        uploaded_after=(START + timedelta(hours=1)).isoformat(),
+        uploaded_before=(START + timedelta(hours=5)).isoformat()
+    )
+    
+    listed = [doc["document_id"] for page in pages for doc in page["documents"]]
+    expected = [
+        doc for doc in stored_documents()
+        if doc["file_type"] == "pdf" and START + timedelta(hours=1) <= doc["upload_date"] < START + timedelta(hours=5)
+    ]
+    assert listed == newest_first(expected)
+
+def test_fields_limit_the_returned_fields(client):
+    response = client("/api/documents/", limit=3, fields="filename")
+    
+    assert response.status_code == 200
+    assert [set(doc) for doc in response.json()["documents"]] == [{"document_id", "filename"}] * 3
+
+@pytest.mark.parametrize("params", [{"cursor": "not-a-cursor"}, {"fields": "filename,secret"}])
+def test_bad_cursor_or_field_is_rejected(client, params):
+    assert client("/api/documents/", **params).status_code == 400
+
+def test_limit_must_be_positive(client):
+    assert client("/api/documents/", limit=0).status_code == 422
+
+def test_listing_indexes_are_created(mongo):
+    asyncio.run(database.ensure_indexes())
+    
+    documents = database.get_database()._database["documents"].index_information()
+    chunks = database.get_database()._database["chunks"].index_information()
+    assert {"upload_date_document_id", "file_type_upload_date", "content_hash", "filename_upload_date"} <= set(documents)
+    assert "document_id_chunk_index" in chunks
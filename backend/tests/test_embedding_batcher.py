@@ -0,0 +1,101 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.utils import embedding_batcher
+from app.utils.embedding_batcher import EmbeddingBatcher
+
+@pytest.fixture(autouse=True)
+def generator(monkeypatch, embeddings):
+    monkeypatch.setattr(embedding_batcher, "get_embedding_generator", lambda: embeddings)
+    return embeddings
+
+class CountingGenerator:
+    """Embedding generator double that records each batch it encodes"""
+    
+    def __init__(self, embeddings, error=None):
+        self.embeddings = embeddings
+        self.error = error
+        self.batches = []
+    
+    def generate_embeddings(self, texts, use_cache=True):
+        self.batches.append(list(texts))
+        if self.error is not None:
+            raise self.error
+        return self.embeddings.generate_embeddings(texts)
+
+def embed_concurrently(batcher, requests):
+    async def scenario():
+        try:
+            return await asyncio.gather(*(batcher.embed(texts) for texts in requests), return_exceptions=True)
+        finally:
+            await batcher.stop()
+    return asyncio.run(scenario())
+
+def test_concurrent_requests_share_one_batch(monkeypatch, embeddings):
+    generator = CountingGenerator(embeddings)
+    monkeypatch.setattr(embedding_batcher, "get_embedding_generator", lambda: generator)
+    batcher = EmbeddingBatcher(max_batch_size=64, max_wait_ms=50)
+    requests = [["a", "b"], ["c"], ["a"]]
+    
+    results = embed_concurrently(batcher, requests)
+    
+    assert generator.batches == [["a", "b", "c"]]
+    for texts, vectors in zip(requests, results):
+        assert np.allclose(vectors, embeddings.generate_embeddings(texts))
+    assert batcher.stats() == {"batches": 1, "requests": 3, "texts": 3, "avg_batch_size": 3.0}
+
+def test_batches_are_capped_at_the_maximum_size(monkeypatch, embeddings):
+    generator = CountingGenerator(embeddings)
+    monkeypatch.setattr(embedding_batcher, "get_embedding_generator", lambda: generator)
+    batcher = EmbeddingBatcher(max_batch_size=2, max_wait_ms=50)
+    
+    embed_concurrently(batcher, [["a"], ["b"], ["c"], ["d"], ["e"]])
+    
+    assert generator.batches == [["a", "b"], ["c", "d"], ["e"]]
+
+def test_encode_error_fails_only_that_batch(monkeypatch, embeddings):
+    generator = CountingGenerator(embeddings, error=ValueError("model failed"))
+    monkeypatch.setattr(embedding_batcher, "get_embedding_generator", lambda: generator)
+    batcher = EmbeddingBatcher(max_batch_size=2, max_wait_ms=50)
+    
+    async def scenario():
+        try:
+            failed = await asyncio.gather(batcher.embed(["a"]), batcher.embed(["b"]), return_exceptions=True)
+            generator.error = None
+            return failed, await batcher.embed(["c"])
+        finally:
+            await batcher.stop()
+    failed, vectors = asyncio.run(scenario())
+    
+    assert all(isinstance(error, ValueError) for error in failed)
+    assert np.allclose(vectors, embeddings.generate_embeddings(["c"]))
+
+def test_stop_fails_requests_collected_into_an_unfinished_batch():
+    async def scenario():
+        batcher = EmbeddingBatcher(max_batch_size=10, max_wait_ms=60000)
+        request = asyncio.create_task(batcher.embed(["waiting"]))
+        # Let the scheduler take the request off the queue and wait for more
+        await asyncio.sleep(0.01)
+        assert batcher._queue.empty()
+        
+        await batcher.stop()
+        
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(request, 1)
+    asyncio.run(scenario())
+
+def test_stop_fails_requests_still_queued():
+    async def scenario():
+        batcher = EmbeddingBatcher(max_batch_size=10, max_wait_ms=60000)
+        await batcher.start()
+        batcher._task.cancel()
+        request = asyncio.create_task(batcher.embed(["queued"]))
+        await asyncio.sleep(0)
+        
+        await batcher.stop()
+        
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(request, 1)
+    asyncio.run(scenario())
@@ -0,0 +1,128 @@
+import itertools
+import sqlite3
+import threading
+
+import numpy as np
+import pytest
+
+from app.utils import embedding_cache
+from app.utils.embedding_cache import EmbeddingCache
+from app.utils.embeddings import EmbeddingGenerator
+
+MODEL = "test-model"
+
+def vector(seed):
+    return np.random.default_rng(seed).standard_normal(8).astype(np.float32)
+
+@pytest.fixture
+def clock(monkeypatch):
+    """time.time() that advances by one second per call, so ages never tie"""
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: float(next(ticks)))
+
+def cached(path, texts):
+    """Which texts a fresh cache (empty memory tier) finds on disk"""
+    cache = EmbeddingCache(path)
+    return [vector is not None for vector in cache.get_many(MODEL, texts)]
+
+class RecordingModel:
+    """Sentence-transformer double that records the texts it encodes"""
+    
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.encoded = []
+    
+    def encode(self, texts, convert_to_numpy=True, show_progress_bar=False):
+        self.encoded.append(list(texts))
+        return self.embeddings.generate_embeddings(texts)
+
+def generator_with_cache(cache, embeddings, namespace=MODEL):
+    """EmbeddingGenerator around a recording model, without loading a real one"""
+    generator = EmbeddingGenerator.__new__(EmbeddingGenerator)
+    generator.model = RecordingModel(embeddings)
+    generator.cache = cache
+    generator.cache_namespace = namespace
+    generator._encode_lock = threading.Lock()
+    return generator
+
+def test_entries_are_found_in_memory_then_on_disk(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    cache = EmbeddingCache(path)
+    cache.put_many(MODEL, ["a", "b"], [vector(0), vector(1)])
+    
+    found = cache.get_many(MODEL, ["a", "c"])
+    reopened = EmbeddingCache(path)
+    from_disk = reopened.get_many(MODEL, ["b", "b"])
+    
+    assert np.array_equal(found[0], vector(0)) and found[1] is None
+    assert all(np.array_equal(v, vector(1)) for v in from_disk)
+    assert (cache.stats()["memory_hits"], cache.stats()["misses"]) == (1, 1)
+    assert (reopened.stats()["disk_hits"], reopened.stats()["hit_rate"]) == (2, 1.0)
+
+def test_entries_are_only_reused_for_their_model(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"))
+    cache.put_many(MODEL, ["a"], [vector(0)])
+    
+    assert cache.get_many("other-model", ["a"]) == [None]
+
+def test_generator_encodes_only_texts_missing_from_the_cache(tmp_path, embeddings):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"))
+    generator = generator_with_cache(cache, embeddings)
+    generator.generate_embeddings(["a", "b"])
+    
+    vectors = generator.generate_embeddings(["b", "c", "a", "c"])
+    
+    assert generator.model.encoded == [["a", "b"], ["c"]]
+    assert np.allclose(vectors, embeddings.generate_embeddings(["b", "c", "a", "c"]))
+    assert vectors.dtype == np.float32
+
+def test_generator_bypasses_the_cache_for_one_off_texts(tmp_path, embeddings):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"))
+    generator = generator_with_cache(cache, embeddings)
+    
+    generator.generate_embeddings(["query"], use_cache=False)
+    generator.generate_embeddings(["query"], use_cache=False)
+    
+    assert generator.model.encoded == [["query"], ["query"]]
+    assert cache.get_many(MODEL, ["query"]) == [None]
+
+def test_disk_tier_evicts_the_least_recently_used_rows(tmp_path, clock):
+    path = str(tmp_path / "embeddings.sqlite3")
+    cache = EmbeddingCache(path, max_memory_items=2, max_disk_items=10)
+    for i in range(10):
+        cache.put_many(MODEL, [f"a{i}"], [vector(i)])
+    # Read from disk, as it is no longer in the memory tier
+    assert cache.get_many(MODEL, ["a0"])[0] is not None
+    
+    cache.put_many(MODEL, ["b0"], [vector(10)])
+    
+    assert cache.stats()["disk_items"] == 9
+    assert cached(path, ["a0", "a1", "a2", "a3", "b0"]) == [True, False, False, True, True]
+
+def test_rewritten_keys_do_not_trigger_eviction(tmp_path, clock):
+    path = str(tmp_path / "embeddings.sqlite3")
+    cache = EmbeddingCache(path, max_disk_items=5)
+    cache.put_many(MODEL, [f"a{i}" for i in range(5)], [vector(i) for i in range(5)])
+    
+    cache.put_many(MODEL, ["a0", "a1"], [vector(0), vector(1)])
+    
+    assert cache.stats()["disk_items"] == 5
+    assert all(cached(path, [f"a{i}" for i in range(5)]))
+
+def test_cache_written_before_the_row_cap_is_upgraded(tmp_path, clock):
+    path = str(tmp_path / "embeddings.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL) WITHOUT ROWID")
+    conn.execute(
+        "INSERT INTO embeddings (key, vector) VALUES (?, ?)",
+        (EmbeddingCache.make_key(MODEL, "old"), vector(0).tobytes())
+    )
+    conn.commit()
+    conn.close()
+    
+    cache = EmbeddingCache(path, max_disk_items=2)
+    cache.put_many(MODEL, ["new1"], [vector(1)])
+    cache.put_many(MODEL, ["new2"], [vector(2)])
+    
+    assert cache.stats()["disk_items"] == 1
+    assert cached(path, ["old", "new1", "new2"]) == [False, False, True]
@@ -0,0 +1,153 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.utils import retrieval
+from app.utils.lexical_index import LexicalIndex
+from app.utils.quantized_store import QuantizedVectorStore
+
+def hit(chunk_id):
+    return {"id": chunk_id, "document_id": "d", "chunk_index": 0, "content": chunk_id, "score": 1.0}
+
+def chunk(document_id, index, content):
+    return {"id": f"{document_id}_chunk_{index}", "document_id": document_id, "content": content}
+
+def test_rank_fusion_favours_hits_found_by_both_searches():
+    dense = [hit("a"), hit("b"), hit("c")]
+    lexical = [hit("c"), hit("d")]
+    
+    fused = retrieval.reciprocal_rank_fusion([dense, lexical], top_k=2, k=60)
+    
+    assert [h["id"] for h in fused] == ["c", "a"]
+    assert fused[0]["fusion_score"] == pytest.approx(1 / 63 + 1 / 61)
+    assert fused[1]["fusion_score"] == pytest.approx(1 / 61)
+    assert [h["score"] for h in fused] == [1.0, 1.0]
+
+def test_lexical_index_finds_exact_identifiers():
+    index = LexicalIndex()
+    index.add([
+        chunk("manual", 0, "Error E1234 means the pump is blocked"),
+        chunk("manual", 1, "General pump maintenance and errors"),
+        chunk("notes", 0, "Part number PN-77 replaces PN-76")
+    ])
+    
+    assert [chunk_id for chunk_id, _ in index.search("what is E1234", 5)] == ["manual_chunk_0"]
+    assert [chunk_id for chunk_id, _ in index.search("pump", 5, ["notes"])] == []
+
+def test_lexical_index_deletes_and_replaces_chunks():
+    index = LexicalIndex()
+    index.add([chunk("a", 0, "alpha beta"), chunk("a", 1, "beta gamma"), chunk("b", 0, "beta")])
+    
+    index.delete_document("a")
+    index.add([chunk("b", 0, "delta")])
+    
+    assert len(index) == 1
+    assert index.search("beta", 5) == []
+    assert [chunk_id for chunk_id, _ in index.search("delta", 5)] == ["b_chunk_0"]
+
+def test_lexical_index_saves_and_loads(tmp_path):
+    path = str(tmp_path / "lexical.pkl")
+    index = LexicalIndex(path)
+    index.add([chunk("a", 0, "alpha beta"), chunk("a", 1, "beta gamma")])
+    index.delete_ids(["a_chunk_0"])
+    index.save()
+    
+    loaded = LexicalIndex(path)
+    
+    assert len(loaded) == 1
+    assert loaded.search("beta", 5) == index.search("beta", 5)
+
+def test_lexical_index_saves_at_most_once_per_interval(tmp_path):
+    index = LexicalIndex(str(tmp_path / "lexical.pkl"))
+    index.add([chunk("a", 0, "alpha")])
+    
+    index.save(min_interval=3600)
+    assert not index.exists_on_disk
+    
+    index.save()
+    assert index.exists_on_disk
+
+@pytest.fixture
+def store(tmp_path):
+    """Quantized store with 40 chunks whose text shares the word 'common'"""
+    store = QuantizedVectorStore(str(tmp_path / "store"))
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((40, 16)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    store.add_chunk_records(
+        [{"document_id": f"doc{i % 4}", "chunk_index": i, "content": f"common text {i}", "char_count": 10} for i in range(40)],
+        embeddings
+    )
+    yield store
+    store.close()
+
+@pytest.mark.parametrize("hybrid", [True, False])
+def test_search_returns_top_k_hits_beyond_the_hybrid_list_sizes(store, monkeypatch, hybrid):
+    monkeypatch.setattr(retrieval, "get_vector_store", lambda: store)
+    monkeypatch.setattr(settings, "HYBRID_SEARCH_ENABLED", hybrid)
+    monkeypatch.setattr(settings, "RERANK_ENABLED", False)
+    monkeypatch.setattr(settings, "HYBRID_DENSE_TOP_K", 5)
+    monkeypatch.setattr(settings, "HYBRID_LEXICAL_TOP_K", 10)
+    query = np.ones((1, 16), dtype=np.float32) / 4
+    
+    results = asyncio.run(retrieval._search(["common"], query, 30, None))
+    
+    assert len(results[0]) == 30
+    assert len({h["id"] for h in results[0]}) == 30
+
+def test_hybrid_hits_keep_their_cosine_similarity_as_score(store, monkeypatch):
+    monkeypatch.setattr(retrieval, "get_vector_store", lambda: store)
+    monkeypatch.setattr(settings, "HYBRID_SEARCH_ENABLED", True)
+    monkeypatch.setattr(settings, "RERANK_ENABLED", False)
+    monkeypatch.setattr(settings, "HYBRID_DENSE_TOP_K", 5)
+    monkeypatch.setattr(settings, "HYBRID_LEXICAL_TOP_K", 10)
+    query = np.ones((1, 16), dtype=np.float32) / 4
+    
+    hits = asyncio.run(retrieval._search(["common"], query, 15, None))[0]
+    
+    found, vectors = store._get_embeddings([h["id"] for h in hits])
+    expected = dict(zip(found, vectors @ (query[0] / np.linalg.norm(query[0]))))
+    assert [h["score"] for h in hits] == pytest.approx([expected[h["id"]] for h in hits], abs=1e-5)
+    assert all(h["fusion_score"] > 0 for h in hits)
+    assert [h["fusion_score"] for h in hits] == sorted((h["fusion_score"] for h in hits), reverse=True)
+
+def test_store_writes_pending_lexical_changes_on_close(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LEXICAL_SAVE_INTERVAL", 3600)
+    store = QuantizedVectorStore(str(tmp_path / "store"))
+    store.add_chunk_records(
+        [{"document_id": "a", "chunk_index": 0, "content": "alpha", "char_count": 5}],
+        np.ones((1, 8), dtype=np.float32)
+    )
+    
+    store.flush()
+    assert not store.lexical_index.exists_on_disk
+    store.close()
+    
+    reopened = QuantizedVectorStore(str(tmp_path / "store"))
+    assert [h["id"] for h in reopened.search_lexical_many(["alpha"], 5)[0]] == ["a_chunk_0"]
+    reopened.close()
+
+def test_store_rebuilds_a_lexical_index_that_fell_behind(tmp_path, monkeypatch):
+    store = QuantizedVectorStore(str(tmp_path / "store"))
+    store.add_chunk_records(
+        [{"document_id": "a", "chunk_index": 0, "content": "alpha", "char_count": 5}],
+        np.ones((1, 8), dtype=np.float32)
+    )
+    store.close()
+    
+    # Written to the store, but the process stops before the index is saved
+    monkeypatch.setattr(settings, "LEXICAL_SAVE_INTERVAL", 3600)
+    store = QuantizedVectorStore(str(tmp_path / "store"))
+    store.add_chunk_records(
+        [{"document_id": "b", "chunk_index": 0, "content": "beta", "char_count": 4}],
+        np.ones((1, 8), dtype=np.float32)
+    )
+    store.flush()
+    store._store_lock.close()  # released by the operating system when the process exits
+    
+    reopened = QuantizedVectorStore(str(tmp_path / "store"))
+    assert len(reopened.lexical_index) == 2
+    assert [h["id"] for h in reopened.search_lexical_many(["beta"], 5)[0]] == ["b_chunk_0"]
+    reopened.close()
@@ -0,0 +1,192 @@
+import asyncio
+import io
+import zipfile
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.main import app
+from app.utils import ingestion
+from app.utils.database import get_chunks_collection, get_documents_collection
+from app.utils.quantized_store import QuantizedVectorStore
+from app.utils.uploads import spool_stream
+
+def document(count, changed=None):
+    """Text with one paragraph per chunk; paragraph `changed` gets different words"""
+    paragraphs = []
+    for i in range(count):
+        word = "changed" if i == changed else f"p{i}"
+        paragraphs.append(" ".join(f"{word}w{j}" for j in range(8)))
+    return "\n\n".join(paragraphs).encode()
+
+@pytest.fixture
+def store(tmp_path, monkeypatch, tokenizer, embeddings, mongo):
+    """Ingestion into a fresh quantized store, with one chunk per paragraph"""
+    store = QuantizedVectorStore(str(tmp_path / "store"))
+    monkeypatch.setattr(ingestion, "get_vector_store", lambda: store)
+    monkeypatch.setattr(ingestion, "get_embedding_generator", lambda: embeddings)
+    monkeypatch.setattr(settings, "CHUNK_TOKENS", 8)
+    monkeypatch.setattr(settings, "CHUNK_OVERLAP_TOKENS", 0)
+    yield store
+    store.close()
+
+def ingest(files):
+    return asyncio.run(ingestion.ingest_documents(files))
+
+def chunk_count(document_id):
+    async def count():
+        return await get_chunks_collection().count_documents({"document_id": document_id})
+    return asyncio.run(count())
+
+def test_documents_are_ingested_in_shared_batches(store, monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_BATCH_SIZE", 4)
+    
+    reports = ingest([("a.txt", document(5)), ("b.md", document(3)), ("c.pdf", b"not a pdf")])
+    
+    assert [report["status"] for report in reports] == ["success", "success", "failed"]
+    assert [report["total_chunks"] for report in reports] == [5, 3, 0]
+    assert store.get_count() == 8
+    assert chunk_count(reports[0]["document_id"]) == 5
+
+def stored(collection, query):
+    async def find():
+        return [doc async for doc in collection().find(query, {"_id": 0}).sort("chunk_index", 1)]
+    return asyncio.run(find())
+
+def test_identical_file_is_reported_as_duplicate(store):
+    first = ingest([("a.txt", document(4))])[0]
+    
+    again = ingest([("renamed.txt", document(4))])[0]
+    
+    assert again["status"] == "duplicate"
+    assert again["document_id"] == first["document_id"]
+    assert store.get_count() == 4
+
+def test_new_version_rewrites_only_changed_chunks(store):
+    first = ingest([("a.txt", document(5))])[0]
+    
+    updated = ingest([("a.txt", document(5, changed=2))])[0]
+    
+    assert updated["status"] == "updated"
+    assert updated["document_id"] == first["document_id"]
+    assert updated["message"].startswith("Document updated: 1 of 5 chunks changed")
+    assert store.get_count() == 5
+    hits = store.search_lexical_many(["changedw0"], 5)[0]
+    assert [hit["chunk_index"] for hit in hits] == [2]
+
+def test_new_version_embeds_only_changed_chunks_and_records_its_hashes(store, embeddings, monkeypatch):
+    first = ingest([("a.txt", document(5))])[0]
+    embedded = []
+    generate = embeddings.generate_embeddings
+    monkeypatch.setattr(embeddings, "generate_embeddings", lambda texts: embedded.extend(texts) or generate(texts))
+    
+    ingest([("a.txt", document(5, changed=2))])
+    
+    assert embedded == [" ".join(f"changedw{j}" for j in range(8))]
+    [metadata] = stored(get_documents_collection, {"document_id": first["document_id"]})
+    assert metadata["content_hash"] == ingestion.content_hash(document(5, changed=2))
+    assert metadata["version"] == 2
+    chunks = stored(get_chunks_collection, {"document_id": first["document_id"]})
+    assert [chunk["content_hash"] for chunk in chunks] == [ingestion.content_hash(chunk["content"]) for chunk in chunks]
+    assert chunks[2]["content"].startswith("changedw0")
+
+def test_duplicate_upload_is_answered_without_a_queued_job(store):
+    first = ingest([("a.txt", document(4))])[0]
+    
+    async def upload():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            return await http.post("/api/documents/upload", files={"file": ("copy.txt", document(4))})
+    response = asyncio.run(upload())
+    
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] == "completed"
+    assert (job["result"]["status"], job["result"]["document_id"]) == ("duplicate", first["document_id"])
+
+def test_shorter_version_removes_stale_chunks(store):
+    first = ingest([("a.txt", document(5))])[0]
+    
+    updated = ingest([("a.txt", document(3))])[0]
+    
+    assert updated["status"] == "updated"
+    assert "2 removed" in updated["message"]
+    assert store.get_count() == 3
+    assert chunk_count(first["document_id"]) == 3
+
+def test_moved_chunks_reuse_their_stored_embedding(store, embeddings, monkeypatch):
+    ingest([("a.txt", document(5))])
+    embedded = []
+    generate = embeddings.generate_embeddings
+    monkeypatch.setattr(embeddings, "generate_embeddings", lambda texts: embedded.extend(texts) or generate(texts))
+    
+    # A new first paragraph moves every other chunk up one index
+    updated = ingest([("a.txt", b"new " * 8 + b"\n\n" + document(5))])[0]
+    
+    assert updated["message"].startswith("Document updated: 6 of 6 chunks changed")
+    assert embedded == ["new new new new new new new new"]
+
+def test_failed_new_version_restores_the_previous_one(store, monkeypatch):
+    first = ingest([("a.txt", document(3))])[0]
+    # Small windows, so some chunks are overwritten before the failure
+    monkeypatch.setattr(settings, "EMBEDDING_BATCH_SIZE", 2)
+    monkeypatch.setattr(settings, "BULK_WRITE_SIZE", 2)
+    
+    # Every chunk changes; the file fails after four of them were written
+    def failing_segments(source, file_type):
+        for i in range(6):
+            yield " ".join(f"new{i}w{j}" for j in range(8))
+        raise ValueError("truncated file")
+    monkeypatch.setattr(ingestion.DocumentProcessor, "iter_text_segments", failing_segments)
+    
+    report = ingest([("a.txt", b"new version")])[0]
+    
+    assert report["status"] == "failed"
+    assert store.get_count() == 3
+    assert chunk_count(first["document_id"]) == 3
+    assert store.search_lexical_many(["new0w0"], 5)[0] == []
+    assert [hit["chunk_index"] for hit in store.search_lexical_many(["p2w0"], 5)[0]] == [2]
+
+def test_spooled_uploads_are_ingested_from_disk_and_deleted(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_SPOOL_DIR", str(tmp_path / "spool"))
+    good = spool_stream(io.BytesIO(document(3)), ".txt")
+    empty = spool_stream(io.BytesIO(b" "), ".txt")
+    
+    report = asyncio.run(ingestion.ingest_document(good, "a.txt"))
+    with pytest.raises(ingestion.IngestionError):
+        asyncio.run(ingestion.ingest_document(empty, "b.txt"))
+    
+    assert (report["status"], report["total_chunks"]) == ("success", 3)
+    assert list((tmp_path / "spool").iterdir()) == []
+
+def zip_with_corrupt_member() -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        archive.writestr("good.txt", document(2))
+        archive.writestr("corrupt.txt", document(2, changed=0))
+        archive.writestr("skipped.bin", b"not a document")
+    data = bytearray(buffer.getvalue())
+    # Flip a byte of corrupt.txt's stored data so its CRC check fails
+    offset = data.index(b"changedw0")
+    data[offset] ^= 0xFF
+    return bytes(data)
+
+def test_unreadable_archive_member_fails_on_its_own(store):
+    result = asyncio.run(ingestion.ingest_bulk([("docs.zip", zip_with_corrupt_member()), ("c.md", document(1))]))
+    
+    statuses = {report["filename"]: report["status"] for report in result["files"]}
+    assert statuses == {"docs.zip/good.txt": "success", "docs.zip/corrupt.txt": "failed", "c.md": "success"}
+    assert (result["total_files"], result["succeeded"], result["failed"]) == (3, 2, 1)
+
+def test_invalid_archive_fails_on_its_own(store):
+    result = asyncio.run(ingestion.ingest_bulk([("broken.zip", b"not a zip"), ("c.md", document(1))]))
+    
+    assert [report["status"] for report in result["files"]] == ["failed", "success"]
+    assert result["files"][0]["message"].startswith("Invalid zip archive")
+
+def test_summary_counts_duplicates_and_updates_as_succeeded():
+    results = [{"status": status} for status in ("success", "updated", "duplicate", "failed")]
+    
+    summary = ingestion.summarize_results(results)
+    
+    assert (summary["total_files"], summary["succeeded"], summary["failed"]) == (4, 3, 1)
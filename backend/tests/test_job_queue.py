@@ -0,0 +1,118 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.main import app
+from app.routers import documents
+from app.utils.ingestion import IngestionError
+from app.utils.job_queue import IngestionJobQueue
+
+@pytest.fixture
+def spool_dir(tmp_path, monkeypatch, mongo):
+    directory = tmp_path / "spool"
+    monkeypatch.setattr(settings, "UPLOAD_SPOOL_DIR", str(directory))
+    return directory
+
+def spooled(directory):
+    return sorted(os.listdir(directory)) if directory.exists() else []
+
+def run(queue, monkeypatch, scenario):
+    """Run a scenario against the app with the queue started on the scenario's event loop"""
+    monkeypatch.setattr(documents, "get_job_queue", lambda: queue)
+    
+    async def main():
+        await queue.start()
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+                return await scenario(http)
+        finally:
+            await queue.stop()
+    return asyncio.run(main())
+
+def upload(http, name="a.txt", data=b"some text"):
+    return http.post("/api/documents/upload", files={"file": (name, data)})
+
+async def wait_for_job(http, job_id):
+    for _ in range(100):
+        job = (await http.get(f"/api/documents/jobs/{job_id}")).json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+def test_upload_is_processed_in_the_background(spool_dir, monkeypatch):
+    received = []
+    
+    async def fake_ingest(local_file, filename):
+        with open(local_file.path, "rb") as f:
+            received.append((f.read(), filename))
+        local_file.delete()
+        return {
+            "document_id": "doc", "filename": filename, "file_type": "txt",
+            "total_chunks": 1, "status": "success", "message": "ok"
+        }
+    monkeypatch.setattr(documents, "ingest_document", fake_ingest)
+    
+    async def scenario(http):
+        response = await upload(http)
+        assert response.status_code == 202
+        assert response.json()["status"] == "queued"
+        return await wait_for_job(http, response.json()["job_id"])
+    
+    job = run(IngestionJobQueue(num_workers=1), monkeypatch, scenario)
+    
+    assert job["status"] == "completed"
+    assert job["result"]["document_id"] == "doc"
+    assert received == [(b"some text", "a.txt")]
+    assert spooled(spool_dir) == []
+
+def test_failed_job_reports_its_error(spool_dir, monkeypatch):
+    async def failing_ingest(local_file, filename):
+        local_file.delete()
+        raise IngestionError("No text could be extracted")
+    monkeypatch.setattr(documents, "ingest_document", failing_ingest)
+    
+    async def scenario(http):
+        response = await upload(http)
+        return await wait_for_job(http, response.json()["job_id"])
+    
+    job = run(IngestionJobQueue(num_workers=1), monkeypatch, scenario)
+    
+    assert (job["status"], job["error"]) == ("failed", "No text could be extracted")
+
+def test_full_queue_rejects_uploads_with_429(spool_dir, monkeypatch):
+    # No workers, so the first job stays queued and fills the queue
+    async def scenario(http):
+        return [(await upload(http, data=f"text {i}".encode())).status_code for i in range(2)]
+    
+    statuses = run(IngestionJobQueue(num_workers=0, max_queue_size=1), monkeypatch, scenario)
+    
+    assert statuses == [202, 429]
+    assert len(spooled(spool_dir)) == 1  # only the queued job's upload is kept
+
+def test_oversized_upload_is_rejected_with_413(spool_dir, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_UPLOAD_BYTES", 10)
+    
+    async def scenario(http):
+        single = await upload(http, data=b"x" * 11)
+        bulk = await http.post(
+            "/api/documents/upload/bulk",
+            files=[("files", ("small.txt", b"x" * 5)), ("files", ("large.txt", b"x" * 11))]
+        )
+        return single, bulk
+    
+    single, bulk = run(IngestionJobQueue(num_workers=0), monkeypatch, scenario)
+    
+    assert single.status_code == 413
+    assert bulk.status_code == 413
+    assert bulk.json()["detail"].startswith("large.txt: ")
+    assert spooled(spool_dir) == []
+
+def test_unknown_job_is_404(monkeypatch):
+    async def scenario(http):
+        return (await http.get("/api/documents/jobs/missing")).status_code
+    
+    assert run(IngestionJobQueue(num_workers=0), monkeypatch, scenario) == 404
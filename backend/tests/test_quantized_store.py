@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from app.utils.quantized_store import QuantizedVectorStore
+
+def unit_vectors(count, dimension=16, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def records(document_id, count):
+    return [
+        {"document_id": document_id, "chunk_index": i, "content": f"{document_id} text {i}", "char_count": 10}
+        for i in range(count)
+    ]
+
+@pytest.fixture
+def store(tmp_path):
+    store = QuantizedVectorStore(str(tmp_path / "store"), rerank_factor=4)
+    yield store
+    store.close()
+
+def test_search_ranks_by_exact_cosine_similarity(store):
+    vectors = unit_vectors(200)
+    store.add_chunk_records(records("a", 200), vectors)
+    queries = unit_vectors(5, seed=1)
+    
+    results = store.search_many(queries, top_k=5)
+    
+    for query, hits in zip(queries, results):
+        expected = np.argsort(-(vectors @ query))[:5]
+        assert [hit["chunk_index"] for hit in hits] == expected.tolist()
+        assert [hit["score"] for hit in hits] == pytest.approx((vectors @ query)[expected].tolist(), abs=1e-5)
+
+def test_invalid_embeddings_leave_the_store_unchanged(store):
+    store.add_chunk_records(records("a", 3), unit_vectors(3))
+    free, next_row = list(store._free), store._next_row
+    
+    with pytest.raises(ValueError):
+        store.add_chunk_records(records("b", 2), unit_vectors(2, dimension=8))
+    with pytest.raises(ValueError):
+        store.add_chunk_records(records("b", 2), unit_vectors(3))
+    
+    assert store.get_count() == 3
+    assert (store._free, store._next_row) == (free, next_row)
+
+def test_failed_write_returns_its_rows(store, monkeypatch):
+    store.add_chunk_records(records("a", 3), unit_vectors(3))
+    
+    def failing_flush():
+        raise OSError("disk full")
+    monkeypatch.setattr(store._exact, "flush", failing_flush)
+    with pytest.raises(OSError):
+        store.add_chunk_records(records("b", 2), unit_vectors(2, seed=1))
+    monkeypatch.undo()
+    
+    assert store.get_count() == 3
+    assert store.get_chunks_by_ids(["b_chunk_0"]) == {}
+    store.add_chunk_records(records("b", 2), unit_vectors(2, seed=1))
+    assert store._next_row == 5
+
+def test_deleted_rows_are_reused(store):
+    store.add_chunk_records(records("a", 4), unit_vectors(4))
+    store.delete_by_document_id("a")
+    
+    store.add_chunk_records(records("b", 3), unit_vectors(3, seed=1))
+    
+    assert store._next_row == 4
+    assert store.get_count() == 3
+    assert {hit["document_id"] for hit in store.search_many(unit_vectors(1, seed=2), top_k=5)[0]} == {"b"}
+
+def test_rewritten_chunk_replaces_its_vector(store):
+    store.add_chunk_records(records("a", 2), unit_vectors(2))
+    replacement = unit_vectors(1, seed=3)
+    
+    store.add_chunk_records(records("a", 1), replacement)
+    
+    assert store.get_count() == 2
+    found, vectors = store._get_embeddings(["a_chunk_0"])
+    assert found == ["a_chunk_0"]
+    assert np.allclose(vectors, replacement)
+
+def test_reopened_store_keeps_its_vectors(tmp_path):
+    persist_dir = str(tmp_path / "store")
+    vectors = unit_vectors(10)
+    store = QuantizedVectorStore(persist_dir)
+    store.add_chunk_records(records("a", 10), vectors)
+    store.close()
+    
+    reopened = QuantizedVectorStore(persist_dir)
+    
+    assert reopened.get_count() == 10
+    assert reopened.search_many(vectors[3:4], top_k=1)[0][0]["id"] == "a_chunk_3"
+    reopened.close()
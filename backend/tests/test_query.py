@@ -0,0 +1,106 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.main import app
+from app.routers.query import NO_CONTEXT_ANSWER
+from app.utils import answer_cache, database, http_client
+from benchmarks.stand_ins import install_ollama
+
+OLLAMA_URL = "http://ollama.test:11434"
+
+@pytest.fixture
+def corpus(search_store, embeddings, monkeypatch):
+    """One three-chunk document in the store, and Ollama expected at OLLAMA_URL"""
+    texts = ["Pumps must be inspected monthly", "Filters are replaced every year", "Valves are tested weekly"]
+    search_store.add_chunk_records(
+        [{"document_id": "manual", "chunk_index": i, "content": text, "char_count": len(text)} for i, text in enumerate(texts)],
+        embeddings.generate_embeddings(texts)
+    )
+    monkeypatch.setattr(settings, "OLLAMA_BASE_URL", OLLAMA_URL)
+    monkeypatch.setattr(http_client, "_http_client", None)
+    return search_store
+
+def ask(question, **body):
+    """POST a question; returns the status code and the (event, data) pairs of the stream"""
+    async def request():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            return await http.post("/api/query", json={"question": question, **body})
+    response = asyncio.run(request())
+    events = []
+    if not response.headers["content-type"].startswith("text/event-stream"):
+        return response.status_code, events
+    for block in response.text.split("\n\n"):
+        if block:
+            event, data = block.split("\n")
+            events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return response.status_code, events
+
+def test_answer_streams_citations_then_tokens_then_done(corpus):
+    stub = install_ollama(tokens=3)
+    
+    status, events = ask("How often are pumps inspected?", top_k=2)
+    
+    assert status == 200
+    assert [event for event, _ in events] == ["citations", "token", "token", "token", "done"]
+    citations = events[0][1]
+    assert {citation["document_id"] for citation in citations} == {"manual"}
+    assert "".join(data["content"] for event, data in events if event == "token") == "word0 word1 [1]."
+    assert stub.urls == [f"{OLLAMA_URL}/api/chat"]
+
+def test_ollama_failure_ends_the_stream_with_an_error(corpus):
+    install_ollama(error="model 'llama3.2' not found")
+    
+    status, events = ask("How often are pumps inspected?")
+    
+    assert status == 200
+    assert [event for event, _ in events] == ["citations", "error"]
+    assert "500" in events[1][1]["detail"]
+    assert "model 'llama3.2' not found" in events[1][1]["detail"]
+
+def test_question_without_context_is_answered_without_the_model(corpus):
+    stub = install_ollama()
+    
+    status, events = ask("How often are pumps inspected?", document_ids=["unknown"])
+    
+    assert events == [("citations", []), ("token", {"content": NO_CONTEXT_ANSWER}), ("done", {})]
+    assert stub.requests == 0
+
+@pytest.fixture
+def cached_corpus(corpus, tmp_path, monkeypatch):
+    """The corpus with its document stored in MongoDB and the answer cache enabled"""
+    async def insert():
+        await database.get_documents_collection().insert_one({"document_id": "manual", "content_hash": "v1"})
+    asyncio.run(insert())
+    monkeypatch.setattr(settings, "ANSWER_CACHE_ENABLED", True)
+    cache = answer_cache.SemanticAnswerCache(str(tmp_path / "answers.sqlite3"), settings.OLLAMA_MODEL)
+    monkeypatch.setattr(answer_cache, "_answer_cache", cache)
+    return corpus
+
+def test_repeated_question_is_answered_from_the_cache_until_the_document_changes(cached_corpus):
+    stub = install_ollama(tokens=3)
+    
+    _, generated = ask("How often are pumps inspected?")
+    _, cached = ask("How often are pumps inspected?")
+    
+    assert stub.requests == 1
+    assert [event for event, _ in cached] == ["citations", "token", "done"]
+    assert cached[0] == generated[0]
+    assert cached[1][1]["content"] == "word0 word1 [1]."
+    assert cached[2][1]["cached"] is True
+    
+    async def change():
+        await database.get_documents_collection().update_one({"document_id": "manual"}, {"$set": {"content_hash": "v2"}})
+    asyncio.run(change())
+    _, regenerated = ask("How often are pumps inspected?")
+    
+    assert stub.requests == 2
+    assert regenerated[-1] == ("done", {})
+
+def test_empty_question_is_rejected(corpus):
+    status, _ = ask("   ")
+    
+    assert status == 400
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.utils import retrieval
+from app.utils.cache import TTLCache
+from app.utils.reranker import Reranker
+
+class ScoringModel:
+    """Cross-encoder double: a pair scores the number of times "relevant" is in the text"""
+    
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.scored = []
+    
+    def predict(self, pairs, batch_size=16, show_progress_bar=False):
+        time.sleep(self.delay)
+        self.scored.extend(text for _, text in pairs)
+        return np.array([text.count("relevant") for _, text in pairs], dtype=np.float32)
+
+def reranker(delay=0.0, batch_size=2):
+    """Reranker around the scoring double, without loading a model"""
+    reranker = Reranker.__new__(Reranker)
+    reranker.model_name = "test"
+    reranker.model = ScoringModel(delay)
+    reranker.batch_size = batch_size
+    reranker.pair_cache = TTLCache(100, 60)
+    reranker._lock = threading.Lock()
+    reranker.reranked = 0
+    reranker.fallbacks = 0
+    return reranker
+
+def hits(*contents):
+    return [{"id": content, "content": content, "score": 1.0 - i / 10} for i, content in enumerate(contents)]
+
+def ids(results):
+    return [[hit["id"] for hit in hits] for hits in results]
+
+def test_candidates_are_reordered_by_cross_encoder_score():
+    candidates = [hits("a", "relevant relevant b", "relevant c")]
+    
+    results, complete = reranker().rerank_many(["q"], candidates, 2, budget_seconds=10)
+    
+    assert ids(results) == [["relevant relevant b", "relevant c"]]
+    assert [hit["score"] for hit in results[0]] == [2.0, 1.0]
+    assert complete == [True]
+
+def test_questions_not_scored_within_the_budget_keep_vector_order():
+    slow = reranker(delay=0.05, batch_size=2)
+    candidates = [hits("a", "relevant b"), hits("c", "relevant d")]
+    
+    results, complete = slow.rerank_many(["q1", "q2"], candidates, 2, budget_seconds=0.01)
+    
+    # The first batch (the first question's pairs) is scored; the budget is gone before the second
+    assert ids(results) == [["relevant b", "a"], ["c", "relevant d"]]
+    assert complete == [True, False]
+    assert (slow.reranked, slow.fallbacks) == (1, 1)
+
+def test_cached_pair_scores_are_reused_without_budget():
+    ranker = reranker()
+    candidates = [hits("a", "relevant b")]
+    ranker.rerank_many(["What is b?"], candidates, 2, budget_seconds=10)
+    
+    results, complete = ranker.rerank_many(["what  is B?"], candidates, 2, budget_seconds=0)
+    
+    assert ids(results) == [["relevant b", "a"]]
+    assert complete == [True]
+    assert ranker.model.scored == ["a", "relevant b"]
+
+@pytest.mark.parametrize("delay, cached", [(0.0, True), (0.05, False)])
+def test_only_fully_reranked_results_are_cached(search_store, embeddings, monkeypatch, delay, cached):
+    search_store.add_chunk_records(
+        [{"document_id": "d", "chunk_index": i, "content": f"relevant text {i}", "char_count": 10} for i in range(6)],
+        embeddings.generate_embeddings([f"relevant text {i}" for i in range(6)])
+    )
+    ranker = reranker(delay=delay, batch_size=2)
+    monkeypatch.setattr(retrieval, "get_reranker", lambda: ranker)
+    monkeypatch.setattr(settings, "RERANK_ENABLED", True)
+    monkeypatch.setattr(settings, "RERANK_CANDIDATES", 6)
+    monkeypatch.setattr(settings, "RERANK_BUDGET_MS", 10)
+    
+    results = asyncio.run(retrieval.retrieve("relevant text", top_k=3))
+    
+    assert len(results) == 3
+    assert (retrieval._retrieval_cache.stats()["items"] == 1) is cached
@@ -0,0 +1,105 @@
+import json
+
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.utils.quantized_store import QuantizedVectorStore
+from app.utils.sharded_store import ShardedVectorStore, shard_of
+
+DOCUMENTS = [f"doc{i}" for i in range(8)]
+
+def records():
+    """Five chunks for each document, with random unit vectors"""
+    rng = np.random.default_rng(0)
+    chunks = [
+        {"document_id": document_id, "chunk_index": i, "content": f"{document_id} part {i}", "char_count": 12}
+        for document_id in DOCUMENTS
+        for i in range(5)
+    ]
+    embeddings = rng.standard_normal((len(chunks), 16)).astype(np.float32)
+    return chunks, embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+@pytest.fixture(autouse=True)
+def exact_rerank(monkeypatch):
+    # Re-rank every row exactly, so the int8 scan cannot change which hits are found
+    monkeypatch.setattr(settings, "QUANTIZED_RERANK_FACTOR", 100)
+
+@pytest.fixture
+def store(tmp_path):
+    store = ShardedVectorStore(3, "quantized", str(tmp_path / "shards"), use_processes=False)
+    store.add_chunk_records(*records())
+    yield store
+    store.close()
+
+def brute_force(query, top_k, document_ids=None):
+    chunks, embeddings = records()
+    scores = embeddings @ (query / np.linalg.norm(query))
+    ranked = [
+        (float(score), f"{chunk['document_id']}_chunk_{chunk['chunk_index']}")
+        for score, chunk in zip(scores, chunks)
+        if document_ids is None or chunk["document_id"] in document_ids
+    ]
+    return [chunk_id for _, chunk_id in sorted(ranked, reverse=True)[:top_k]]
+
+def test_chunks_are_stored_in_their_document_shard(store):
+    expected = [0] * store.num_shards
+    for document_id in DOCUMENTS:
+        expected[shard_of(document_id, store.num_shards)] += 5
+    
+    assert [shard.call("get_count") for shard in store.shards] == expected
+    assert store.get_count() == 40
+
+def test_search_merges_shards_into_the_global_top_k(store, tmp_path):
+    queries = np.random.default_rng(1).standard_normal((3, 16)).astype(np.float32)
+    
+    results = store.search_many(queries, top_k=7)
+    
+    for query, hits in zip(queries, results):
+        assert [hit["id"] for hit in hits] == brute_force(query, 7)
+    single = QuantizedVectorStore(str(tmp_path / "single"))
+    single.add_chunk_records(*records())
+    assert [[hit["id"] for hit in hits] for hits in single.search_many(queries, top_k=7)] == [
+        [hit["id"] for hit in hits] for hits in results
+    ]
+    single.close()
+
+@pytest.mark.parametrize("exact_search_max_chunks", [0, 1000])
+def test_filtered_search_only_returns_those_documents(store, exact_search_max_chunks):
+    store.exact_search_max_chunks = exact_search_max_chunks
+    query = np.random.default_rng(2).standard_normal(16).astype(np.float32)
+    
+    hits = store.search_many(query[None, :], top_k=4, document_ids=["doc1", "doc6"])[0]
+    
+    assert [hit["id"] for hit in hits] == brute_force(query, 4, ["doc1", "doc6"])
+
+def test_deletes_are_routed_to_the_document_shard(store):
+    store.delete_by_document_id("doc3")
+    store.delete_chunks("doc5", [0, 1])
+    
+    assert store.get_count() == 33
+    assert store.get_document_chunk_ids(["doc3"]) == []
+    assert sorted(store.get_document_chunk_ids(["doc5"])) == ["doc5_chunk_2", "doc5_chunk_3", "doc5_chunk_4"]
+    assert store.search_lexical_many(["doc3"], 5)[0] == []
+
+def test_reopened_store_keeps_its_chunks_and_indexes(tmp_path):
+    persist_dir = str(tmp_path / "shards")
+    store = ShardedVectorStore(3, "quantized", persist_dir, use_processes=False)
+    store.add_chunk_records(*records())
+    store.close()
+    
+    reopened = ShardedVectorStore(3, "quantized", persist_dir, use_processes=False)
+    
+    assert reopened.get_count() == 40
+    assert sorted(reopened.get_document_chunk_ids(["doc2"])) == [f"doc2_chunk_{i}" for i in range(5)]
+    assert [hit["document_id"] for hit in reopened.search_lexical_many(["doc4"], 5)[0]] == ["doc4"] * 5
+    reopened.close()
+
+def test_store_refuses_a_different_shard_layout(tmp_path):
+    persist_dir = str(tmp_path / "shards")
+    ShardedVectorStore(3, "quantized", persist_dir, use_processes=False).close()
+    with open(tmp_path / "shards" / "shards.json") as f:
+        assert json.load(f) == {"num_shards": 3, "backend": "quantized"}
+    
+    with pytest.raises(ValueError):
+        ShardedVectorStore(4, "quantized", persist_dir, use_processes=False)
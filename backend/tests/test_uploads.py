@@ -0,0 +1,69 @@
+import asyncio
+import hashlib
+import io
+
+import pytest
+from fastapi import UploadFile
+
+from app.config import settings
+from app.utils import uploads
+from app.utils.uploads import LocalFile, UploadTooLargeError, spool_stream, spool_upload
+
+class RecordingStream(io.BytesIO):
+    """Byte stream that records the size of every read"""
+    
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = []
+    
+    def read(self, size=-1):
+        self.reads.append(size)
+        return super().read(size)
+
+@pytest.fixture
+def spool_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "spool"
+    monkeypatch.setattr(settings, "UPLOAD_SPOOL_DIR", str(directory))
+    monkeypatch.setattr(uploads, "COPY_BLOCK_BYTES", 16)
+    return directory
+
+def test_stream_is_copied_block_by_block_and_hashed(spool_dir):
+    data = bytes(range(256)) * 3
+    stream = RecordingStream(data)
+    
+    local = spool_stream(stream, ".pdf", max_bytes=0)
+    
+    assert set(stream.reads) == {16}
+    assert local.temporary and local.path.endswith(".pdf")
+    assert local.path.startswith(str(spool_dir))
+    assert (local.size, local.content_hash) == (len(data), hashlib.sha256(data).hexdigest())
+    with open(local.path, "rb") as f:
+        assert f.read() == data
+    local.delete()
+    assert list(spool_dir.iterdir()) == []
+
+def test_stream_over_the_limit_leaves_no_file(spool_dir):
+    with pytest.raises(UploadTooLargeError):
+        spool_stream(io.BytesIO(b"x" * 100), max_bytes=40)
+    
+    assert list(spool_dir.iterdir()) == []
+
+def test_upload_of_known_size_is_rejected_before_reading(spool_dir):
+    stream = RecordingStream(b"x" * 100)
+    upload = UploadFile(stream, size=100, filename="big.txt")
+    
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(spool_upload(upload, max_bytes=40))
+    
+    assert stream.reads == []
+    assert not spool_dir.exists()
+
+def test_user_files_are_hashed_on_demand_and_never_deleted(tmp_path):
+    path = tmp_path / "mine.txt"
+    path.write_bytes(b"my document")
+    
+    local = LocalFile(str(path))
+    local.delete()
+    
+    assert path.exists()
+    assert (local.size, local.content_hash) == (11, hashlib.sha256(b"my document").hexdigest())
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from app.utils.quantized_store import QuantizedVectorStore
+from app.utils.sharded_store import ShardedVectorStore
+from app.utils.vector_store import ChromaVectorStore, VectorStoreInUseError
+
+def open_store(backend, persist_dir):
+    if backend == "quantized":
+        return QuantizedVectorStore(persist_dir)
+    if backend == "sharded":
+        return ShardedVectorStore(2, "quantized", persist_dir, use_processes=False)
+    return ChromaVectorStore(persist_dir)
+
+@pytest.fixture(params=["quantized", "sharded", "chroma"])
+def store(request, tmp_path):
+    store = open_store(request.param, str(tmp_path / "store"))
+    yield store
+    store.close()
+
+def records(document_id, count):
+    chunks = [
+        {"document_id": document_id, "chunk_index": i, "content": f"{document_id} text {i}", "char_count": 10}
+        for i in range(count)
+    ]
+    embeddings = np.random.default_rng(len(document_id)).standard_normal((count, 8)).astype(np.float32)
+    return chunks, embeddings
+
+def test_document_delete_removes_chunks_in_the_map(store):
+    store.add_chunk_records(*records("a", 3))
+    store.add_chunk_records(*records("b", 2))
+    
+    store.delete_by_document_id("a")
+    
+    assert store.get_count() == 2
+    assert store.get_document_chunk_ids(["a"]) == []
+    assert store.search_lexical_many(["a"], 5)[0] == []
+
+def test_document_delete_finds_chunks_missing_from_the_map(store):
+    chunks, embeddings = records("a", 3)
+    # Stored by another process: in the backend, but not in this store's map
+    store._upsert(
+        [store.make_chunk_id("a", chunk["chunk_index"]) for chunk in chunks],
+        embeddings,
+        [chunk["content"] for chunk in chunks],
+        [{"document_id": "a", "chunk_index": chunk["chunk_index"], "char_count": 10} for chunk in chunks]
+    )
+    store.add_chunk_records(*records("b", 2))
+    
+    store.delete_by_document_id("a")
+    
+    assert store.get_count() == 2
+    assert all(hit["document_id"] == "b" for hit in store.search_many(embeddings, top_k=5)[0])
+
+def test_store_is_open_in_one_process_at_a_time(tmp_path):
+    persist_dir = str(tmp_path / "store")
+    store = QuantizedVectorStore(persist_dir)
+    
+    with pytest.raises(VectorStoreInUseError):
+        QuantizedVectorStore(persist_dir)
+    store.close()
+    
+    QuantizedVectorStore(persist_dir).close()